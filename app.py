@@ -1,15 +1,15 @@
 import streamlit as st
-import pandas as pd
-import hashlib
 import sqlite3
 import random
-import pyotp
-import qrcode
+import io
 import os
 import json
 import time
 from datetime import datetime
-from math import radians, sin, cos, asin, sqrt
+from services import SecurityService, MLService, MapService, CITIES, ORGAN_LIMITS
+
+# pandas, pyotp, qrcode, travel_time (numpy) and audit (SQLAlchemy) are imported
+# on the pages that use them to keep cold start and reruns cheap
 
 # ================= 1. CONFIGURATION & STATE INIT =================
 st.set_page_config(
@@ -25,7 +25,6 @@ if "history" not in st.session_state: st.session_state.history = []
 if "user" not in st.session_state: st.session_state.user = None
 if "guest_mode" not in st.session_state: st.session_state.guest_mode = False
 if "auth_role" not in st.session_state: st.session_state.auth_role = None
-if "logs" not in st.session_state: st.session_state.logs = [] 
 
 # ================= 2. ENHANCED STYLING (CSS) =================
 st.markdown("""
@@ -213,12 +212,6 @@ st.markdown("""
 
 # ================= 3. UTILITIES & DB =================
 
-class SecurityService:
-    @staticmethod
-    def hash_password(password, salt=None):
-        if not salt: salt = os.urandom(16).hex()
-        return hashlib.sha256((salt + password).encode()).hexdigest(), salt
-
 class DatabaseService:
     DB_NAME = "jeevsetu_v9_ui.db" 
     def __init__(self): self._init_tables()
@@ -228,8 +221,13 @@ class DatabaseService:
         c.execute('''CREATE TABLE IF NOT EXISTS users (
             email TEXT PRIMARY KEY, password_hash TEXT, salt TEXT, name TEXT, role TEXT, 
             age INTEGER, blood TEXT, totp_secret TEXT, reg_no TEXT, area TEXT, 
-            created_at TEXT, weight INTEGER, medical_history TEXT
+            created_at TEXT, weight INTEGER, medical_history TEXT, lat REAL, lon REAL
         )''')
+        # Area coordinates resolved at registration (gazetteer.py); older databases gain the columns
+        user_columns = {row[1] for row in c.execute("PRAGMA table_info(users)")}
+        for column in ("lat", "lon"):
+            if column not in user_columns:
+                c.execute(f"ALTER TABLE users ADD COLUMN {column} REAL")
         c.execute('''CREATE TABLE IF NOT EXISTS donors (
             id TEXT PRIMARY KEY, hospital TEXT, organ TEXT, blood_type TEXT, 
             lat REAL, lon REAL, hla_json TEXT, contact TEXT, harvest_time TEXT
@@ -246,6 +244,14 @@ class DatabaseService:
             ]
             c.executemany("INSERT INTO donors VALUES (?,?,?,?,?,?,?,?,?)", seed_data)
             conn.commit()
+        
+        # donors_version changes with every write to donors; cached searches key on it
+        c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        c.execute("INSERT OR IGNORE INTO meta VALUES ('donors_version', 0)")
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS donors_version_{op.lower()} AFTER {op} ON donors
+                BEGIN UPDATE meta SET value = value + 1 WHERE key = 'donors_version'; END""")
+        conn.commit()
         conn.close()
 
     def execute(self, query, params=(), fetch_one=False, fetch_all=False):
@@ -257,39 +263,49 @@ class DatabaseService:
             conn.commit()
         except Exception as e: st.error(f"DB Error: {e}")
         finally: conn.close()
-
-class MLService:
-    @staticmethod
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371
-        dlat, dlon = radians(lat2 - lat1), radians(lon2 - lon1)
-        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-        return R * 2 * asin(sqrt(a))
-
-    @staticmethod
-    def calculate_compatibility(donor_row, patient_dict):
-        d_blood = donor_row[3]
-        if d_blood != 'O-' and d_blood != patient_dict['blood_type']:
-            if d_blood != patient_dict['blood_type']: return 0, 0 
-        
-        try:
-            d_hla = json.loads(donor_row[6])
-            p_hla = patient_dict['hla']
-            matches = 0
-            matches += len(set(d_hla.get('A',[])).intersection(p_hla.get('A',[])))
-            matches += len(set(d_hla.get('B',[])).intersection(p_hla.get('B',[])))
-            hla_score = (matches / 6) * 60
-        except: hla_score = 10 
-            
-        dist = MLService.haversine(patient_dict['lat'], patient_dict['lon'], donor_row[4], donor_row[5])
-        if dist > 3000: return 0, dist
-        
-        dist_score = max(0, 40 * (1 - (dist / 3000)))
-        return min(round(hla_score + dist_score, 1), 100), int(dist)
-
-db = DatabaseService()
-CITIES = {"New Delhi": (28.6139, 77.2090), "Mumbai": (19.0760, 72.8777), "Pune": (18.5204, 73.8567), "Bangalore": (12.9716, 77.5946)}
-ORGAN_LIMITS = {"Heart": 4, "Lungs": 6, "Liver": 12, "Kidney": 36, "Pancreas": 12}
+    
+    def donors_version(self):
+        row = self.execute("SELECT value FROM meta WHERE key = 'donors_version'", fetch_one=True)
+        return row[0] if row else 0
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    """DatabaseService (and its schema DDL) once per process"""
+    return DatabaseService()
+
+@st.cache_resource(show_spinner=False)
+def get_travel_matrix():
+    from travel_time import TravelTimeMatrix
+    return TravelTimeMatrix.load_if_exists()
+
+@st.cache_resource(show_spinner=False)
+def get_audit_log():
+    from audit import get_audit_logger
+    return get_audit_logger()
+
+@st.cache_resource(show_spinner=False)
+def get_registry():
+    """Registry DatabaseManager for exports and reports (JEEVSETU_REGISTRY_DB)"""
+    from database import DatabaseManager
+    return DatabaseManager(os.environ.get('JEEVSETU_REGISTRY_DB', 'data/organ_donation.db'))
+
+@st.cache_resource(show_spinner=False)
+def get_gazetteer():
+    """Offline city/PIN code gazetteer, compiled once per process"""
+    from gazetteer import get_gazetteer as load_gazetteer
+    return load_gazetteer()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def totp_qr_png(secret, email):
+    """Provisioning QR for a TOTP secret, rendered once per secret/email"""
+    import pyotp
+    import qrcode
+    uri = pyotp.totp.TOTP(secret).provisioning_uri(email, issuer_name="JeevSetu")
+    buf = io.BytesIO()
+    qrcode.make(uri).save(buf, format="PNG")
+    return buf.getvalue()
+
+db = get_db()
 
 # ================= 4. NAVIGATION & UI COMPONENTS =================
 
@@ -308,10 +324,29 @@ def go_back():
         st.session_state.page = "home"
         st.rerun()
 
+def get_user_place():
+    """Gazetteer location of the signed-in user's area, or None"""
+    user = st.session_state.user
+    if user and user.get('area'):
+        return get_gazetteer().resolve(user['area'])
+    return None
+
 def get_user_location():
-    if st.session_state.user and 'area' in st.session_state.user:
-        return CITIES.get(st.session_state.user['area'], CITIES["New Delhi"])
-    return CITIES["New Delhi"]
+    user = st.session_state.user
+    if user and user.get('lat') is not None and user.get('lon') is not None:
+        return user['lat'], user['lon']
+    place = get_user_place()
+    return (place.latitude, place.longitude) if place else CITIES["New Delhi"]
+
+def get_user_city():
+    place = get_user_place()
+    return place.name if place else "New Delhi"
+
+def hours_since(iso_timestamp):
+    try:
+        return max(0.0, (datetime.now() - datetime.fromisoformat(iso_timestamp)).total_seconds() / 3600)
+    except (TypeError, ValueError):
+        return 0.0
 
 # --- HEADER ---
 def render_header():
@@ -342,7 +377,6 @@ def render_header():
                 if st.button("Logout", key="hdr_logout", type="secondary"): 
                     st.session_state.user = None
                     st.session_state.history = []
-                    st.session_state.logs = []
                     navigate("auth")
             elif st.session_state.guest_mode:
                 if st.button("Exit", key="hdr_exit", type="secondary"):
@@ -420,6 +454,9 @@ def home_page():
             st.session_state.guest_mode = True
             st.session_state.user = None
             navigate("search")
+        if st.button("🛠 Admin Console", key="admin_console", type="secondary"):
+            st.session_state.auth_role = "Admin"
+            navigate("auth")
             
     render_footer()
 
@@ -438,6 +475,11 @@ def auth_page():
     </div>
     """, unsafe_allow_html=True)
     
+    if role == "Admin":
+        admin_login()
+        render_footer()
+        return
+
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         tab1, tab2 = st.tabs(["🔐 Login", "📝 Register"])
@@ -450,7 +492,7 @@ def auth_page():
             if st.button("Sign In", type="primary"):
                 user = db.execute("SELECT * FROM users WHERE email=?", (l_email,), fetch_one=True)
                 if user and SecurityService.hash_password(l_pass, user[2])[0] == user[1]:
-                    st.session_state.user = {"email":user[0], "name":user[3], "role":user[4], "area":user[9]}
+                    st.session_state.user = {"email":user[0], "name":user[3], "role":user[4], "area":user[9], "lat":user[13], "lon":user[14]}
                     st.session_state.guest_mode = False
                     st.session_state.history = []
                     navigate("dashboard" if user[4] == "User" else "hospital_dashboard")
@@ -465,7 +507,11 @@ def auth_page():
             r_pass = st.text_input("Password", type="password", key="r_pass", placeholder="Create a strong password")
             
             c_loc, c_bld = st.columns(2)
-            with c_loc: r_loc = st.selectbox("Location", list(CITIES.keys()))
+            with c_loc:
+                r_loc = st.text_input("City or PIN Code", placeholder="e.g. Kochi or 682001")
+                r_place = get_gazetteer().resolve(r_loc) if r_loc else None
+                if r_place: st.caption(f"📍 {r_place.name}, {r_place.state}")
+                elif r_loc: st.caption("⚠️ Location not recognised")
             with c_bld:
                 if role == "User":
                     r_blood = st.selectbox("Blood Group", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"])
@@ -476,22 +522,26 @@ def auth_page():
             st.markdown("---")
             st.caption("📷 **Two-Factor Auth:** Scan in Google Authenticator")
             
+            import pyotp
             if 'temp_secret' not in st.session_state: st.session_state.temp_secret = pyotp.random_base32()
             
             if r_email:
-                uri = pyotp.totp.TOTP(st.session_state.temp_secret).provisioning_uri(r_email, issuer_name="JeevSetu")
-                st.image(qrcode.make(uri).get_image(), width=150)
+                st.image(totp_qr_png(st.session_state.temp_secret, r_email), width=150)
                 
             otp_code = st.text_input("Verification Code", max_chars=6, placeholder="000 000")
             
             if st.button("Verify & Create Account", type="primary"):
-                if pyotp.TOTP(st.session_state.temp_secret).verify(otp_code):
+                if not r_place:
+                    st.error("❌ Enter a city or PIN code we can locate.")
+                elif pyotp.TOTP(st.session_state.temp_secret).verify(otp_code):
                     h, s = SecurityService.hash_password(r_pass)
-                    db.execute("INSERT INTO users VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", 
-                            (r_email, h, s, r_name, role, 25, r_blood, st.session_state.temp_secret, "REG-001", r_loc, datetime.now().isoformat(), 0, ""))
+                    db.execute("""INSERT INTO users (email, password_hash, salt, name, role, age, blood, totp_secret, reg_no, area,
+                            created_at, weight, medical_history, lat, lon) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                            (r_email, h, s, r_name, role, 25, r_blood, st.session_state.temp_secret, "REG-001", r_place.name,
+                             datetime.now().isoformat(), 0, "", r_place.latitude, r_place.longitude))
                     
                     if role == "Hospital":
-                        st.session_state.logs.append({"Time": datetime.now(), "Event": "Hospital Registered"})
+                        get_audit_log().log("hospital_registered", "Hospital Registered", actor_email=r_email, target_type="user")
                     
                     st.success("✅ Account Created! Please Login.")
                 else:
@@ -499,6 +549,30 @@ def auth_page():
 
     render_footer()
 
+def admin_login():
+    """Registry admins (provisioned by `python database.py`) sign in with username or email"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        a_user = st.text_input("Username or Email", key="a_user")
+        a_pass = st.text_input("Password", type="password", key="a_pass")
+        if st.button("Sign In", type="primary", key="admin_sign_in"):
+            from database import Admin
+            session = get_registry().get_session()
+            try:
+                admin = session.query(Admin).filter((Admin.username == a_user) | (Admin.email == a_user)).first()
+                valid = admin is not None and admin.check_password(a_pass)
+                account = {"email": admin.email, "name": admin.full_name, "role": "Admin", "area": ""} if valid else None
+            finally:
+                session.close()
+            if account:
+                st.session_state.user = account
+                st.session_state.guest_mode = False
+                st.session_state.history = []
+                get_audit_log().log("admin_login", "Admin signed in", actor_email=account["email"])
+                navigate("admin_dashboard")
+            else:
+                st.error("Invalid credentials.")
+
 def dashboard():
     render_header()
     
@@ -528,6 +602,72 @@ def dashboard():
         
     render_footer()
 
+@st.cache_data(ttl=60, max_entries=256, show_spinner=False)
+def search_donors(organ, blood, lat, lon, city, donors_version):
+    """Ranked matches for one search; cached per parameters and donors_version (TTL for viability windows)"""
+    patient = {
+        "organ": organ, "blood_type": blood,
+        "lat": lat, "lon": lon,
+        "hla": {"A": [2], "B": [7], "DR": [4]}
+    }
+    raw = db.execute("SELECT * FROM donors WHERE organ=?", (organ,), fetch_all=True) or []
+    from travel_time import hospital_key, city_key
+    travel_matrix = get_travel_matrix()
+    destination = city_key(city)
+    matches = []
+    for d in raw:
+        # Drop organs that cannot arrive inside their remaining viability window
+        if travel_matrix and not travel_matrix.is_feasible(hospital_key(d[1]), destination, organ, hours_since(d[8])):
+            continue
+        score, dist = MLService.calculate_compatibility(d, patient)
+        if score > 0:
+            matches.append({"id":d[0], "hosp":d[1], "score":score, "dist":dist, "lat":d[4], "lon":d[5], "blood":d[3]})
+    return sorted(matches, key=lambda x: x['score'], reverse=True)
+
+def set_match_page(page):
+    st.session_state.match_page = page
+
+@st.fragment
+def render_match_list(matches, is_guest, page_size=10):
+    """One page of match cards; paging and card buttons rerun only this fragment"""
+    pages = max(1, -(-len(matches) // page_size))
+    page = min(st.session_state.get("match_page", 1), pages)
+    
+    for m in matches[(page - 1) * page_size:page * page_size]:
+        # Custom Card for Match
+        with st.container():
+            st.markdown(f"""
+            <div style="background:white; padding:20px; border-radius:15px; border-left: 5px solid #e11d48; margin-bottom:15px; box-shadow:0 4px 10px rgba(0,0,0,0.05);">
+                <div style="display:flex; justify-content:space-between; align-items:center;">
+                    <div>
+                        <h4 style="margin:0;">{m['hosp']}</h4>
+                        <p style="margin:0; font-size:0.9rem;">Distance: <b>{m['dist']} km</b> | Blood: <b>{m['blood']}</b></p>
+                    </div>
+                    <div style="text-align:right;">
+                        <h2 style="margin:0; color:#e11d48;">{m['score']}%</h2>
+                        <span style="font-size:0.8rem; color:#64748b;">MATCH SCORE</span>
+                    </div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            c_act1, c_act2, c_act3 = st.columns([1,2,1])
+            with c_act2:
+                if is_guest:
+                    if st.button(f"🔒 Login to Contact {m['id']}", key=m['id']):
+                        st.session_state.guest_mode = False
+                        st.session_state.auth_role = "User"
+                        navigate("auth")
+                else:
+                    if st.button(f"Request Connection ({m['id']})", key=m['id'], type="primary"):
+                        st.toast("✅ Request Sent to Transplant Coordinator!", icon="📩")
+    
+    if pages > 1:
+        p1, p2, p3 = st.columns([1, 2, 1])
+        p1.button("← Previous", key="match_prev", disabled=page <= 1, on_click=set_match_page, args=(page - 1,))
+        p2.markdown(f"<p style='text-align:center;'>Page {page} of {pages}</p>", unsafe_allow_html=True)
+        p3.button("Next →", key="match_next", disabled=page >= pages, on_click=set_match_page, args=(page + 1,))
+
 def search_page():
     render_header()
     is_guest = st.session_state.get('guest_mode', False)
@@ -550,22 +690,15 @@ def search_page():
 
     if submitted:
         u_loc = get_user_location()
-        patient = {
-            "organ": s_organ, "blood_type": s_blood, 
-            "lat": u_loc[0], "lon": u_loc[1],
-            "hla": {"A": [2], "B": [7], "DR": [4]}
+        st.session_state.search = {
+            "organ": s_organ, "blood": s_blood,
+            "lat": u_loc[0], "lon": u_loc[1], "city": get_user_city()
         }
-        
+        st.session_state.match_page = 1
+    
+    if st.session_state.get("search"):
         with st.spinner("Analyzing genetic compatibility and logistics..."):
-            time.sleep(1) # UX Pause
-            raw = db.execute("SELECT * FROM donors WHERE organ=?", (s_organ,), fetch_all=True)
-            matches = []
-            for d in raw:
-                score, dist = MLService.calculate_compatibility(d, patient)
-                if score > 0:
-                    matches.append({"id":d[0], "hosp":d[1], "score":score, "dist":dist, "lat":d[4], "lon":d[5], "blood":d[3]})
-            
-            matches = sorted(matches, key=lambda x: x['score'], reverse=True)
+            matches = search_donors(**st.session_state.search, donors_version=db.donors_version())
         
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -573,38 +706,12 @@ def search_page():
             st.success(f"✅ Analysis Complete: {len(matches)} potential matches found.")
             
             # Map Section
+            import pandas as pd
             map_df = pd.DataFrame(matches)
             map_df['color'] = "#e11d48"
             st.map(map_df, latitude='lat', longitude='lon', color='color', size=20, use_container_width=True)
             
-            for m in matches:
-                # Custom Card for Match
-                with st.container():
-                    st.markdown(f"""
-                    <div style="background:white; padding:20px; border-radius:15px; border-left: 5px solid #e11d48; margin-bottom:15px; box-shadow:0 4px 10px rgba(0,0,0,0.05);">
-                        <div style="display:flex; justify-content:space-between; align-items:center;">
-                            <div>
-                                <h4 style="margin:0;">{m['hosp']}</h4>
-                                <p style="margin:0; font-size:0.9rem;">Distance: <b>{m['dist']} km</b> | Blood: <b>{m['blood']}</b></p>
-                            </div>
-                            <div style="text-align:right;">
-                                <h2 style="margin:0; color:#e11d48;">{m['score']}%</h2>
-                                <span style="font-size:0.8rem; color:#64748b;">MATCH SCORE</span>
-                            </div>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    c_act1, c_act2, c_act3 = st.columns([1,2,1])
-                    with c_act2:
-                        if is_guest:
-                            if st.button(f"🔒 Login to Contact {m['id']}", key=m['id']):
-                                st.session_state.guest_mode = False
-                                st.session_state.auth_role = "User"
-                                navigate("auth")
-                        else:
-                            if st.button(f"Request Connection ({m['id']})", key=m['id'], type="primary"):
-                                st.toast("✅ Request Sent to Transplant Coordinator!", icon="📩")
+            render_match_list(matches, is_guest)
         else:
             st.error("No compatible matches found at this time.")
 
@@ -613,6 +720,43 @@ def search_page():
     
     render_footer()
 
+FEED_LIST_LIMIT = 20
+
+def feed_query(q):
+    if q:
+        return "SELECT * FROM donors WHERE organ LIKE ? OR blood_type LIKE ?", (f"%{q}%", f"%{q}%")
+    return "SELECT * FROM donors", ()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def sos_feed_clusters(q, donors_version):
+    """Clustered map layer for the whole feed; cached per filter and donors_version"""
+    query, params = feed_query(q)
+    points = [(d[0], d[4], d[5]) for d in db.execute(query, params, fetch_all=True) or []]
+    zoom = MapService.fit_zoom([(lat, lon) for _, lat, lon in points if lat is not None and lon is not None])
+    return MapService.cluster_points(points, zoom)
+
+def render_sos_map(clusters, zoom):
+    """One pydeck layer: a bubble per cluster labelled with its point number"""
+    import pandas as pd
+    import pydeck as pdk
+    map_df = pd.DataFrame([{k: c[k] for k in ('point', 'lat', 'lon', 'count')} for c in clusters])
+    map_df['label'] = map_df['point'].astype(str)
+    # Bubble area tracks cluster size; the largest roughly fills its grid cell
+    cell_m = 22.5 / 2 ** zoom * 111000
+    map_df['radius'] = cell_m * 0.5 * (map_df['count'] / map_df['count'].max()) ** 0.5
+    center = (map_df['lat'].mean(), map_df['lon'].mean())
+    st.pydeck_chart(pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(latitude=center[0], longitude=center[1], zoom=zoom),
+        layers=[
+            pdk.Layer("ScatterplotLayer", map_df, get_position=["lon", "lat"], get_radius="radius",
+                      get_fill_color=[239, 68, 68, 170], pickable=True),
+            pdk.Layer("TextLayer", map_df, get_position=["lon", "lat"], get_text="label",
+                      get_size=14, get_color=[255, 255, 255, 255]),
+        ],
+        tooltip={"text": "📍 Point {point}: {count} donor(s)"}
+    ), use_container_width=True)
+
 def sos_page():
     render_header()
     st.markdown("""
@@ -630,10 +774,8 @@ def sos_page():
         st.write("")
         search_btn = st.button("Search", type="primary")
 
-    if q:
-        donors = db.execute("SELECT * FROM donors WHERE organ LIKE ? OR blood_type LIKE ?", (f"%{q}%", f"%{q}%"), fetch_all=True)
-    else:
-        donors = db.execute("SELECT * FROM donors LIMIT 20", fetch_all=True)
+    query, params = feed_query(q)
+    donors = db.execute(query + f" LIMIT {FEED_LIST_LIMIT}", params, fetch_all=True)
 
     if not donors:
         # --- NEW LOGIC FOR BROADCAST ---
@@ -662,31 +804,32 @@ def sos_page():
                         my_bar.progress(percent_complete + 1, text=f"Sending encrypted alerts to {count} users...")
                     
                     # Log the event
-                    st.session_state.logs.append({
-                        "Time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                        "Event": f"SOS Broadcast: {q} required. Alerted {count} users."
-                    })
+                    actor = st.session_state.user['email'] if st.session_state.user else None
+                    get_audit_log().log("sos_broadcast", f"SOS Broadcast: {q} required. Alerted {count} users.", actor_email=actor)
                     
                     st.success(f"✅ Alert Successfully Sent to {count} Registered Users & Hospitals!")
                     st.caption("Emails and SMS have been queued via the notification gateway.")
         # -------------------------------
     else:
+        clusters, point_of, zoom = sos_feed_clusters(q, db.donors_version())
+        total = sum(c['count'] for c in clusters)
+        if clusters:
+            render_sos_map(clusters, zoom)
+        if total > len(donors):
+            st.caption(f"Map shows all {total} donors; listing the first {len(donors)}. Refine the filter to narrow the list.")
         for d in donors:
-            with st.expander(f"🔴 {d[3]} {d[2]} - {d[1]} (View Details)"):
-                mc1, mc2 = st.columns([1, 1])
-                with mc1:
-                    st.markdown(f"""
-                    <div style="background:#fff1f2; padding:15px; border-radius:10px;">
-                        <b>Donor ID:</b> {d[0]}<br>
-                        <b>Contact:</b> {d[7]}<br>
-                        <b>Logged:</b> {d[8][:16]}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    st.write("")
-                    if st.button(f"📞 Call Coordinator {d[0]}", key=f"sos_{d[0]}"): st.toast(f"Dialing {d[7]}...")
-                with mc2:
-                    m_df = pd.DataFrame({'lat': [d[4]], 'lon': [d[5]], 'color': ['#ef4444']})
-                    st.map(m_df, latitude='lat', longitude='lon', color='color', zoom=11, use_container_width=True)
+            point = point_of.get(d[0])
+            marker = f"📍 {point} · " if point else ""
+            with st.expander(f"{marker}🔴 {d[3]} {d[2]} - {d[1]} (View Details)"):
+                st.markdown(f"""
+                <div style="background:#fff1f2; padding:15px; border-radius:10px;">
+                    <b>Donor ID:</b> {d[0]}<br>
+                    <b>Contact:</b> {d[7]}<br>
+                    <b>Logged:</b> {d[8][:16]}
+                </div>
+                """, unsafe_allow_html=True)
+                st.write("")
+                if st.button(f"📞 Call Coordinator {d[0]}", key=f"sos_{d[0]}"): st.toast(f"Dialing {d[7]}...")
 
     st.markdown("<br>", unsafe_allow_html=True)
     if st.button("← Back"): go_back()
@@ -694,7 +837,9 @@ def sos_page():
     render_footer()
 
 def hospital_dashboard():
+    import pandas as pd
     render_header()
+    audit_log = get_audit_log()
     
     st.markdown(f"""
     <div style='display:flex; justify-content:space-between; align-items:center; margin-bottom:20px;'>
@@ -703,7 +848,7 @@ def hospital_dashboard():
     </div>
     """, unsafe_allow_html=True)
     
-    tab1, tab2, tab3 = st.tabs(["📋 Inventory", "📂 Upload Data", "🕒 Activity Logs"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📋 Inventory", "📂 Upload Data", "🕒 Activity Logs", "📤 Export"])
     
     with tab1:
         st.info("Manage your current organ inventory and active donors.")
@@ -722,19 +867,117 @@ def hospital_dashboard():
             st.success(f"File '{uploaded_file.name}' uploaded successfully!")
             with st.spinner("Encrypting and syncing with registry..."):
                 time.sleep(1.5)
-                log_entry = {"Time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Event": f"Uploaded {uploaded_file.name}"}
-                st.session_state.logs.append(log_entry)
+                audit_log.log("donor_upload", f"Uploaded {uploaded_file.name}", actor_email=st.session_state.user['email'])
                 st.success("Database updated.")
         st.markdown("</div>", unsafe_allow_html=True)
 
     with tab3:
         st.write("**System Audit Logs**")
-        if not st.session_state.logs:
+        page_size = 25
+        page = st.number_input("Page", min_value=1, value=1, step=1, key="audit_page")
+        rows, total = audit_log.fetch_page(page, page_size, actor_email=st.session_state.user['email'])
+        if total == 0:
             st.caption("No activity recorded yet.")
         else:
-            log_df = pd.DataFrame(st.session_state.logs)
-            st.dataframe(log_df, use_container_width=True, hide_index=True)
+            st.dataframe(pd.DataFrame(rows, columns=["Time", "Event", "Details"]), use_container_width=True, hide_index=True)
+            st.caption(f"Page {page} of {max(1, -(-total // page_size))} · {total} events")
+        if audit_log.pending:
+            st.caption(f"{audit_log.pending} recent events are still being written.")
+
+    with tab4:
+        st.write("**Export Registry Data**")
+        import exports
+        email = st.session_state.user['email']
+        try:
+            hospital_id = exports.hospital_id_for_email(get_registry(), email)
+        except Exception as e:
+            print(f"⚠️ Export lookup failed: {str(e)}")
+            hospital_id = None
+        if hospital_id is None:
+            st.caption("This account is not linked to a registry hospital.")
+        else:
+            kind = st.radio("Data", ["donors", "matches"], horizontal=True, format_func=str.title)
+            fmt = st.radio("Format", ["csv", "parquet"], horizontal=True, format_func=str.upper)
+            file_name = exports.export_filename(kind, hospital_id, fmt)
+            export_base = os.environ.get('JEEVSETU_EXPORT_URL')
+            if export_base and os.environ.get('JEEVSETU_EXPORT_SECRET'):
+                # Streamed by the export server straight to the browser
+                st.link_button("⬇️ Download", exports.export_url(export_base, hospital_id, kind, fmt))
+            elif st.button("Prepare Export", key="prepare_export"):
+                import tempfile
+                with st.spinner("Exporting..."):
+                    with tempfile.TemporaryDirectory() as tmp:
+                        path = os.path.join(tmp, file_name)
+                        exports.write_export(get_registry(), kind, hospital_id, fmt, path)
+                        with open(path, 'rb') as f:
+                            data = f.read()
+                audit_log.log("data_export", f"Exported {kind} as {fmt}", actor_email=email)
+                st.download_button("⬇️ Download", data, file_name=file_name, mime=exports.FORMATS[fmt])
+
+    render_footer()
 
+def admin_dashboard():
+    import pandas as pd
+    import rollups
+    render_header()
+    if not st.session_state.user or st.session_state.user.get('role') != "Admin":
+        st.error("Admin access required.")
+        render_footer()
+        return
+
+    st.markdown("### 🛠 Registry Outcomes")
+    registry = get_registry()
+    as_of = rollups.high_water_mark(registry)
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        window = st.selectbox("Period", ["Last 12 months", "Last 3 months", "All time"], key="rollup_window")
+    with c2:
+        st.write("")
+        if st.button("🔄 Update Rollups", key="update_rollups"):
+            with st.spinner("Folding in new donations and matches..."):
+                report = rollups.update(registry)
+            st.success(f"Added {report['donations']} donations and {report['matches']} matches.")
+            as_of = rollups.high_water_mark(registry)
+    months_back = {"Last 12 months": 11, "Last 3 months": 2}.get(window)
+    since_month = None
+    if months_back is not None:
+        today = datetime.now()
+        year, month = divmod(today.year * 12 + today.month - 1 - months_back, 12)
+        since_month = f"{year:04d}-{month + 1:02d}"
+
+    if as_of is None:
+        st.info("Rollups have not been built yet. Run `python rollups.py rebuild` or click Update Rollups.")
+        render_footer()
+        return
+
+    outcomes = rollups.success_rates(registry, 'month', since_month)
+    conversions = rollups.conversion_rates(registry, 'month', since_month)
+    donations = sum(r['donations'] for r in outcomes)
+    successes = sum(r['successes'] for r in outcomes)
+    matches = sum(r['matches'] for r in conversions)
+    converted = sum(r['conversions'] for r in conversions)
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Donations", f"{donations:,}")
+    m2.metric("Success Rate", f"{successes / donations:.1%}" if donations else "–")
+    m3.metric("Match → Donation", f"{converted / matches:.2%}" if matches else "–")
+
+    tab1, tab2, tab3 = st.tabs(["🫀 By Organ", "📍 By State", "📅 By Month"])
+    for tab, by in ((tab1, 'organ'), (tab2, 'state'), (tab3, 'month')):
+        with tab:
+            df_out = pd.DataFrame(rollups.success_rates(registry, by, since_month), columns=["key", "donations", "successes", "success_rate"])
+            df_conv = pd.DataFrame(rollups.conversion_rates(registry, by, since_month), columns=["key", "matches", "conversions", "conversion_rate"])
+            df = df_out.merge(df_conv, on="key", how="outer").fillna({"donations": 0, "successes": 0, "matches": 0, "conversions": 0})
+            df = df.rename(columns={"key": by.title(), "donations": "Donations", "successes": "Successes", "success_rate": "Success Rate",
+                                    "matches": "Matches", "conversions": "Converted", "conversion_rate": "Conversion"})
+            if by == 'month':
+                st.line_chart(df.set_index("Month")[["Success Rate", "Conversion"]])
+            else:
+                st.bar_chart(df.set_index(by.title())["Success Rate"])
+            st.dataframe(df, use_container_width=True, hide_index=True, column_config={
+                "Success Rate": st.column_config.NumberColumn(format="%.3f"),
+                "Conversion": st.column_config.NumberColumn(format="%.4f"),
+            })
+    st.caption(f"Rollups current to {as_of:%Y-%m-%d %H:%M} UTC")
     render_footer()
 
 # ================= 6. ROUTER =================
@@ -743,4 +986,5 @@ elif st.session_state.page == "auth": auth_page()
 elif st.session_state.page == "dashboard": dashboard()
 elif st.session_state.page == "search": search_page()
 elif st.session_state.page == "sos": sos_page()
-elif st.session_state.page == "hospital_dashboard": hospital_dashboard()
\ No newline at end of file
+elif st.session_state.page == "hospital_dashboard": hospital_dashboard()
+elif st.session_state.page == "admin_dashboard": admin_dashboard()
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""Write-behind audit and activity logging for Organ Donation Platform
+
+Interactive code paths call AuditLogger.log(), which only appends to a
+bounded in-memory queue. A background writer thread flushes the queue into
+the audit_logs table in batched transactions when either the batch size or
+the flush interval is reached, so logging never adds a synchronous database
+write to a request. When the queue is full new events are dropped and counted
+rather than blocking the caller.
+
+Events go to a dedicated audit database (data/audit.db, database.py schema);
+set JEEVSETU_AUDIT_DB to write them somewhere else. A legacy
+audit_logs(id, actor, action, timestamp) table found there is renamed to
+audit_logs_legacy and its rows are copied into the current table.
+"""
+import os
+import atexit
+import queue
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import insert, inspect, text, func
+from database import DatabaseManager, AuditLog
+from metrics import REGISTRY
+
+AUDIT_EVENTS = REGISTRY.counter(
+    'jeevsetu_audit_events_total', 'Audit events by outcome', ['outcome']
+)
+AUDIT_FLUSH_SECONDS = REGISTRY.histogram(
+    'jeevsetu_audit_flush_seconds', 'Duration of one batched audit_logs insert'
+)
+
+DEFAULT_AUDIT_DB = "data/audit.db"
+
+class AuditLogger:
+    def __init__(self, db_manager=None, max_buffer=10000, batch_size=200, flush_interval_s=2.0):
+        self.db_manager = db_manager or DatabaseManager()
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.enabled = self._ensure_schema()
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _ensure_schema(self):
+        """Add columns introduced after older databases were created"""
+        try:
+            columns = {c['name']: c for c in inspect(self.db_manager.engine).get_columns('audit_logs')}
+            if 'action_type' not in columns:
+                self._migrate_legacy_table()
+            elif 'actor_email' not in columns or not columns['admin_id']['nullable']:
+                self._rebuild_table()
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not prepare audit_logs: {str(e)}")
+            return False
+
+    def _migrate_legacy_table(self):
+        """Move a pre-ORM audit_logs(id, actor, action, timestamp) table aside and carry its rows over"""
+        table = AuditLog.__table__
+        with self.db_manager.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE audit_logs RENAME TO audit_logs_legacy"))
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            table.create(conn)
+            copied = conn.execute(text(
+                "INSERT INTO audit_logs (action_type, description, actor_email, created_at) "
+                "SELECT 'legacy', COALESCE(action, ''), actor, datetime(timestamp) FROM audit_logs_legacy ORDER BY id"
+            )).rowcount
+        print(f"✅ Legacy audit_logs migrated ({copied} events; original kept as audit_logs_legacy)")
+
+    def _rebuild_table(self):
+        """Recreate audit_logs with the current schema (nullable admin_id, actor_email)"""
+        table = AuditLog.__table__
+        with self.db_manager.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE audit_logs RENAME TO audit_logs_old"))
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            table.create(conn)
+            copied = "id, admin_id, action_type, target_type, target_id, description, ip_address, created_at"
+            conn.execute(text(f"INSERT INTO audit_logs ({copied}) SELECT {copied} FROM audit_logs_old"))
+            conn.execute(text("DROP TABLE audit_logs_old"))
+        print("✅ audit_logs upgraded (actor_email, optional admin_id)")
+
+    def log(self, action_type, description, actor_email=None, admin_id=None,
+            target_type=None, target_id=None, ip_address=None):
+        """Queue an audit event (never blocks, never touches the database)"""
+        if not self.enabled:
+            return False
+        event = {
+            'action_type': action_type,
+            'description': description,
+            'actor_email': actor_email,
+            'admin_id': admin_id,
+            'target_type': target_type,
+            'target_id': target_id,
+            'ip_address': ip_address,
+            'created_at': datetime.now(timezone.utc)
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            AUDIT_EVENTS.labels(outcome="dropped").inc()
+            return False
+        AUDIT_EVENTS.labels(outcome="queued").inc()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything queued so far; returns the number of events written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                started = datetime.now(timezone.utc)
+                try:
+                    with self.db_manager.engine.begin() as conn:
+                        conn.execute(insert(AuditLog.__table__), batch)
+                except Exception as e:
+                    AUDIT_EVENTS.labels(outcome="failed").inc(len(batch))
+                    print(f"❌ Error writing audit logs: {str(e)}")
+                    break
+                AUDIT_FLUSH_SECONDS.observe((datetime.now(timezone.utc) - started).total_seconds())
+                AUDIT_EVENTS.labels(outcome="written").inc(len(batch))
+                written += len(batch)
+        return written
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the writer and flush what is left"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def fetch_page(self, page=1, page_size=25, actor_email=None, action_type=None):
+        """
+        Read one page of audit events, newest first
+
+        Returns:
+            (list of event dicts, total matching events)
+        """
+        if not self.enabled:
+            return [], 0
+        session = self.db_manager.get_session()
+        try:
+            query = session.query(AuditLog)
+            if actor_email:
+                query = query.filter(AuditLog.actor_email == actor_email)
+            if action_type:
+                query = query.filter(AuditLog.action_type == action_type)
+            total = query.with_entities(func.count(AuditLog.id)).scalar()
+            rows = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).offset(
+                max(0, page - 1) * page_size
+            ).limit(page_size).all()
+            return [
+                {
+                    'Time': row.created_at.strftime("%Y-%m-%d %H:%M:%S") if row.created_at else "",
+                    'Event': row.action_type,
+                    'Details': row.description,
+                    'Actor': row.actor_email or "",
+                }
+                for row in rows
+            ], total
+        finally:
+            session.close()
+
+_default_logger = None
+_default_lock = threading.Lock()
+
+def get_audit_logger(db_manager=None):
+    """Process-wide AuditLogger (one writer thread per process)"""
+    global _default_logger
+    with _default_lock:
+        if _default_logger is None:
+            _default_logger = AuditLogger(
+                db_manager or DatabaseManager(os.environ.get('JEEVSETU_AUDIT_DB', DEFAULT_AUDIT_DB))
+            )
+        return _default_logger
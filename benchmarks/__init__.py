@@ -0,0 +1 @@
+"""Benchmark suite and registry seeder for Organ Donation Platform"""
@@ -0,0 +1,399 @@
+"""Concurrent load test for SOS matching and app flows
+
+Drives a weighted mix of operations against a seeded registry and a scratch
+copy of the app's SQLite database, entirely offline:
+
+- find_matches: MatchingEngine.find_matches for a random patient
+- sos_create:   insert an SOSCase through the ORM
+- app_login:    the app's login query and password check
+- app_search:   the app's donor search and compatibility scoring
+
+Workers are threads, processes or asyncio tasks. Without --rate each worker
+runs closed-loop (next request as soon as the last returns); with --rate
+requests arrive as a Poisson process and latency is measured from the
+scheduled arrival, so queueing behind a saturated node is counted. The report
+has throughput, p50/p95/p99 and error / "database is locked" counts per
+interval and per operation:
+
+    python -m benchmarks.load_test --donors 50000 --concurrency 16 --duration 30
+    python -m benchmarks.load_test --db data/benchmark.db --mode process --concurrency 8 --rate 40
+    python -m benchmarks.load_test --mix find_matches=1 --concurrency 32 --output load.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import event
+from database import DatabaseManager, SOSCase, User, BloodGroup, OrganType, ApprovalStatus
+from services import SecurityService, MLService, CITIES
+from benchmarks.seed_registry import RegistrySeeder, SEED_CITIES, HLA_ANTIGENS
+
+DEFAULT_MIX = {'find_matches': 6, 'sos_create': 1, 'app_login': 2, 'app_search': 3}
+LOGIN_PASSWORD = "LoadTest@123"
+APP_ORGANS = ["Kidney", "Liver", "Heart", "Lungs", "Pancreas"]
+
+def is_lock_error(error):
+    return "database is locked" in str(error) or "database table is locked" in str(error)
+
+def seed_app_db(path, users=200, donors=2000, seed=42):
+    """Scratch database with the app's users/donors schema (see app.DatabaseService)"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS users (
+        email TEXT PRIMARY KEY, password_hash TEXT, salt TEXT, name TEXT, role TEXT,
+        age INTEGER, blood TEXT, totp_secret TEXT, reg_no TEXT, area TEXT,
+        created_at TEXT, weight INTEGER, medical_history TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS donors (
+        id TEXT PRIMARY KEY, hospital TEXT, organ TEXT, blood_type TEXT,
+        lat REAL, lon REAL, hla_json TEXT, contact TEXT, harvest_time TEXT
+    )''')
+    now = datetime.now().isoformat()
+    user_rows = []
+    for i in range(users):
+        password_hash, salt = SecurityService.hash_password(LOGIN_PASSWORD)
+        user_rows.append((f"load{i}@example.com", password_hash, salt, f"Load User {i}", "Hospital",
+                          40, "O+", None, None, "New Delhi", now, 70, ""))
+    c.executemany("INSERT OR REPLACE INTO users VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", user_rows)
+    bloods = [b.value for b in BloodGroup]
+    donor_rows = []
+    for i in range(donors):
+        _, _, lat, lon = rng.choice(SEED_CITIES)
+        hla = {locus: rng.sample(alleles, 2) for locus, alleles in HLA_ANTIGENS.items()}
+        donor_rows.append((f"L-{i}", "Load Hospital", rng.choice(APP_ORGANS), rng.choice(bloods),
+                           lat, lon, json.dumps(hla), "9000000000", now))
+    c.executemany("INSERT OR REPLACE INTO donors VALUES (?,?,?,?,?,?,?,?,?)", donor_rows)
+    conn.commit()
+    conn.close()
+    return {'users': users, 'donors': donors}
+
+class LockCounter:
+    """Flags SQLAlchemy errors caused by SQLite locking on the current thread"""
+    def __init__(self, engine):
+        self.local = threading.local()
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        if is_lock_error(context.original_exception):
+            self.local.locked = True
+
+    def pop(self):
+        locked = getattr(self.local, 'locked', False)
+        self.local.locked = False
+        return locked
+
+class LoadContext:
+    """Per-process targets: one MatchingEngine, the registry and the app database"""
+    def __init__(self, db_path, app_db_path, model_path):
+        from matching_engine import MatchingEngine
+        self.app_db_path = app_db_path
+        self.db_manager = DatabaseManager(db_path)
+        self.locks = LockCounter(self.db_manager.engine)
+        with quiet():
+            self.engine = MatchingEngine(self.db_manager, model_path=model_path)
+
+        session = self.db_manager.get_session()
+        try:
+            self.user_ids = [uid for (uid,) in session.query(User.id).limit(1000)]
+        finally:
+            session.close()
+        conn = sqlite3.connect(app_db_path)
+        try:
+            self.app_emails = [row[0] for row in conn.execute("SELECT email FROM users LIMIT 1000")]
+        finally:
+            conn.close()
+
+    def _patient(self, rng):
+        city, state, _, _ = rng.choice(SEED_CITIES)
+        return {
+            'blood_group': rng.choice(list(BloodGroup)),
+            'organ_type': rng.choice([OrganType.KIDNEY, OrganType.LIVER, OrganType.HEART]),
+            'urgency_level': rng.randint(1, 5),
+            'age': rng.randint(5, 75),
+            'city': city,
+            'state': state
+        }
+
+    def find_matches(self, rng):
+        self.engine.find_matches(patient_data=self._patient(rng))
+
+    def sos_create(self, rng):
+        if not self.user_ids:
+            raise RuntimeError("registry has no users to file SOS cases for")
+        patient = self._patient(rng)
+        session = self.db_manager.get_session()
+        try:
+            session.add(SOSCase(
+                user_id=rng.choice(self.user_ids), patient_name="Load Test Patient",
+                patient_age=patient['age'], blood_group=patient['blood_group'],
+                organ_required=patient['organ_type'], urgency_level=patient['urgency_level'],
+                city=patient['city'], state=patient['state'], status="active",
+                approval_status=ApprovalStatus.APPROVED
+            ))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def app_login(self, rng):
+        conn = sqlite3.connect(self.app_db_path)
+        try:
+            user = conn.execute("SELECT * FROM users WHERE email=?", (rng.choice(self.app_emails),)).fetchone()
+            if not (user and SecurityService.hash_password(LOGIN_PASSWORD, user[2])[0] == user[1]):
+                raise RuntimeError("login failed")
+        finally:
+            conn.close()
+
+    def app_search(self, rng):
+        city = rng.choice(list(CITIES))
+        lat, lon = CITIES[city]
+        patient = {"organ": rng.choice(APP_ORGANS), "blood_type": rng.choice([b.value for b in BloodGroup]),
+                   "lat": lat, "lon": lon, "hla": {"A": [2], "B": [7], "DR": [4]}}
+        conn = sqlite3.connect(self.app_db_path)
+        try:
+            rows = conn.execute("SELECT * FROM donors WHERE organ=?", (patient['organ'],)).fetchall()
+        finally:
+            conn.close()
+        scored = [(MLService.calculate_compatibility(row, patient), row) for row in rows]
+        return sorted(scored, key=lambda item: item[0][0], reverse=True)[:20]
+
+    def call(self, op, rng):
+        """Run one operation; returns 'ok', 'error' or 'lock_timeout'"""
+        self.locks.pop()
+        try:
+            getattr(self, op)(rng)
+            outcome = "ok"
+        except Exception as e:
+            outcome = "lock_timeout" if is_lock_error(e) else "error"
+        # find_matches reports failures by returning [], so also ask the engine hook
+        if self.locks.pop():
+            outcome = "lock_timeout"
+        return outcome
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the emoji progress prints of the code under test"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def _choose(rng, ops, weights):
+    return rng.choices(ops, weights=weights)[0]
+
+def _arrivals(rng, rate, duration):
+    """Poisson arrival offsets (seconds) within the run"""
+    t = rng.expovariate(rate)
+    while t < duration:
+        yield t
+        t += rng.expovariate(rate)
+
+def _closed_worker(context, mix, duration, seed, started_at):
+    rng = random.Random(seed)
+    ops, weights = list(mix), list(mix.values())
+    samples = []
+    while True:
+        start = time.perf_counter()
+        if start - started_at >= duration:
+            return samples
+        op = _choose(rng, ops, weights)
+        outcome = context.call(op, rng)
+        samples.append((op, start - started_at, time.perf_counter() - start, outcome))
+
+def run_threads(context, mix, concurrency, duration, rate=None, seed=42):
+    """Closed-loop workers, or an open-loop Poisson dispatcher onto a pool of `concurrency` threads"""
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        if rate is None:
+            futures = [pool.submit(_closed_worker, context, mix, duration, seed + i, started_at) for i in range(concurrency)]
+            return [sample for future in futures for sample in future.result()]
+
+        rng = random.Random(seed)
+        ops, weights = list(mix), list(mix.values())
+
+        def issue(op, scheduled, worker_seed):
+            outcome = context.call(op, random.Random(worker_seed))
+            # Latency from the scheduled arrival includes time spent queued for a worker
+            return (op, scheduled, time.perf_counter() - started_at - scheduled, outcome)
+
+        futures = []
+        for offset in _arrivals(rng, rate, duration):
+            delay = started_at + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(issue, _choose(rng, ops, weights), offset, rng.getrandbits(32)))
+        return [future.result() for future in futures]
+
+def run_asyncio(context, mix, concurrency, duration, rate=None, seed=42):
+    """Same workload from an event loop; blocking calls run on `concurrency` executor threads"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load"))
+        started_at = time.perf_counter()
+        rng = random.Random(seed)
+        ops, weights = list(mix), list(mix.values())
+
+        async def issue(op, scheduled, worker_rng):
+            outcome = await loop.run_in_executor(None, context.call, op, worker_rng)
+            return (op, scheduled, time.perf_counter() - started_at - scheduled, outcome)
+
+        if rate is None:
+            async def worker(i):
+                worker_rng, samples = random.Random(seed + i), []
+                while time.perf_counter() - started_at < duration:
+                    samples.append(await issue(_choose(worker_rng, ops, weights), time.perf_counter() - started_at, worker_rng))
+                return samples
+            results = await asyncio.gather(*(worker(i) for i in range(concurrency)))
+            return [sample for samples in results for sample in samples]
+
+        tasks = []
+        for offset in _arrivals(rng, rate, duration):
+            await asyncio.sleep(max(0.0, started_at + offset - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(issue(_choose(rng, ops, weights), offset, random.Random(rng.getrandbits(32)))))
+        return list(await asyncio.gather(*tasks))
+
+    return asyncio.run(main())
+
+def _process_worker(config, index, start_at):
+    """One process = one context + one closed-loop (or rate/concurrency open-loop) worker"""
+    with quiet():
+        context = LoadContext(config['db'], config['app_db'], config['model'])
+    # All processes start together once their engines are warm
+    time.sleep(max(0.0, start_at - time.time()))
+    rate = config['rate'] / config['concurrency'] if config['rate'] else None
+    with quiet():
+        return run_threads(context, config['mix'], 1, config['duration'], rate, config['seed'] + index)
+
+def run_processes(config):
+    start_at = time.time() + 5.0 + 0.5 * config['concurrency']
+    with ProcessPoolExecutor(max_workers=config['concurrency']) as pool:
+        futures = [pool.submit(_process_worker, config, i, start_at) for i in range(config['concurrency'])]
+        return [sample for future in futures for sample in future.result()]
+
+def _stats(samples):
+    latencies = [s[2] * 1000.0 for s in samples]
+    outcomes = [s[3] for s in samples]
+    return {
+        'requests': len(samples),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3) if latencies else 0.0,
+        'max_ms': round(max(latencies), 3) if latencies else 0.0,
+        'errors': outcomes.count("error"),
+        'lock_timeouts': outcomes.count("lock_timeout"),
+    }
+
+def summarize(samples, duration, interval):
+    """Overall, per-operation and per-interval statistics"""
+    overall = _stats(samples)
+    overall['throughput_rps'] = round(len(samples) / duration, 2) if duration else 0.0
+    by_op = {}
+    for op in sorted({s[0] for s in samples}):
+        op_samples = [s for s in samples if s[0] == op]
+        by_op[op] = dict(_stats(op_samples), throughput_rps=round(len(op_samples) / duration, 2))
+    timeline = []
+    buckets = int(np.ceil(duration / interval))
+    for b in range(buckets):
+        bucket = [s for s in samples if b * interval <= s[1] < (b + 1) * interval]
+        timeline.append(dict(_stats(bucket), t_s=round(b * interval, 3), throughput_rps=round(len(bucket) / interval, 2)))
+    return {'overall': overall, 'operations': by_op, 'timeline': timeline}
+
+def parse_mix(value):
+    """"find_matches=6,app_login=2" -> {'find_matches': 6.0, 'app_login': 2.0}"""
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r} (choose from {', '.join(DEFAULT_MIX)})")
+        mix[op] = float(weight or 1)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for matching and app flows")
+    parser.add_argument("--db", help="Seeded registry database (seeded into a temp file if omitted)")
+    parser.add_argument("--app-db", help="App database to read (a seeded scratch copy if omitted)")
+    parser.add_argument("--model", help="Model pickle to use (trained into a temp file if omitted)")
+    parser.add_argument("--donors", type=int, default=20000)
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--sos-cases", type=int, default=1000)
+    parser.add_argument("--mode", choices=["thread", "process", "asyncio"], default="thread")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/s (closed loop if omitted)")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--interval", type=float, default=1.0, help="Timeline bucket width in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Weighted operations, e.g. find_matches=6,app_login=2")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON report to this file (stdout if omitted)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="jeevsetu-load-")
+    db_path = args.db or os.path.join(workdir, "registry.db")
+    app_db_path = args.app_db or os.path.join(workdir, "app.db")
+    model_path = args.model or os.path.join(workdir, "match_model.pkl")
+    if not args.db:
+        print("🌱 Seeding load-test registry...", file=sys.stderr)
+        RegistrySeeder(db_path, seed=args.seed).seed(
+            hospitals=args.hospitals, donors=args.donors, sos_cases=args.sos_cases, matches=0
+        )
+    if not args.app_db:
+        seed_app_db(app_db_path, seed=args.seed)
+    if not args.model:
+        from ml_model import MLMatchingModel
+        with quiet():
+            MLMatchingModel(model_path=model_path).train()
+
+    print(f"🔥 {args.mode} x{args.concurrency}, {'closed loop' if args.rate is None else f'{args.rate:g} req/s'}, "
+          f"{args.duration:g}s...", file=sys.stderr)
+    if args.mode == "process":
+        samples = run_processes({
+            'db': db_path, 'app_db': app_db_path, 'model': model_path, 'mix': args.mix,
+            'concurrency': args.concurrency, 'rate': args.rate, 'duration': args.duration, 'seed': args.seed
+        })
+    else:
+        with quiet():
+            context = LoadContext(db_path, app_db_path, model_path)
+            runner = run_threads if args.mode == "thread" else run_asyncio
+            samples = runner(context, args.mix, args.concurrency, args.duration, args.rate, args.seed)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'params': {
+                'mode': args.mode, 'concurrency': args.concurrency, 'rate': args.rate,
+                'duration': args.duration, 'mix': args.mix, 'db': args.db, 'app_db': args.app_db
+            }
+        },
+        **summarize(samples, args.duration, args.interval)
+    }
+    overall = report['overall']
+    print(f"📈 {overall['throughput_rps']} req/s, p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms, "
+          f"p99 {overall['p99_ms']} ms, {overall['errors']} errors, {overall['lock_timeouts']} lock timeouts",
+          file=sys.stderr)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload)
+        print(f"✅ Load-test report written to {args.output}", file=sys.stderr)
+    else:
+        print(payload)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Reproducible benchmark suite for the matching pipeline
+
+Seeds (or reuses) a registry database, runs timed scenarios and emits JSON
+with p50/p95 latencies so results can be compared between releases:
+
+    python -m benchmarks.run_benchmarks --donors 100000 --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --tolerance 0.2
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from database import DatabaseManager, SOSCase, BloodGroup, OrganType, haversine_distance
+from benchmarks.seed_registry import RegistrySeeder, SEED_CITIES, HLA_ANTIGENS
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+def summarize(samples_s, inner=1):
+    """Per-call latency statistics in milliseconds"""
+    per_call = [s * 1000.0 / inner for s in samples_s]
+    return {
+        'iterations': len(per_call),
+        'calls_per_iteration': inner,
+        'p50_ms': round(percentile(per_call, 50), 6),
+        'p95_ms': round(percentile(per_call, 95), 6),
+        'mean_ms': round(float(np.mean(per_call)), 6) if per_call else 0.0,
+        'min_ms': round(min(per_call), 6) if per_call else 0.0,
+        'max_ms': round(max(per_call), 6) if per_call else 0.0,
+    }
+
+def time_scenario(fn, iterations, inner=1, warmup=1):
+    """Run fn() `inner` times per sample, after `warmup` untimed samples"""
+    for _ in range(warmup):
+        for _ in range(inner):
+            fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, inner)
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the emoji progress prints of the code under test"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+class BenchmarkSuite:
+    def __init__(self, db_path, model_path, iterations=20, seed=42):
+        self.db_path = db_path
+        self.model_path = model_path
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        self.results = {}
+
+    def run(self, only=None):
+        scenarios = {
+            'haversine_distance': self.bench_haversine,
+            'ml_train': self.bench_train,
+            'ml_inference': self.bench_inference,
+            'find_matches': self.bench_find_matches,
+            'app_calculate_compatibility': self.bench_app_compatibility,
+        }
+        for name, scenario in scenarios.items():
+            if only and name not in only:
+                continue
+            print(f"⏱️  {name}...", file=sys.stderr)
+            scenario()
+        return self.results
+
+    def bench_haversine(self):
+        points = [(c[2], c[3]) for c in SEED_CITIES]
+        pairs = [(self.rng.choice(points), self.rng.choice(points)) for _ in range(1000)]
+
+        def run():
+            for (lat1, lon1), (lat2, lon2) in pairs:
+                haversine_distance(lat1, lon1, lat2, lon2)
+
+        result = time_scenario(run, self.iterations)
+        result['pairs_per_call'] = len(pairs)
+        self.results['haversine_distance_1k_pairs'] = result
+
+    def bench_train(self):
+        from ml_model import MLMatchingModel
+        model = MLMatchingModel(model_path=self.model_path)
+        with quiet():
+            X, y = model.generate_synthetic_training_data(n_samples=5000)
+            self.results['ml_train_5k'] = time_scenario(lambda: model.train(X, y), max(1, self.iterations // 10), warmup=0)
+
+    def bench_inference(self):
+        from matching_engine import MatchingEngine, FEATURE_NAMES
+        with quiet():
+            engine = MatchingEngine(DatabaseManager(self.db_path), model_path=self.model_path)
+        matrix = np.random.default_rng(0).random((1000, len(FEATURE_NAMES))).tolist()
+        self.results['ml_inference_single_row'] = time_scenario(lambda: engine.predict_batch(matrix[:1]), self.iterations, inner=100)
+        self.results['ml_inference_batch_1k'] = time_scenario(lambda: engine.predict_batch(matrix), self.iterations)
+
+    def bench_find_matches(self):
+        from matching_engine import MatchingEngine
+        db_manager = DatabaseManager(self.db_path)
+        with quiet():
+            engine = MatchingEngine(db_manager, model_path=self.model_path)
+
+        session = db_manager.get_session()
+        try:
+            case_ids = [cid for (cid,) in session.query(SOSCase.id).filter(SOSCase.status == 'active').limit(200)]
+        finally:
+            session.close()
+
+        patients = []
+        for _ in range(self.iterations + 1):
+            city, state, _, _ = self.rng.choice(SEED_CITIES)
+            patients.append({
+                'blood_group': self.rng.choice(list(BloodGroup)),
+                'organ_type': self.rng.choice([OrganType.KIDNEY, OrganType.LIVER, OrganType.HEART]),
+                'urgency_level': self.rng.randint(1, 5),
+                'age': self.rng.randint(5, 75),
+                'city': city,
+                'state': state
+            })
+        patient_iter = iter(patients)
+        self.results['find_matches_patient'] = time_scenario(
+            lambda: engine.find_matches(patient_data=next(patient_iter)), self.iterations
+        )
+
+        if case_ids:
+            case_iter = iter(self.rng.choices(case_ids, k=self.iterations + 1))
+            self.results['find_matches_sos_case'] = time_scenario(
+                lambda: engine.find_matches(sos_case_id=next(case_iter)), self.iterations
+            )
+
+    def bench_app_compatibility(self):
+        from services import MLService
+        organs = ["Kidney", "Liver", "Heart", "Lungs", "Pancreas"]
+        bloods = [b.value for b in BloodGroup]
+        rows = []
+        for i in range(1000):
+            _, _, lat, lon = self.rng.choice(SEED_CITIES)
+            hla = {locus: self.rng.sample(alleles, 2) for locus, alleles in HLA_ANTIGENS.items()}
+            rows.append((f"D-{i}", "Seed Hospital", self.rng.choice(organs), self.rng.choice(bloods),
+                         lat, lon, json.dumps(hla), "9000000000", datetime.now().isoformat()))
+        patient = {"organ": "Kidney", "blood_type": "O+", "lat": 28.6139, "lon": 77.2090,
+                   "hla": {"A": [2], "B": [7], "DR": [4]}}
+
+        def run():
+            for row in rows:
+                MLService.calculate_compatibility(row, patient)
+
+        result = time_scenario(run, self.iterations)
+        result['rows_per_call'] = len(rows)
+        self.results['app_calculate_compatibility_1k_rows'] = result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def compare(results, baseline, tolerance):
+    """Return scenarios whose p50 or p95 regressed by more than `tolerance` (fraction)"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if previous[key] > 0 and current[key] > previous[key] * (1 + tolerance):
+                regressions.append({
+                    'scenario': name, 'metric': key,
+                    'baseline': previous[key], 'current': current[key],
+                    'change': round(current[key] / previous[key] - 1, 3)
+                })
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the JeevSetu benchmark suite")
+    parser.add_argument("--db", help="Existing registry database to benchmark (seeded into a temp file if omitted)")
+    parser.add_argument("--model", help="Model pickle to use (trained into a temp file if omitted)")
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--donors", type=int, default=20000)
+    parser.add_argument("--sos-cases", type=int, default=1000)
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenario", action="append", dest="scenarios", help="Run only the named scenario (repeatable)")
+    parser.add_argument("--output", help="Write JSON results to this file (stdout if omitted)")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50/p95 slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="jeevsetu-bench-")
+    db_path = args.db or os.path.join(workdir, "registry.db")
+    model_path = args.model or os.path.join(workdir, "match_model.pkl")
+
+    seed_report = None
+    if not args.db:
+        print("🌱 Seeding benchmark registry...", file=sys.stderr)
+        seed_report = RegistrySeeder(db_path, seed=args.seed).seed(
+            hospitals=args.hospitals, donors=args.donors,
+            sos_cases=args.sos_cases, matches=args.matches
+        )
+    if not args.model:
+        from ml_model import MLMatchingModel
+        with quiet():
+            MLMatchingModel(model_path=model_path).train()
+
+    suite = BenchmarkSuite(db_path, model_path, iterations=args.iterations, seed=args.seed)
+    results = suite.run(only=set(args.scenarios) if args.scenarios else None)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {
+                'hospitals': args.hospitals, 'donors': args.donors, 'sos_cases': args.sos_cases,
+                'matches': args.matches, 'iterations': args.iterations, 'seed': args.seed,
+                'db': args.db
+            },
+            'seed_report': seed_report
+        },
+        'results': results
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(results, json.load(f), args.tolerance)
+        if report['regressions']:
+            exit_code = 1
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload)
+        print(f"✅ Benchmark results written to {args.output}", file=sys.stderr)
+    else:
+        print(payload)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
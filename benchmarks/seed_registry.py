@@ -0,0 +1,284 @@
+"""Fast large-scale seeder for the database.py registry schema
+
+Rows are generated in chunks and written with executemany on the raw SQLite
+connection (durability pragmas relaxed for the duration of the load), so
+millions of donors and matches can be seeded in seconds to minutes.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from database import DatabaseManager, BloodGroup, OrganType, DonorType, ApprovalStatus, UserRole
+
+# (city, state, latitude, longitude)
+SEED_CITIES = [
+    ("New Delhi", "Delhi", 28.6139, 77.2090),
+    ("Mumbai", "Maharashtra", 19.0760, 72.8777),
+    ("Pune", "Maharashtra", 18.5204, 73.8567),
+    ("Nagpur", "Maharashtra", 21.1458, 79.0882),
+    ("Bangalore", "Karnataka", 12.9716, 77.5946),
+    ("Mysore", "Karnataka", 12.2958, 76.6394),
+    ("Chennai", "Tamil Nadu", 13.0827, 80.2707),
+    ("Coimbatore", "Tamil Nadu", 11.0168, 76.9558),
+    ("Hyderabad", "Telangana", 17.3850, 78.4867),
+    ("Kolkata", "West Bengal", 22.5726, 88.3639),
+    ("Ahmedabad", "Gujarat", 23.0225, 72.5714),
+    ("Jaipur", "Rajasthan", 26.9124, 75.7873),
+    ("Lucknow", "Uttar Pradesh", 26.8467, 80.9462),
+    ("Kochi", "Kerala", 9.9312, 76.2673),
+]
+
+HLA_ANTIGENS = {
+    'A': [1, 2, 3, 11, 24, 26, 33],
+    'B': [7, 8, 35, 44, 51, 57],
+    'DR': [1, 4, 7, 11, 13, 15],
+}
+
+def _ts(value):
+    """Format datetimes the way SQLAlchemy's SQLite dialect stores them"""
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def _random_hla(rng):
+    return ",".join(
+        f"{locus}{allele}"
+        for locus, alleles in HLA_ANTIGENS.items()
+        for allele in rng.sample(alleles, 2)
+    )
+
+def _chunks(total, chunk_size):
+    start = 0
+    while start < total:
+        yield start, min(chunk_size, total - start)
+        start += chunk_size
+
+class RegistrySeeder:
+    """Bulk-loads synthetic hospitals, users, donors, SOS cases and matches"""
+    def __init__(self, db_path, seed=42, chunk_size=50000):
+        self.db_manager = DatabaseManager(db_path)
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.now = datetime.now(timezone.utc).replace(tzinfo=None)
+        # One bcrypt hash shared by every synthetic account (hashing is deliberately slow)
+        self.password_hash = bcrypt.hashpw(b"Seed@123", bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    def _max_id(self, cursor, table):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return cursor.fetchone()[0]
+
+    def seed(self, hospitals=50, donors=10000, users=None, sos_cases=1000, matches=10000, donations=0):
+        """
+        Seed the registry
+
+        Returns:
+            Dict of row counts inserted and elapsed seconds per table
+        """
+        users = users if users is not None else max(1, sos_cases // 5)
+        report = {}
+        raw = self.db_manager.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+
+            report['hospitals'] = self._seed_hospitals(raw, cursor, hospitals)
+            report['users'] = self._seed_users(raw, cursor, users)
+            report['donors'] = self._seed_donors(raw, cursor, donors)
+            report['sos_cases'] = self._seed_sos_cases(raw, cursor, sos_cases)
+            report['matches'] = self._seed_matches(raw, cursor, matches)
+            report['donations'] = self._seed_donations(raw, cursor, donations)
+
+            cursor.execute("PRAGMA synchronous = FULL")
+            cursor.execute("ANALYZE")
+            raw.commit()
+        finally:
+            raw.close()
+        return report
+
+    def _bulk(self, raw, cursor, sql, total, make_row):
+        started = time.perf_counter()
+        for start, size in _chunks(total, self.chunk_size):
+            cursor.executemany(sql, (make_row(start + i) for i in range(size)))
+            raw.commit()
+        return {'rows': total, 'seconds': round(time.perf_counter() - started, 3)}
+
+    def _seed_hospitals(self, raw, cursor, total):
+        base = self._max_id(cursor, 'hospitals')
+        rng = self.rng
+        created = _ts(self.now)
+
+        def row(i):
+            city, state, lat, lon = SEED_CITIES[i % len(SEED_CITIES)]
+            n = base + i + 1
+            return (
+                n, f"hospital{n}@seed.jeevsetu", self.password_hash, f"Seed Hospital {n}",
+                "Coordinator", "9000000000", f"LIC-SEED-{n}", f"{n} Hospital Road, {city}",
+                city, state, "India",
+                lat + rng.uniform(-0.15, 0.15), lon + rng.uniform(-0.15, 0.15),
+                100, "9000000000", ApprovalStatus.APPROVED.name, 1, created, created
+            )
+
+        self.hospital_ids = (base + 1, base + total) if total else self._existing_range(cursor, 'hospitals')
+        return self._bulk(raw, cursor, """
+            INSERT INTO hospitals (id, email, password_hash, hospital_name, contact_person_name, phone,
+                license_id, address, city, state, country, latitude, longitude, capacity,
+                emergency_contact, approval_status, is_active, created_at, updated_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", total, row)
+
+    def _seed_users(self, raw, cursor, total):
+        base = self._max_id(cursor, 'users')
+        rng = self.rng
+        created = _ts(self.now)
+        blood_groups = [b.name for b in BloodGroup]
+
+        def row(i):
+            city, state, _, _ = SEED_CITIES[rng.randrange(len(SEED_CITIES))]
+            n = base + i + 1
+            return (
+                n, UserRole.USER.name, f"user{n}@seed.jeevsetu", self.password_hash, f"Seed User {n}",
+                "9100000000", city, state, "India", rng.randint(18, 75),
+                rng.choice(blood_groups), 1, created, created
+            )
+
+        self.user_ids = (base + 1, base + total) if total else self._existing_range(cursor, 'users')
+        return self._bulk(raw, cursor, """
+            INSERT INTO users (id, role, email, password_hash, full_name, phone, city, state, country,
+                age, blood_group, is_active, created_at, updated_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", total, row)
+
+    def _seed_donors(self, raw, cursor, total):
+        base = self._max_id(cursor, 'donors')
+        rng = self.rng
+        blood_groups = [b.name for b in BloodGroup]
+        organs = [o.name for o in OrganType]
+        donor_types = [d.name for d in DonorType]
+        h_lo, h_hi = self.hospital_ids
+        cursor.execute("SELECT id, city, state FROM hospitals WHERE id BETWEEN ? AND ?", (h_lo, h_hi))
+        hospital_locations = {hid: (city, state) for hid, city, state in cursor.fetchall()}
+        hospital_id_list = list(hospital_locations)
+        if total and not hospital_id_list:
+            raise ValueError("Cannot seed donors without hospitals")
+
+        def row(i):
+            n = base + i + 1
+            hospital_id = hospital_id_list[rng.randrange(len(hospital_id_list))]
+            city, state = hospital_locations[hospital_id]
+            registered = _ts(self.now - timedelta(days=rng.randint(0, 720)))
+            return (
+                n, hospital_id, rng.choice(donor_types), f"Seed Donor {n}", rng.randint(18, 70),
+                rng.choice(blood_groups), rng.choice(organs), _random_hla(rng),
+                1 if rng.random() < 0.9 else 0, city, state, "India", registered,
+                ApprovalStatus.APPROVED.name if rng.random() < 0.95 else ApprovalStatus.PENDING.name,
+                round(rng.betavariate(5, 2), 3), registered, registered
+            )
+
+        self.donor_ids = (base + 1, base + total) if total else self._existing_range(cursor, 'donors')
+        return self._bulk(raw, cursor, """
+            INSERT INTO donors (id, hospital_id, donor_type, donor_name, age, blood_group, organ_type,
+                hla_type, availability_status, city, state, country, registration_date, approval_status,
+                reliability_score, created_at, updated_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", total, row)
+
+    def _seed_sos_cases(self, raw, cursor, total):
+        base = self._max_id(cursor, 'sos_cases')
+        rng = self.rng
+        blood_groups = [b.name for b in BloodGroup]
+        organs = [o.name for o in OrganType]
+        u_lo, u_hi = self.user_ids
+        if total and not u_hi:
+            raise ValueError("Cannot seed SOS cases without users")
+
+        def row(i):
+            n = base + i + 1
+            city, state, _, _ = SEED_CITIES[rng.randrange(len(SEED_CITIES))]
+            created = self.now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+            resolved = rng.random() < 0.6
+            return (
+                n, rng.randint(u_lo, u_hi), f"Seed Patient {n}", rng.randint(1, 80),
+                rng.choice(blood_groups), rng.choice(organs), rng.randint(1, 5),
+                city, state, "India", "resolved" if resolved else "active",
+                ApprovalStatus.APPROVED.name, _ts(created),
+                _ts(created + timedelta(days=rng.randint(1, 30))) if resolved else None
+            )
+
+        self.sos_case_ids = (base + 1, base + total) if total else self._existing_range(cursor, 'sos_cases')
+        return self._bulk(raw, cursor, """
+            INSERT INTO sos_cases (id, user_id, patient_name, patient_age, blood_group, organ_required,
+                urgency_level, city, state, country, status, approval_status, created_at, resolved_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", total, row)
+
+    def _seed_matches(self, raw, cursor, total):
+        rng = self.rng
+        s_lo, s_hi = self.sos_case_ids
+        d_lo, d_hi = self.donor_ids
+        if total and not (s_hi and d_hi):
+            raise ValueError("Cannot seed matches without SOS cases and donors")
+
+        def row(i):
+            compatibility = round(rng.uniform(0.4, 1.0), 3)
+            probability = round(rng.random(), 3)
+            urgency = round(rng.randint(1, 5) / 5.0, 3)
+            final = round(compatibility * 0.4 + probability * 0.3 + urgency * 0.2 + rng.random() * 0.1, 3)
+            return (
+                rng.randint(s_lo, s_hi), rng.randint(d_lo, d_hi), compatibility,
+                rng.choice([0, 100, 300]), probability, urgency, final,
+                1, 1, 1 if rng.random() < 0.7 else 0, "pending",
+                _ts(self.now - timedelta(days=rng.randint(0, 365)))
+            )
+
+        return self._bulk(raw, cursor, """
+            INSERT INTO matches (sos_case_id, donor_id, compatibility_score, distance_km, match_probability,
+                urgency_weight, final_score, blood_compatible, organ_match, age_compatible, status, created_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)""", total, row)
+
+    def _seed_donations(self, raw, cursor, total):
+        rng = self.rng
+        d_lo, d_hi = self.donor_ids
+        organs = [o.name for o in OrganType]
+        if total and not d_hi:
+            raise ValueError("Cannot seed donations without donors")
+
+        def row(i):
+            donated = self.now - timedelta(days=rng.randint(0, 365))
+            return (
+                rng.randint(d_lo, d_hi), f"Seed Recipient {i + 1}", rng.choice(organs),
+                _ts(donated), 1 if rng.random() < 0.8 else 0, _ts(donated)
+            )
+
+        return self._bulk(raw, cursor, """
+            INSERT INTO donations (donor_id, recipient_name, organ_type, donation_date, success, created_at)
+            VALUES (?,?,?,?,?,?)""", total, row)
+
+    def _existing_range(self, cursor, table):
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+        lo, hi = cursor.fetchone()
+        return (lo or 0, hi or 0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the registry with synthetic data")
+    parser.add_argument("--db", default="data/benchmark.db")
+    parser.add_argument("--hospitals", type=int, default=50)
+    parser.add_argument("--donors", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--sos-cases", type=int, default=1000)
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument("--donations", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    seeder = RegistrySeeder(args.db, seed=args.seed, chunk_size=args.chunk_size)
+    report = seeder.seed(
+        hospitals=args.hospitals, donors=args.donors, users=args.users,
+        sos_cases=args.sos_cases, matches=args.matches, donations=args.donations
+    )
+    for table, stats in report.items():
+        print(f"✅ {table:10s}: {stats['rows']:>10,d} rows in {stats['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Cold-start and rerun budget for the Streamlit app
+
+Runs app.py headless (streamlit.testing AppTest) in a fresh interpreter and a
+scratch working directory, then checks:
+
+- cold run: first script run, including imports and schema initialization
+- rerun p95 of the home page and of the register tab with a QR code shown
+- heavy modules (pandas, pyotp, qrcode, numpy, SQLAlchemy) stay unloaded on
+  the home page
+
+AppTest gives every run a fresh ScriptCache, so each rerun recompiles app.py
+(magic AST pass included), which a live server does once per process. The
+probe measures that compile on its own and budgets reruns net of it; the raw
+p95s are reported alongside. Defaults leave 1.5x or more headroom over
+what a noisy single-core runner measures (cold 165-365 ms against 1000 ms,
+net rerun p95 40-65 ms against 100 ms); an eager pandas/SQLAlchemy import
+on the home page still fails both the rerun budget and the module check.
+
+Exits with status 1 when any budget is exceeded, so it can gate CI
+(tests/test_startup_budget.py runs the same check under pytest):
+
+    python -m benchmarks.startup_budget
+    python -m benchmarks.startup_budget --max-cold-ms 2500 --max-rerun-ms 150
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+LAZY_MODULES = ("pandas", "pyotp", "qrcode", "numpy", "sqlalchemy")
+DEFAULT_MAX_COLD_MS = 1000
+DEFAULT_MAX_RERUN_MS = 100
+
+def _p95(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+def _compile_ms(samples=5):
+    """Median cost of compiling app.py the way each AppTest run does (baseline for reruns)"""
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        ScriptCache().get_bytecode(APP_PATH)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return sorted(timings)[len(timings) // 2]
+
+def probe(reruns):
+    """Measure inside this (fresh) interpreter; returns a JSON-serializable dict"""
+    sys.path.insert(0, REPO_ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    before = set(sys.modules)
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    started = time.perf_counter()
+    at.run()
+    cold_ms = (time.perf_counter() - started) * 1000.0
+    loaded = sorted(m for m in LAZY_MODULES if m in sys.modules and m not in before)
+    if at.exception:
+        raise RuntimeError(f"app.py raised on the home page: {at.exception[0].message}")
+
+    home = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        home.append((time.perf_counter() - started) * 1000.0)
+
+    at.session_state.auth_role = "Hospital"
+    at.session_state.page = "auth"
+    at.run()
+    at.text_input(key="r_email").set_value("budget@example.com")
+    at.run()
+    if not at.get("imgs"):
+        raise RuntimeError("register tab did not render the TOTP QR code")
+    register = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        register.append((time.perf_counter() - started) * 1000.0)
+
+    compile_ms = _compile_ms()
+    return {
+        'cold_ms': round(cold_ms, 1),
+        'script_compile_ms': round(compile_ms, 1),
+        'home_rerun_p95_ms': round(max(0.0, _p95(home) - compile_ms), 1),
+        'register_rerun_p95_ms': round(max(0.0, _p95(register) - compile_ms), 1),
+        'home_rerun_raw_p95_ms': round(_p95(home), 1),
+        'register_rerun_raw_p95_ms': round(_p95(register), 1),
+        'home_loaded_modules': loaded,
+    }
+
+def run_probe(reruns=20):
+    """
+    Probe in a fresh interpreter with a scratch working directory
+
+    Imports are actually cold there, and the app's SQLite files are created
+    in the scratch directory instead of the caller's.
+
+    Returns:
+        Probe result dict
+    """
+    workdir = tempfile.mkdtemp(prefix="jeevsetu-startup-")
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_budget", "--probe", "--reruns", str(reruns)],
+        cwd=workdir, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT)
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def check(result, max_cold_ms=DEFAULT_MAX_COLD_MS, max_rerun_ms=DEFAULT_MAX_RERUN_MS):
+    """Budget violations as human-readable strings"""
+    violations = []
+    if result['cold_ms'] > max_cold_ms:
+        violations.append(f"cold run {result['cold_ms']:.0f} ms > {max_cold_ms:.0f} ms")
+    for key in ('home_rerun_p95_ms', 'register_rerun_p95_ms'):
+        if result[key] > max_rerun_ms:
+            violations.append(f"{key} {result[key]:.0f} ms > {max_rerun_ms:.0f} ms")
+    if result['home_loaded_modules']:
+        violations.append(f"home page imported {', '.join(result['home_loaded_modules'])}")
+    return violations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enforce the Streamlit app's startup and rerun budget")
+    parser.add_argument("--max-cold-ms", type=float, default=DEFAULT_MAX_COLD_MS)
+    parser.add_argument("--max-rerun-ms", type=float, default=DEFAULT_MAX_RERUN_MS,
+                        help="Rerun p95 budget net of AppTest's per-run compile of app.py")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        print(json.dumps(probe(args.reruns)))
+        return 0
+
+    try:
+        result = run_probe(args.reruns)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        print("❌ Startup probe failed", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+
+    violations = check(result, args.max_cold_ms, args.max_rerun_ms)
+    for violation in violations:
+        print(f"❌ Budget exceeded: {violation}", file=sys.stderr)
+    if not violations:
+        print("✅ Startup and rerun budget met", file=sys.stderr)
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
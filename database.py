@@ -1,7 +1,7 @@
 """Database models and setup for Organ Donation Matching Platform"""
 import os
 from datetime import datetime, timezone
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum, Index, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import enum
@@ -66,6 +66,9 @@ class User(Base):
     city = Column(String(100), index=True)
     state = Column(String(100), index=True)
     country = Column(String(100), default="India")
+    # Resolved from city/state by the gazetteer (gazetteer.install_geocoding)
+    latitude = Column(Float)
+    longitude = Column(Float)
     date_of_birth = Column(DateTime)
     age = Column(Integer)
     blood_group = Column(Enum(BloodGroup))
@@ -160,6 +163,9 @@ class SOSCase(Base):
     city = Column(String(100), index=True)
     state = Column(String(100), index=True)
     country = Column(String(100), default="India")
+    # Resolved from city/state by the gazetteer (gazetteer.install_geocoding)
+    latitude = Column(Float)
+    longitude = Column(Float)
     document_path = Column(String(500))
     status = Column(String(50), default="active", index=True)
     approval_status = Column(Enum(ApprovalStatus), default=ApprovalStatus.PENDING)
@@ -175,7 +181,7 @@ class Match(Base):
     
     id = Column(Integer, primary_key=True)
     sos_case_id = Column(Integer, ForeignKey('sos_cases.id'))
-    donor_id = Column(Integer, ForeignKey('donors.id'), nullable=False)
+    donor_id = Column(Integer, ForeignKey('donors.id'), nullable=False, index=True)
     compatibility_score = Column(Float, nullable=False, index=True)
     distance_km = Column(Float)
     match_probability = Column(Float, default=0.5)
@@ -185,12 +191,82 @@ class Match(Base):
     organ_match = Column(Boolean, default=False)
     age_compatible = Column(Boolean, default=False)
     status = Column(String(50), default="pending")
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    
+    # Latest-scoring lookups per (case, donor) used by match retention
+    __table_args__ = (Index('ix_matches_case_donor', 'sos_case_id', 'donor_id'),)
     
     # Relationships
     sos_case = relationship("SOSCase", back_populates="matches")
     donor = relationship("Donor", back_populates="matches")
 
+class MatchJob(Base):
+    __tablename__ = 'match_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    sos_case_id = Column(Integer, ForeignKey('sos_cases.id'), nullable=False)
+    priority = Column(Integer, nullable=False, default=3)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_results = Column(Integer, default=20)
+    search_radius_km = Column(Float, default=500)
+    result_count = Column(Integer)
+    error = Column(Text)
+    worker = Column(String(100))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    # Claim order (highest urgency first, then FIFO) and at most one pending job per case
+    __table_args__ = (
+        Index('ix_match_jobs_claim', 'status', 'priority', 'id'),
+        Index('uq_match_jobs_pending_case', 'sos_case_id', unique=True, sqlite_where=text("status = 'pending'")),
+    )
+    
+    # Relationships
+    sos_case = relationship("SOSCase")
+
+class HLAPosting(Base):
+    __tablename__ = 'hla_postings'
+    
+    # Inverted index: one row per (antigen, donor), e.g. ("B44", 17); see hla_index.py
+    antigen = Column(String(16), primary_key=True)
+    donor_id = Column(Integer, ForeignKey('donors.id'), primary_key=True, index=True)
+
+class DonorFeature(Base):
+    __tablename__ = 'donor_features'
+
+    # Donor-only match features, materialized on donor writes; see donor_features.py
+    donor_id = Column(Integer, ForeignKey('donors.id'), primary_key=True)
+    hospital_id = Column(Integer)
+    age = Column(Integer)
+    reliability = Column(Float)
+    registration_day = Column(Integer)  # Days since 1970-01-01
+    freshness_score = Column(Float)
+    city_key = Column(String(100))
+    state_key = Column(String(100))
+    computed_day = Column(Integer)
+
+class OutcomeRollup(Base):
+    __tablename__ = 'rollup_outcomes'
+
+    # Donations per (donation month, organ, donor state), maintained incrementally; see rollups.py
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    organ_type = Column(Enum(OrganType), primary_key=True)
+    state = Column(String(100), primary_key=True)
+    donations = Column(Integer, nullable=False, default=0)
+    successes = Column(Integer, nullable=False, default=0)
+
+class ConversionRollup(Base):
+    __tablename__ = 'rollup_conversions'
+
+    # Matches per (match month, organ, donor state) and how many of them led to a donation
+    month = Column(String(7), primary_key=True)
+    organ_type = Column(Enum(OrganType), primary_key=True)
+    state = Column(String(100), primary_key=True)
+    matches = Column(Integer, nullable=False, default=0)
+    conversions = Column(Integer, nullable=False, default=0)
+
 class Donation(Base):
     __tablename__ = 'donations'
     
@@ -201,7 +277,7 @@ class Donation(Base):
     donation_date = Column(DateTime, nullable=False)
     success = Column(Boolean, default=True)
     notes = Column(Text)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     
     # Relationships
     donor = relationship("Donor", back_populates="donations")
@@ -232,7 +308,8 @@ class AuditLog(Base):
     __tablename__ = 'audit_logs'
     
     id = Column(Integer, primary_key=True)
-    admin_id = Column(Integer, ForeignKey('admins.id'), nullable=False)
+    admin_id = Column(Integer, ForeignKey('admins.id'))
+    actor_email = Column(String(255), index=True)
     action_type = Column(String(100), nullable=False, index=True)
     target_type = Column(String(50))
     target_id = Column(Integer)
@@ -244,14 +321,58 @@ class AuditLog(Base):
     admin = relationship("Admin", back_populates="audit_logs")
 
 # Database setup
+# Nullable columns added to existing tables by DatabaseManager.add_missing_columns
+ADDED_COLUMNS = {
+    'users': ['latitude', 'longitude'],
+    'sos_cases': ['latitude', 'longitude'],
+}
+
+# Indexes declared after older databases were created, added by DatabaseManager.add_missing_indexes
+ADDED_INDEXES = {
+    'matches': ['ix_matches_donor_id', 'ix_matches_created_at', 'ix_matches_case_donor'],
+    'donations': ['ix_donations_created_at'],
+}
+
 class DatabaseManager:
     def __init__(self, db_path="data/organ_donation.db"):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.engine = create_engine(f'sqlite:///{db_path}', echo=False)
         Base.metadata.create_all(self.engine)
+        self.add_missing_columns()
+        self.add_missing_indexes()
         self.Session = sessionmaker(bind=self.engine)
     
+    def add_missing_columns(self):
+        """Add nullable columns introduced after older databases were created (create_all skips existing tables)"""
+        try:
+            inspector = inspect(self.engine)
+            with self.engine.begin() as conn:
+                for table, columns in ADDED_COLUMNS.items():
+                    existing = {c['name'] for c in inspector.get_columns(table)}
+                    if 'city' not in existing:
+                        continue  # legacy schema, left untouched
+                    for name in columns:
+                        if name not in existing:
+                            column = Base.metadata.tables[table].c[name]
+                            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column.type.compile(self.engine.dialect)}"))
+        except Exception as e:
+            print(f"⚠️ Could not upgrade database schema: {str(e)}")
+    
+    def add_missing_indexes(self):
+        """Create indexes declared on the models after older databases were created (create_all skips existing tables)"""
+        try:
+            inspector = inspect(self.engine)
+            with self.engine.begin() as conn:
+                for table, names in ADDED_INDEXES.items():
+                    existing = {c['name'] for c in inspector.get_columns(table)}
+                    for index in Base.metadata.tables[table].indexes:
+                        if index.name in names and {c.name for c in index.columns} <= existing:
+                            columns = ", ".join(c.name for c in index.columns)
+                            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index.name} ON {table} ({columns})"))
+        except Exception as e:
+            print(f"⚠️ Could not upgrade database indexes: {str(e)}")
+    
     def get_session(self):
         """Get database session"""
         return self.Session()
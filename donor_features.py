@@ -0,0 +1,318 @@
+"""Precomputed donor-side match features for Organ Donation Platform
+
+Reliability (with its 0.5 fallback), listing freshness, normalized city and
+state, age and hospital depend only on the donor, so they are materialized
+in donor_features instead of being recomputed per candidate on every search.
+Rows are written by SQLAlchemy events on Donor writes (install_donor_features),
+and a daily job re-decays freshness and reconciles raw-SQL writes (inserts,
+deletes and changed source columns) by comparing every row with the donors
+table.
+
+MatchingEngine loads the table once into NumPy columns (DonorFeatureStore),
+so a search only queries candidate ids, computes the patient-dependent
+features (age difference, distance, urgency) and joins by id. ORM writes log
+the donor id under a new version in donor_features_log, and the store merges
+just those rows; bulk rebuild/refresh (or a gap in the log) reloads it all.
+
+    python donor_features.py rebuild --db data/organ_donation.db
+    python donor_features.py refresh --db data/organ_donation.db   # daily
+"""
+import time
+import argparse
+from datetime import date
+import numpy as np
+from sqlalchemy import event, text
+from database import DatabaseManager, Donor
+from donor_store import DonorSelection, NO_DAY, today_day
+
+EPOCH = date(1970, 1, 1)
+FRESHNESS_DAYS = 365.0
+
+# Change-log versions kept for incremental refresh; older readers reload in full
+LOG_RETENTION_VERSIONS = 50000
+# Beyond this many changed donors a full reload is cheaper than merging
+MAX_INCREMENTAL_ROWS = 20000
+# SQLite bound-parameter budget per IN (...) query
+ID_CHUNK = 900
+
+COLUMNS = [
+    ('donor_id', np.int64),
+    ('hospital_id', np.int32),
+    ('age', np.int16),
+    ('reliability', np.float64),
+    ('registration_day', np.int32),
+    ('freshness', np.float64),
+]
+
+# Same definitions as MatchingEngine.build_candidates, at day resolution
+FEATURES_SELECT = """
+    SELECT id AS donor_id, hospital_id, age,
+           CASE WHEN reliability_score IS NULL OR reliability_score = 0 THEN 0.5 ELSE reliability_score END AS reliability,
+           CAST(julianday(date(registration_date)) - 2440587.5 AS INTEGER) AS registration_day,
+           CASE WHEN registration_date IS NULL THEN 1.0
+                ELSE MAX(0.5, 1.0 - (:today - CAST(julianday(date(registration_date)) - 2440587.5 AS INTEGER)) / 365.0) END AS freshness_score,
+           NULLIF(lower(trim(city)), '') AS city_key, NULLIF(lower(trim(state)), '') AS state_key, :today AS computed_day
+    FROM donors
+"""
+# Stored rows whose source columns no longer match the donors table (raw-SQL updates)
+CHANGED_SELECT = f"""
+    SELECT s.* FROM ({FEATURES_SELECT}) s JOIN donor_features f ON f.donor_id = s.donor_id
+    WHERE f.hospital_id IS NOT s.hospital_id OR f.age IS NOT s.age OR f.reliability IS NOT s.reliability
+       OR f.registration_day IS NOT s.registration_day OR f.city_key IS NOT s.city_key OR f.state_key IS NOT s.state_key
+"""
+INSERT_COLUMNS = "donor_id, hospital_id, age, reliability, registration_day, freshness_score, city_key, state_key, computed_day"
+
+def _key(value):
+    return value.strip().lower() if value and value.strip() else None
+
+def donor_feature_row(donor, today=None):
+    """Feature row for one Donor (same values as FEATURES_SELECT)"""
+    today = today_day() if today is None else today
+    registered = donor.registration_date
+    registration_day = (registered.date() - EPOCH).days if registered else None
+    return {
+        'donor_id': donor.id,
+        'hospital_id': donor.hospital_id,
+        'age': donor.age,
+        'reliability': donor.reliability_score or 0.5,
+        'registration_day': registration_day,
+        'freshness_score': 1.0 if registration_day is None else max(0.5, 1.0 - (today - registration_day) / FRESHNESS_DAYS),
+        'city_key': _key(donor.city),
+        'state_key': _key(donor.state),
+        'computed_day': today,
+    }
+
+def _bump_version(conn, donor_ids=None):
+    """
+    Advance the table version and log which donors changed under it
+
+    Args:
+        donor_ids: Donors whose rows were written or deleted; None marks a bulk
+            change, which clears the log so readers reload everything
+    """
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS donor_features_state (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    ))
+    conn.execute(text("CREATE TABLE IF NOT EXISTS donor_features_log (version INTEGER NOT NULL, donor_id INTEGER)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_donor_features_log_version ON donor_features_log (version)"))
+    conn.execute(text(
+        "INSERT INTO donor_features_state (id, version) VALUES (1, 1) "
+        "ON CONFLICT (id) DO UPDATE SET version = version + 1"
+    ))
+    version = _read_version(conn)
+    if donor_ids is None:
+        conn.execute(text("DELETE FROM donor_features_log"))
+        conn.execute(text("INSERT INTO donor_features_log (version) VALUES (:version)"), {'version': version})
+        return
+    conn.execute(
+        text("INSERT INTO donor_features_log (version, donor_id) VALUES (:version, :donor_id)"),
+        [{'version': version, 'donor_id': donor_id} for donor_id in donor_ids]
+    )
+    if version % 1000 == 0:
+        conn.execute(text("DELETE FROM donor_features_log WHERE version <= :cutoff"), {'cutoff': version - LOG_RETENTION_VERSIONS})
+
+def _read_version(conn):
+    try:
+        return conn.execute(text("SELECT version FROM donor_features_state WHERE id = 1")).scalar() or 0
+    except Exception:
+        return 0
+
+def _donor_written(mapper, connection, target):
+    connection.execute(
+        text(f"INSERT OR REPLACE INTO donor_features ({INSERT_COLUMNS}) VALUES "
+             "(:donor_id, :hospital_id, :age, :reliability, :registration_day, :freshness_score, :city_key, :state_key, :computed_day)"),
+        donor_feature_row(target)
+    )
+    _bump_version(connection, [target.id])
+
+def _donor_deleted(mapper, connection, target):
+    connection.execute(text("DELETE FROM donor_features WHERE donor_id = :id"), {'id': target.id})
+    _bump_version(connection, [target.id])
+
+def install_donor_features():
+    """Materialize features on every ORM Donor insert/update/delete (idempotent)"""
+    for name, handler in (('after_insert', _donor_written), ('after_update', _donor_written), ('after_delete', _donor_deleted)):
+        if not event.contains(Donor, name, handler):
+            event.listen(Donor, name, handler)
+
+def rebuild(db_manager=None):
+    """Recompute every row; returns the number of donors"""
+    db_manager = db_manager or DatabaseManager()
+    with db_manager.engine.begin() as conn:
+        conn.execute(text("DELETE FROM donor_features"))
+        conn.execute(text(f"INSERT INTO donor_features ({INSERT_COLUMNS}) {FEATURES_SELECT}"), {'today': today_day()})
+        _bump_version(conn, None)
+        return conn.execute(text("SELECT COUNT(*) FROM donor_features")).scalar()
+
+def refresh(db_manager=None):
+    """
+    Periodic job: decay freshness to today and reconcile writes that bypassed the ORM
+
+    Donors inserted, deleted or updated by raw SQL are found by comparing the
+    stored rows with the donors table. Only rows still above the 0.5
+    freshness floor can change with time.
+
+    Returns:
+        Report dict (decayed, added, updated, removed)
+    """
+    db_manager = db_manager or DatabaseManager()
+    today = today_day()
+    with db_manager.engine.begin() as conn:
+        decayed = conn.execute(text("""
+            UPDATE donor_features
+            SET freshness_score = MAX(0.5, 1.0 - (:today - registration_day) / 365.0), computed_day = :today
+            WHERE computed_day < :today AND registration_day IS NOT NULL AND freshness_score > 0.5
+        """), {'today': today}).rowcount
+        added = conn.execute(text(
+            f"INSERT INTO donor_features ({INSERT_COLUMNS}) {FEATURES_SELECT} "
+            "WHERE id NOT IN (SELECT donor_id FROM donor_features)"
+        ), {'today': today}).rowcount
+        updated = conn.execute(text(
+            f"INSERT OR REPLACE INTO donor_features ({INSERT_COLUMNS}) {CHANGED_SELECT}"
+        ), {'today': today}).rowcount
+        removed = conn.execute(text(
+            "DELETE FROM donor_features WHERE donor_id NOT IN (SELECT id FROM donors)"
+        )).rowcount
+        if decayed or added or updated or removed:
+            _bump_version(conn, None)
+    return {'decayed': decayed, 'added': added, 'updated': updated, 'removed': removed}
+
+FEATURE_ROW_SELECT = (
+    "SELECT donor_id, hospital_id, age, reliability, registration_day, freshness_score, city_key, state_key "
+    "FROM donor_features"
+)
+
+class DonorFeatureStore:
+    """donor_features as id-sorted NumPy columns, patched from donor_features_log when the table changes"""
+    def __init__(self, db_manager=None, min_reload_interval_s=5.0):
+        self.db_manager = db_manager or DatabaseManager()
+        self.min_reload_interval_s = min_reload_interval_s
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+        self.city_index = {}
+        self.state_index = {}
+        self.version = None
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self.columns['donor_id'])
+
+    def refresh(self, force=False):
+        """Catch up with donor_features if the table version moved (checked at most every min_reload_interval_s)"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < self.min_reload_interval_s:
+            return False
+        self._checked_at = now
+        with self.db_manager.engine.connect() as conn:
+            version = _read_version(conn)
+            if not force and version == self.version:
+                return False
+            if not force and self.version is not None and self._apply_log(conn, version):
+                return True
+            rows = conn.execute(text(f"{FEATURE_ROW_SELECT} ORDER BY donor_id")).fetchall()
+
+        self.columns, self.city_index, self.state_index = self._encode(rows, {}, {})
+        self.version = version
+        return True
+
+    def _apply_log(self, conn, version):
+        """
+        Merge the rows of donors logged since the loaded version
+
+        Returns:
+            False when the log cannot bring the store up to date (full reload needed)
+        """
+        try:
+            logged = conn.execute(text(
+                "SELECT version, donor_id FROM donor_features_log WHERE version > :loaded AND version <= :version"
+            ), {'loaded': self.version, 'version': version}).fetchall()
+        except Exception:
+            return False
+        # Every logged version carries at least one row, so a missing one means lost changes
+        if len({row[0] for row in logged}) != version - self.version or any(row[1] is None for row in logged):
+            return False
+        donor_ids = np.unique(np.fromiter((row[1] for row in logged), dtype=np.int64, count=len(logged)))
+        if len(donor_ids) > MAX_INCREMENTAL_ROWS:
+            return False
+
+        rows = []
+        for start in range(0, len(donor_ids), ID_CHUNK):
+            chunk = donor_ids[start:start + ID_CHUNK].tolist()
+            placeholders = ", ".join(f":id{i}" for i in range(len(chunk)))
+            rows.extend(conn.execute(
+                text(f"{FEATURE_ROW_SELECT} WHERE donor_id IN ({placeholders})"),
+                {f"id{i}": donor_id for i, donor_id in enumerate(chunk)}
+            ).fetchall())
+        rows.sort(key=lambda row: row[0])
+
+        # New names extend copies of the dictionaries; unchanged ones keep their identity for caches
+        city_index, state_index = dict(self.city_index), dict(self.state_index)
+        changed, city_index, state_index = self._encode(rows, city_index, state_index)
+        if len(city_index) == len(self.city_index):
+            city_index = self.city_index
+        if len(state_index) == len(self.state_index):
+            state_index = self.state_index
+
+        # Drop every logged donor (written or deleted), then insert current rows at their sorted positions
+        keep = ~np.isin(self.columns['donor_id'], donor_ids, assume_unique=True)
+        kept_ids = self.columns['donor_id'][keep]
+        positions = np.searchsorted(kept_ids, changed['donor_id'])
+        columns = {name: np.insert(values[keep], positions, changed[name]) for name, values in self.columns.items()}
+
+        self.city_index, self.state_index = city_index, state_index
+        self.columns = columns
+        self.version = version
+        return True
+
+    @classmethod
+    def _encode(cls, rows, city_index, state_index):
+        """Feature rows (FEATURE_ROW_SELECT order) -> NumPy columns, extending the name dictionaries"""
+        columns = {}
+        for i, (name, dtype) in enumerate(COLUMNS):
+            values = [row[i] for row in rows]
+            if name == 'registration_day':
+                values = [NO_DAY if v is None else v for v in values]
+            elif name in ('hospital_id', 'age'):
+                values = [-1 if v is None else v for v in values]
+            columns[name] = np.array(values, dtype=dtype) if rows else np.empty(0, dtype=dtype)
+        columns['city'], city_index = cls._codes([row[6] for row in rows], np.int32, city_index)
+        columns['state'], state_index = cls._codes([row[7] for row in rows], np.int16, state_index)
+        return columns, city_index, state_index
+
+    @staticmethod
+    def _codes(keys, dtype, index=None):
+        """Dictionary-encode normalized names (-1 = missing), extending index"""
+        index = {} if index is None else index
+        codes = np.empty(len(keys), dtype=dtype)
+        for i, key in enumerate(keys):
+            codes[i] = -1 if key is None else index.setdefault(key, len(index))
+        return codes, index
+
+    def select(self, donor_ids):
+        """
+        Feature rows for candidate ids
+
+        Returns:
+            (DonorSelection over the store, number of ids without a feature row)
+        """
+        donor_ids = np.asarray(donor_ids, dtype=np.int64)
+        known = self.columns['donor_id']
+        positions = np.minimum(np.searchsorted(known, donor_ids), max(len(known) - 1, 0))
+        found = (known[positions] == donor_ids) if len(known) else np.zeros(len(donor_ids), dtype=bool)
+        selection = DonorSelection(self.columns, positions[found], self.city_index, self.state_index)
+        return selection, int(np.count_nonzero(~found))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputed donor feature table")
+    parser.add_argument("command", choices=["rebuild", "refresh"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    started = time.perf_counter()
+    if args.command == "rebuild":
+        count = rebuild(db_manager)
+        print(f"✅ Materialized features for {count} donors in {time.perf_counter() - started:.1f}s")
+    else:
+        report = refresh(db_manager)
+        print(f"✅ Donor features refreshed in {time.perf_counter() - started:.1f}s: "
+              f"{report['decayed']} decayed, {report['added']} added, {report['updated']} updated, {report['removed']} removed")
@@ -0,0 +1,357 @@
+"""Shared-memory donor store for Organ Donation Platform
+
+Donors are kept as typed NumPy columns (struct of arrays) in one
+multiprocessing.shared_memory segment, so every Streamlit worker, scoring
+server and batch job on a host reads the same physical pages instead of
+holding its own ORM objects. Enums are int8 codes, cities and states are
+dictionary codes, and a donor costs about 40 bytes.
+
+Each publish writes a new segment named "<name>_v<version>" and then flips
+the version stamp in the small "<name>" pointer segment. Readers attach
+read-only, check the stamp before each search and re-attach when it moved.
+Each DonorSelection holds the segment its rows came from, so selections taken
+before a refresh stay readable; the old mapping is released with the last one.
+
+    python donor_store.py publish --db data/organ_donation.db
+    python donor_store.py info
+"""
+import json
+import time
+import struct
+import argparse
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+import numpy as np
+from sqlalchemy import text
+from database import DatabaseManager, BloodGroup, OrganType
+
+DEFAULT_STORE_NAME = "jeevsetu_donors"
+MAGIC = b"JSDONOR1"
+HEADER = struct.Struct("<8sQQQ")  # magic, version, rows, meta length
+POINTER = struct.Struct("<Q")
+NO_DAY = np.iinfo(np.int32).min
+
+FLAG_AVAILABLE = 1
+FLAG_APPROVED = 2
+
+BLOOD_CODES = {member: code for code, member in enumerate(BloodGroup)}
+ORGAN_CODES = {member: code for code, member in enumerate(OrganType)}
+
+COLUMNS = [
+    ('donor_id', np.int64),
+    ('hospital_id', np.int32),
+    ('blood_group', np.int8),
+    ('organ_type', np.int8),
+    ('age', np.int16),
+    ('reliability', np.float32),
+    ('registration_day', np.int32),
+    ('hospital_lat', np.float32),
+    ('hospital_lon', np.float32),
+    ('city', np.int32),
+    ('state', np.int16),
+    ('flags', np.uint8),
+]
+
+STORE_QUERY = """
+    SELECT d.id, d.hospital_id, d.blood_group, d.organ_type, d.age, d.reliability_score,
+           d.registration_date, h.latitude, h.longitude, d.city, d.state,
+           d.availability_status, d.approval_status
+    FROM donors d
+    LEFT JOIN hospitals h ON h.id = d.hospital_id
+    ORDER BY d.id
+"""
+
+def _untrack(shm):
+    """Segments outlive the creating/attaching process; lifetime is managed by publish/unlink"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+def _open(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers attached segments with the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        _untrack(shm)
+        return shm
+
+def _segment_name(name, version):
+    return f"{name}_v{version}"
+
+def today_day():
+    return int(np.datetime64(datetime.now(timezone.utc).date(), 'D').astype(np.int64))
+
+class _Codes:
+    """Case-insensitive string dictionary (code -1 = missing)"""
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def code(self, value):
+        if not value:
+            return -1
+        key = value.strip().lower()
+        code = self.index.get(key)
+        if code is None:
+            code = self.index[key] = len(self.values)
+            self.values.append(key)
+        return code
+
+def build_columns(db_manager, chunk_size=50000):
+    """
+    Read the registry into typed columns
+
+    Returns:
+        (dict of column name -> ndarray, dict of dictionary name -> list of strings)
+    """
+    cities, states = _Codes(), _Codes()
+    blood_codes = {member.name: code for member, code in BLOOD_CODES.items()}
+    organ_codes = {member.name: code for member, code in ORGAN_CODES.items()}
+    chunks = []
+    with db_manager.engine.connect() as conn:
+        result = conn.execute(text(STORE_QUERY))
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = {name: np.empty(len(rows), dtype=dtype) for name, dtype in COLUMNS}
+            registered = []
+            for i, (did, hid, blood, organ, age, reliability, reg, lat, lon, city, state, available, approval) in enumerate(rows):
+                chunk['donor_id'][i] = did
+                chunk['hospital_id'][i] = hid or -1
+                chunk['blood_group'][i] = blood_codes.get(blood, -1)
+                chunk['organ_type'][i] = organ_codes.get(organ, -1)
+                chunk['age'][i] = age or 0
+                chunk['reliability'][i] = np.nan if reliability is None else reliability
+                chunk['hospital_lat'][i] = np.nan if lat is None else lat
+                chunk['hospital_lon'][i] = np.nan if lon is None else lon
+                chunk['city'][i] = cities.code(city)
+                chunk['state'][i] = states.code(state)
+                chunk['flags'][i] = (FLAG_AVAILABLE if available else 0) | (FLAG_APPROVED if approval == 'APPROVED' else 0)
+                registered.append(str(reg)[:10] if reg else 'NaT')
+            days = np.array(registered, dtype='datetime64[D]')
+            chunk['registration_day'][:] = np.where(np.isnat(days), NO_DAY, days.astype(np.int64))
+            chunks.append(chunk)
+
+    if chunks:
+        columns = {name: np.concatenate([c[name] for c in chunks]) for name, _ in COLUMNS}
+    else:
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+    return columns, {'city': cities.values, 'state': states.values}
+
+def publish(db_manager=None, name=DEFAULT_STORE_NAME):
+    """
+    Build the store from the registry and make it the current version
+
+    Returns:
+        The new version stamp
+    """
+    db_manager = db_manager or DatabaseManager()
+    columns, dictionaries = build_columns(db_manager)
+    rows = len(columns['donor_id'])
+    version = time.time_ns() // 1000
+
+    layout = []
+    offset = 0
+    for column, dtype in COLUMNS:
+        offset = (offset + 7) & ~7
+        layout.append({'name': column, 'dtype': np.dtype(dtype).str, 'offset': offset})
+        offset += rows * np.dtype(dtype).itemsize
+    meta = json.dumps({
+        'columns': layout,
+        'dictionaries': dictionaries,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+    }).encode('utf-8')
+    data_start = (HEADER.size + len(meta) + 7) & ~7
+
+    shm = shared_memory.SharedMemory(name=_segment_name(name, version), create=True, size=max(1, data_start + offset))
+    _untrack(shm)
+    try:
+        HEADER.pack_into(shm.buf, 0, MAGIC, version, rows, len(meta))
+        shm.buf[HEADER.size:HEADER.size + len(meta)] = meta
+        for entry in layout:
+            array = columns[entry['name']]
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=data_start + entry['offset'])[:] = array
+    finally:
+        shm.close()
+
+    previous = _set_current_version(name, version)
+    if previous:
+        unlink_segment(_segment_name(name, previous))
+    return version
+
+def _set_current_version(name, version):
+    """Flip the pointer segment; returns the version it replaced (or None)"""
+    try:
+        pointer = _open(name)
+    except FileNotFoundError:
+        pointer = shared_memory.SharedMemory(name=name, create=True, size=POINTER.size)
+        _untrack(pointer)
+        POINTER.pack_into(pointer.buf, 0, 0)
+    try:
+        previous = POINTER.unpack_from(pointer.buf, 0)[0]
+        POINTER.pack_into(pointer.buf, 0, version)
+    finally:
+        pointer.close()
+    return previous or None
+
+def current_version(name=DEFAULT_STORE_NAME):
+    """Version stamp of the published store, or None if nothing is published"""
+    try:
+        pointer = _open(name)
+    except FileNotFoundError:
+        return None
+    try:
+        return POINTER.unpack_from(pointer.buf, 0)[0] or None
+    finally:
+        pointer.close()
+
+def unlink_segment(segment):
+    try:
+        shm = _open(segment)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    if getattr(shm, '_track', True):
+        # Before 3.13 unlink() also unregisters from the resource tracker; balance _untrack
+        from multiprocessing import resource_tracker
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+    return True
+
+def unlink(name=DEFAULT_STORE_NAME):
+    """Remove the published store and its pointer"""
+    version = current_version(name)
+    if version:
+        unlink_segment(_segment_name(name, version))
+    return unlink_segment(name)
+
+class DonorStore:
+    """Read-only view of the published donor columns"""
+    def __init__(self, name=DEFAULT_STORE_NAME):
+        self.name = name
+        self.version = None
+        self._shm = None
+        self.columns = {}
+        self.city_index = {}
+        self.state_index = {}
+        self.built_at = None
+        self.refresh()
+
+    @classmethod
+    def attach(cls, name=DEFAULT_STORE_NAME):
+        return cls(name)
+
+    @classmethod
+    def attach_if_exists(cls, name=DEFAULT_STORE_NAME):
+        """Attach, or return None when no store has been published"""
+        if current_version(name) is None:
+            return None
+        try:
+            return cls(name)
+        except Exception as e:
+            print(f"⚠️ Could not attach donor store: {str(e)}")
+            return None
+
+    def refresh(self):
+        """Re-attach if a newer version was published; returns True when it did"""
+        for _ in range(5):
+            version = current_version(self.name)
+            if version is None:
+                raise FileNotFoundError(f"No donor store published as '{self.name}'")
+            if version == self.version:
+                return False
+            try:
+                shm = _open(_segment_name(self.name, version))
+            except FileNotFoundError:
+                # Replaced between reading the pointer and attaching; read it again
+                continue
+            self._load(shm)
+            return True
+        raise RuntimeError(f"Donor store '{self.name}' kept changing while attaching")
+
+    def _load(self, shm):
+        magic, version, rows, meta_len = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"{shm.name} is not a donor store segment")
+        meta = json.loads(bytes(shm.buf[HEADER.size:HEADER.size + meta_len]))
+        data_start = (HEADER.size + meta_len + 7) & ~7
+        columns = {}
+        for entry in meta['columns']:
+            array = np.ndarray((rows,), dtype=np.dtype(entry['dtype']), buffer=shm.buf, offset=data_start + entry['offset'])
+            array.flags.writeable = False
+            columns[entry['name']] = array
+        # Earlier selections hold the previous segment themselves (DonorSelection.segment)
+        self._shm = shm
+        self.version = version
+        self.columns = columns
+        self.city_index = {value: code for code, value in enumerate(meta['dictionaries']['city'])}
+        self.state_index = {value: code for code, value in enumerate(meta['dictionaries']['state'])}
+        self.built_at = meta.get('built_at')
+
+    def __len__(self):
+        return len(self.columns.get('donor_id', ()))
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+    def select(self, organ_type, blood_groups):
+        """Available, approved donors of the organ and any of the blood groups"""
+        c = self.columns
+        wanted = FLAG_AVAILABLE | FLAG_APPROVED
+        mask = (c['organ_type'] == ORGAN_CODES[organ_type]) & ((c['flags'] & wanted) == wanted)
+        mask &= np.isin(c['blood_group'], [BLOOD_CODES[b] for b in blood_groups])
+        return DonorSelection(self.columns, np.flatnonzero(mask), self.city_index, self.state_index, segment=self._shm)
+
+class DonorSelection:
+    """Candidate rows of one store version (stands in for a list of Donor objects)"""
+    def __init__(self, columns, indices, city_index, state_index, segment=None):
+        self.columns = columns
+        self.indices = indices
+        self.city_index = city_index
+        self.state_index = state_index
+        # Shared-memory segment backing columns; closing it while views exist would unmap them
+        self.segment = segment
+
+    def __len__(self):
+        return len(self.indices)
+
+    def column(self, name):
+        return self.columns[name][self.indices]
+
+    def filter(self, mask):
+        return DonorSelection(self.columns, self.indices[mask], self.city_index, self.state_index, segment=self.segment)
+
+    def city_code(self, city):
+        """Dictionary code of a city name: -1 when missing, -2 when no donor has it"""
+        return self.city_index.get(city.strip().lower(), -2) if city else -1
+
+    def state_code(self, state):
+        return self.state_index.get(state.strip().lower(), -2) if state else -1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-memory donor store")
+    parser.add_argument("command", choices=["publish", "info", "unlink"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--name", default=DEFAULT_STORE_NAME)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        started = time.perf_counter()
+        version = publish(DatabaseManager(args.db), name=args.name)
+        store = DonorStore.attach(args.name)
+        print(f"✅ Published donor store '{args.name}' v{version}: {len(store)} donors, "
+              f"{store.nbytes / max(1, len(store)):.0f} bytes/donor in {time.perf_counter() - started:.1f}s")
+    elif args.command == "info":
+        store = DonorStore.attach_if_exists(args.name)
+        if store is None:
+            print(f"ℹ️ No donor store published as '{args.name}'")
+        else:
+            print(f"ℹ️ '{args.name}' v{store.version}: {len(store)} donors, {store.nbytes / (1024 * 1024):.1f} MB, built {store.built_at}")
+    else:
+        print("✅ Donor store removed" if unlink(args.name) else f"ℹ️ No donor store published as '{args.name}'")
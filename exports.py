@@ -0,0 +1,296 @@
+"""Streaming registry exports for Organ Donation Platform
+
+Hospitals export their donor roster and match history as CSV or Parquet.
+Rows are read with yield_per (one server-side batch at a time) and encoded
+batch by batch - CSV lines, or one Parquet row group per batch - so memory
+stays flat and the first bytes go out before the query has finished.
+
+`python exports.py serve` exposes GET /export/<donors|matches>.<csv|parquet>
+with chunked transfer encoding. URLs are signed per hospital with
+JEEVSETU_EXPORT_SECRET and expire; the app hands them out as download links.
+
+    python exports.py write --db data/organ_donation.db --hospital-id 3 --kind matches --format parquet --out matches.parquet
+    JEEVSETU_EXPORT_SECRET=... python exports.py serve --db data/organ_donation.db --port 8766
+"""
+import io
+import os
+import csv
+import hmac
+import time
+import enum
+import hashlib
+import argparse
+from datetime import datetime
+from urllib.parse import urlencode, urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import select
+from database import DatabaseManager, Donor, Match, Hospital
+
+EXPORT_CHUNK_ROWS = 5000
+DEFAULT_EXPORT_PORT = 8766
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# (header, column, Arrow type name)
+EXPORT_COLUMNS = {
+    'donors': [
+        ('donor_id', Donor.id, 'int64'),
+        ('donor_type', Donor.donor_type, 'string'),
+        ('donor_name', Donor.donor_name, 'string'),
+        ('age', Donor.age, 'int64'),
+        ('blood_group', Donor.blood_group, 'string'),
+        ('organ_type', Donor.organ_type, 'string'),
+        ('hla_type', Donor.hla_type, 'string'),
+        ('availability_status', Donor.availability_status, 'bool'),
+        ('approval_status', Donor.approval_status, 'string'),
+        ('reliability_score', Donor.reliability_score, 'float64'),
+        ('city', Donor.city, 'string'),
+        ('state', Donor.state, 'string'),
+        ('registration_date', Donor.registration_date, 'timestamp'),
+    ],
+    'matches': [
+        ('match_id', Match.id, 'int64'),
+        ('sos_case_id', Match.sos_case_id, 'int64'),
+        ('donor_id', Match.donor_id, 'int64'),
+        ('organ_type', Donor.organ_type, 'string'),
+        ('blood_group', Donor.blood_group, 'string'),
+        ('compatibility_score', Match.compatibility_score, 'float64'),
+        ('distance_km', Match.distance_km, 'float64'),
+        ('match_probability', Match.match_probability, 'float64'),
+        ('urgency_weight', Match.urgency_weight, 'float64'),
+        ('final_score', Match.final_score, 'float64'),
+        ('status', Match.status, 'string'),
+        ('created_at', Match.created_at, 'timestamp'),
+    ],
+}
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet exports require pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+def export_query(kind, hospital_id):
+    """SELECT for one hospital's rows, in id order"""
+    columns = EXPORT_COLUMNS[kind]
+    query = select(*[column for _, column, _ in columns])
+    if kind == 'donors':
+        return query.where(Donor.hospital_id == hospital_id).order_by(Donor.id)
+    return query.join(Donor, Donor.id == Match.donor_id).where(Donor.hospital_id == hospital_id).order_by(Match.id)
+
+def _plain(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+def iter_batches(db_manager, kind, hospital_id, chunk_size=EXPORT_CHUNK_ROWS):
+    """Lists of row tuples, at most chunk_size rows each, streamed from the database"""
+    session = db_manager.get_session()
+    try:
+        result = session.execute(export_query(kind, hospital_id).execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [tuple(_plain(value) for value in row) for row in partition]
+    finally:
+        session.close()
+
+def stream_csv(db_manager, kind, hospital_id, chunk_size=EXPORT_CHUNK_ROWS):
+    """CSV export as a generator of UTF-8 byte chunks (header first)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS[kind]])
+    yield buffer.getvalue().encode('utf-8')
+    for batch in iter_batches(db_manager, kind, hospital_id, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def export_schema(pa, kind):
+    types = {
+        'int64': pa.int64(), 'float64': pa.float64(), 'bool': pa.bool_(),
+        'string': pa.string(), 'timestamp': pa.timestamp('us'),
+    }
+    return pa.schema([(name, types[type_name]) for name, _, type_name in EXPORT_COLUMNS[kind]])
+
+def stream_parquet(db_manager, kind, hospital_id, chunk_size=EXPORT_CHUNK_ROWS):
+    """Parquet export as a generator of byte chunks, one row group per batch"""
+    pa, pq = _require_pyarrow()
+    schema = export_schema(pa, kind)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for batch in iter_batches(db_manager, kind, hospital_id, chunk_size):
+            arrays = [pa.array(list(values), type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def stream_export(db_manager, kind, hospital_id, fmt='csv', chunk_size=EXPORT_CHUNK_ROWS):
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError(f"unknown export {kind!r}")
+    if fmt == 'csv':
+        return stream_csv(db_manager, kind, hospital_id, chunk_size)
+    if fmt == 'parquet':
+        return stream_parquet(db_manager, kind, hospital_id, chunk_size)
+    raise ValueError(f"unknown format {fmt!r}")
+
+def write_export(db_manager, kind, hospital_id, fmt, path, chunk_size=EXPORT_CHUNK_ROWS):
+    """Stream an export to a file; returns bytes written"""
+    written = 0
+    with open(path, 'wb') as f:
+        for chunk in stream_export(db_manager, kind, hospital_id, fmt, chunk_size):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+def export_filename(kind, hospital_id, fmt):
+    return f"jeevsetu_{kind}_hospital{hospital_id}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+
+def hospital_id_for_email(db_manager, email):
+    """Registry hospital behind an app login, or None"""
+    session = db_manager.get_session()
+    try:
+        row = session.query(Hospital.id).filter(Hospital.email == email).first()
+        return row[0] if row else None
+    finally:
+        session.close()
+
+# ---- Signed download links ----
+
+def _signature(secret, hospital_id, kind, fmt, expires):
+    message = f"{hospital_id}:{kind}:{fmt}:{expires}".encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def export_url(base_url, hospital_id, kind, fmt, ttl_s=300, secret=None):
+    """Expiring download link for the export server"""
+    secret = secret or os.environ['JEEVSETU_EXPORT_SECRET']
+    expires = int(time.time()) + ttl_s
+    query = urlencode({
+        'hospital_id': hospital_id, 'expires': expires,
+        'signature': _signature(secret, hospital_id, kind, fmt, expires)
+    })
+    return f"{base_url.rstrip('/')}/export/{kind}.{fmt}?{query}"
+
+def verify_request(secret, hospital_id, kind, fmt, expires, signature):
+    if int(expires) < time.time():
+        return False
+    return hmac.compare_digest(_signature(secret, hospital_id, kind, fmt, int(expires)), signature)
+
+class ExportRequestHandler(BaseHTTPRequestHandler):
+    """GET /export/<kind>.<format>?hospital_id=&expires=&signature="""
+    server_version = "JeevSetuExport/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def _send_error(self, status, message):
+        body = message.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.rsplit('/', 1)[-1]
+        kind, _, fmt = name.partition('.')
+        if not url.path.startswith('/export/') or kind not in EXPORT_COLUMNS or fmt not in FORMATS:
+            self._send_error(404, "not found")
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            hospital_id = int(params['hospital_id'])
+            authorized = verify_request(self.server.secret, hospital_id, kind, fmt, params['expires'], params['signature'])
+        except (KeyError, ValueError):
+            authorized = False
+        if not authorized:
+            self._send_error(403, "invalid or expired link")
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', FORMATS[fmt])
+        self.send_header('Content-Disposition', f'attachment; filename="{export_filename(kind, hospital_id, fmt)}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in stream_export(self.server.db_manager, kind, hospital_id, fmt):
+                if chunk:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode('ascii') + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            # Headers are gone; dropping the connection without the final chunk marks the download as failed
+            print(f"❌ Export failed: {str(e)}")
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if os.environ.get('EXPORT_SERVER_ACCESS_LOG'):
+            super().log_message(format, *args)
+
+def serve(db_manager=None, host="127.0.0.1", port=DEFAULT_EXPORT_PORT, secret=None):
+    """Run the export server until interrupted"""
+    secret = secret or os.environ.get('JEEVSETU_EXPORT_SECRET')
+    if not secret:
+        raise RuntimeError("Set JEEVSETU_EXPORT_SECRET to sign export links")
+    server = ThreadingHTTPServer((host, port), ExportRequestHandler)
+    server.daemon_threads = True
+    server.db_manager = db_manager or DatabaseManager()
+    server.secret = secret
+    print(f"✅ Export server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 Export server stopped")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream donor and match exports")
+    parser.add_argument("command", choices=["write", "serve"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--hospital-id", type=int)
+    parser.add_argument("--kind", choices=list(EXPORT_COLUMNS), default="donors")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--out")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_EXPORT_PORT)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    if args.command == "serve":
+        serve(db_manager, args.host, args.port)
+    else:
+        if args.hospital_id is None:
+            parser.error("write needs --hospital-id")
+        out = args.out or export_filename(args.kind, args.hospital_id, args.format)
+        started = time.perf_counter()
+        size = write_export(db_manager, args.kind, args.hospital_id, args.format, out)
+        print(f"✅ Exported {args.kind} of hospital {args.hospital_id} to {out} "
+              f"({size / (1024 * 1024):.1f} MB in {time.perf_counter() - started:.1f}s)")
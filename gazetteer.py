@@ -0,0 +1,388 @@
+"""Offline gazetteer of Indian cities and PIN codes for Organ Donation Platform
+
+data/gazetteer_in.csv (name, state, latitude, longitude, aliases, pincodes)
+is compiled into two sorted indexes: normalized names and aliases -> place,
+and PIN code prefixes (sorting district, 3-6 digits) -> place. Lookups are a
+binary search on the key list; a miss falls back to sub-phrases ("Mumbai
+Suburban" -> Mumbai) and then to the closest key within a small edit
+distance ("Banglore" -> Bangalore). Results are memoized, so the registry's
+repeated city strings resolve in about a microsecond.
+
+Resolved coordinates are cached on User and SOSCase rows (install_geocoding),
+and MatchingEngine uses them for real great-circle distances.
+
+    python gazetteer.py build                    # compiles data/gazetteer_in.npz
+    python gazetteer.py lookup "Banglore"
+    python gazetteer.py lookup --pincode 682001
+    python gazetteer.py backfill --db data/organ_donation.db
+"""
+import os
+import re
+import csv
+import time
+import bisect
+import argparse
+import threading
+import unicodedata
+from functools import lru_cache
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import event, text, inspect
+from database import DatabaseManager, User, SOSCase
+
+# Bundled with the code, so resolved next to this module rather than the working directory
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer_in.csv")
+EARTH_RADIUS_KM = 6371.0
+NO_PLACE = -1
+
+# Administrative suffixes that never distinguish two places
+NOISE_WORDS = {'city', 'district', 'dist', 'urban', 'rural', 'suburban', 'town', 'metro', 'cantonment', 'cantt'}
+PINCODE_PATTERN = re.compile(r'(?<!\d)(\d{3})\s?(\d{3})(?!\d)')
+STATE_ALIASES = {
+    'orissa': 'odisha', 'uttaranchal': 'uttarakhand', 'pondicherry': 'puducherry',
+    'nct of delhi': 'delhi', 'new delhi': 'delhi', 'j and k': 'jammu and kashmir',
+    'andaman and nicobar': 'andaman and nicobar islands',
+    'dl': 'delhi', 'mh': 'maharashtra', 'ka': 'karnataka', 'tn': 'tamil nadu', 'kl': 'kerala',
+    'ap': 'andhra pradesh', 'ts': 'telangana', 'tg': 'telangana', 'gj': 'gujarat', 'rj': 'rajasthan',
+    'up': 'uttar pradesh', 'mp': 'madhya pradesh', 'wb': 'west bengal', 'hr': 'haryana', 'pb': 'punjab',
+    'br': 'bihar', 'jh': 'jharkhand', 'or': 'odisha', 'od': 'odisha', 'cg': 'chhattisgarh',
+    'uk': 'uttarakhand', 'hp': 'himachal pradesh', 'jk': 'jammu and kashmir', 'as': 'assam', 'ga': 'goa',
+}
+
+Location = namedtuple('Location', 'place_id name state latitude longitude method')
+
+def normalize(value):
+    """Lowercase ASCII words: accents, punctuation and noise suffixes dropped"""
+    if value is None:
+        return ""
+    value = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii').lower()
+    words = re.sub(r'[^a-z0-9]+', ' ', value.replace('&', ' and ')).split()
+    words = [w for w in words if not w.isdigit()]
+    kept = [w for w in words if w not in NOISE_WORDS]
+    return " ".join(kept or words)
+
+def normalize_state(value):
+    key = normalize(value)
+    return STATE_ALIASES.get(key, key)
+
+def parse_pincode(value):
+    """First 6-digit PIN code in a string ("682 001", "Kochi 682001"), or None"""
+    if value is None:
+        return None
+    match = PINCODE_PATTERN.search(str(value))
+    return match.group(1) + match.group(2) if match else None
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance; any argument may be a NumPy array"""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit (banded DP)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[lo - 1]
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] < cost:
+                cost = previous[j] + 1
+            if current[j - 1] < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+def _bigrams(key):
+    return frozenset(key[i:i + 2] for i in range(len(key) - 1))
+
+def _fuzzy_limit(key):
+    return 1 if len(key) <= 6 else 2 if len(key) <= 12 else 3
+
+class Gazetteer:
+    """Places as parallel arrays plus the sorted name and PIN prefix indexes"""
+    def __init__(self, names, states, latitude, longitude, keys, key_places, pin_prefixes, pin_places):
+        self.names = [str(n) for n in names]
+        self.states = [str(s) for s in states]
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        # Sorted by (key, place); bisect works on plain lists without NumPy call overhead
+        self.keys = [str(k) for k in keys]
+        self.key_places = [int(p) for p in key_places]
+        self.pin_prefixes = [str(p) for p in pin_prefixes]
+        self.pin_places = [int(p) for p in pin_places]
+        state_keys = [normalize_state(s) for s in self.states]
+        self.state_index = {key: code for code, key in enumerate(dict.fromkeys(state_keys))}
+        self.state_codes = np.array([self.state_index[key] for key in state_keys], dtype=np.int16)
+        self._bigrams = None
+        self._resolve = lru_cache(maxsize=16384)(self._resolve_uncached)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_GAZETTEER_PATH):
+        """Compile the bundled CSV (or a full India Post directory in the same columns)"""
+        names, states, latitude, longitude = [], [], [], []
+        keys, pins = {}, {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                place = len(names)
+                names.append(row['name'].strip())
+                states.append(row['state'].strip())
+                latitude.append(float(row['latitude']))
+                longitude.append(float(row['longitude']))
+                for alias in [row['name']] + (row.get('aliases') or '').split('|'):
+                    key = normalize(alias)
+                    if key and place not in keys.setdefault(key, []):
+                        keys[key].append(place)
+                for prefix in (row.get('pincodes') or '').split('|'):
+                    prefix = prefix.strip()
+                    if prefix:
+                        # First row wins a shared prefix, as for names
+                        pins.setdefault(prefix, place)
+        key_pairs = sorted((key, place) for key, places in keys.items() for place in places)
+        pin_pairs = sorted(pins.items())
+        return cls(
+            names, states, latitude, longitude,
+            [k for k, _ in key_pairs], [p for _, p in key_pairs],
+            [k for k, _ in pin_pairs], [p for _, p in pin_pairs]
+        )
+
+    def save(self, path):
+        """Write the compiled index as one uncompressed .npz (no pickles)"""
+        np.savez(
+            path,
+            names=np.array(self.names), states=np.array(self.states),
+            latitude=self.latitude, longitude=self.longitude,
+            keys=np.array(self.keys), key_places=np.array(self.key_places, dtype=np.int32),
+            pin_prefixes=np.array(self.pin_prefixes), pin_places=np.array(self.pin_places, dtype=np.int32)
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_GAZETTEER_PATH):
+        """The compiled .npz next to the CSV when it is current, else compile the CSV"""
+        compiled = compiled_path(path)
+        if os.path.exists(compiled) and (not os.path.exists(path) or os.path.getmtime(compiled) >= os.path.getmtime(path)):
+            with np.load(compiled, allow_pickle=False) as data:
+                return cls(*(data[name] for name in (
+                    'names', 'states', 'latitude', 'longitude', 'keys', 'key_places', 'pin_prefixes', 'pin_places'
+                )))
+        return cls.from_csv(path)
+
+    # ---- lookups ----
+
+    def _exact(self, key, state_code):
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        if lo == hi:
+            return NO_PLACE
+        for i in range(lo, hi):
+            if self.state_codes[self.key_places[i]] == state_code:
+                return self.key_places[i]
+        return self.key_places[lo]
+
+    def _sub_phrase(self, key, state_code):
+        """Longest run of words that names a place ("mumbai suburban" -> "mumbai")"""
+        words = key.split()
+        for size in range(len(words) - 1, 0, -1):
+            for start in range(len(words) - size + 1):
+                place = self._exact(" ".join(words[start:start + size]), state_code)
+                if place != NO_PLACE:
+                    return place
+        return NO_PLACE
+
+    def _closest(self, key, state_code):
+        """Nearest key by edit distance; same first letter first, then every key"""
+        if self._bigrams is None:
+            self._bigrams = [_bigrams(k) for k in self.keys]
+        limit = _fuzzy_limit(key)
+        grams = _bigrams(key)
+        # k edits remove at most 2k of the query's distinct bigrams
+        min_shared = len(grams) - 2 * limit
+        lo = bisect.bisect_left(self.keys, key[0])
+        hi = bisect.bisect_left(self.keys, chr(ord(key[0]) + 1))
+        for candidates in (range(lo, hi), range(len(self.keys))):
+            best, best_rank = NO_PLACE, None
+            for i in candidates:
+                if len(grams & self._bigrams[i]) < min_shared:
+                    continue
+                distance = edit_distance(key, self.keys[i], limit)
+                if distance > limit:
+                    continue
+                place = self.key_places[i]
+                rank = (distance, self.state_codes[place] != state_code, place)
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = place, rank
+            if best != NO_PLACE:
+                return best
+        return NO_PLACE
+
+    def place_for_pincode(self, pincode):
+        """Longest indexed prefix of a 6-digit PIN code"""
+        for size in range(len(pincode), 2, -1):
+            prefix = pincode[:size]
+            i = bisect.bisect_left(self.pin_prefixes, prefix)
+            if i < len(self.pin_prefixes) and self.pin_prefixes[i] == prefix:
+                return self.pin_places[i]
+        return NO_PLACE
+
+    def _resolve_uncached(self, city, state, pincode):
+        pincode = parse_pincode(pincode) or parse_pincode(city)
+        if pincode:
+            place = self.place_for_pincode(pincode)
+            if place != NO_PLACE:
+                return self._location(place, 'pincode')
+        key = normalize(city)
+        if not key:
+            return None
+        state_code = self.state_index.get(normalize_state(state), -1)
+        place = self._exact(key, state_code)
+        if place != NO_PLACE:
+            return self._location(place, 'exact')
+        place = self._sub_phrase(key, state_code)
+        if place == NO_PLACE:
+            place = self._closest(key, state_code)
+        if place == NO_PLACE or (state_code >= 0 and self.state_codes[place] != state_code):
+            return None  # an approximate name in another state is a different town, not a typo
+        return self._location(place, 'fuzzy')
+
+    def _location(self, place, method):
+        return Location(place, self.names[place], self.states[place],
+                        float(self.latitude[place]), float(self.longitude[place]), method)
+
+    def resolve(self, city=None, state=None, pincode=None):
+        """
+        Resolve a free-text city (and optional state / PIN code) to a place
+
+        Args:
+            city: City or town name in any common spelling; a PIN code inside it is used too
+            state: Optional state, used to pick between same-named places
+            pincode: Optional PIN code; takes precedence over the name
+
+        Returns:
+            Location (place_id, name, state, latitude, longitude, method) or None
+        """
+        return self._resolve(city or None, state or None, pincode or None)
+
+    def place_id(self, city, state=None):
+        location = self._resolve(city or None, state or None, None)
+        return location.place_id if location else NO_PLACE
+
+    def distances_km(self, latitude, longitude, places):
+        """Distance from a point to each place id (NaN for NO_PLACE)"""
+        places = np.asarray(places, dtype=np.int64)
+        known = places >= 0
+        safe = np.where(known, places, 0)
+        distances = haversine_km(latitude, longitude, self.latitude[safe], self.longitude[safe])
+        return np.where(known, distances, np.nan)
+
+def compiled_path(path):
+    return os.path.splitext(path)[0] + ".npz"
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """Process-wide gazetteer (JEEVSETU_GAZETTEER overrides the bundled CSV)"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load(os.environ.get('JEEVSETU_GAZETTEER', DEFAULT_GAZETTEER_PATH))
+    return _gazetteer
+
+# ---- coordinates cached on registry rows ----
+
+def _geocode(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes():
+        return  # explicit coordinates (e.g. from the device) win
+    moved = state.attrs.city.history.has_changes() or state.attrs.state.history.has_changes()
+    if target.latitude is not None and not moved:
+        return
+    try:
+        location = get_gazetteer().resolve(target.city, target.state)
+    except Exception as e:
+        print(f"⚠️ Gazetteer unavailable, coordinates not cached: {str(e)}")
+        return
+    target.latitude, target.longitude = (location.latitude, location.longitude) if location else (None, None)
+
+def install_geocoding():
+    """Cache resolved coordinates on every ORM User/SOSCase insert and city/state change (idempotent)"""
+    for model in (User, SOSCase):
+        for name in ('before_insert', 'before_update'):
+            if not event.contains(model, name, _geocode):
+                event.listen(model, name, _geocode)
+
+def backfill(db_manager=None, gazetteer=None):
+    """
+    Cache coordinates on rows written before geocoding (or outside the ORM)
+
+    Returns:
+        Dict of table -> rows updated
+    """
+    db_manager = db_manager or DatabaseManager()
+    gazetteer = gazetteer or get_gazetteer()
+    updated = {}
+    with db_manager.engine.begin() as conn:
+        for table in (User.__tablename__, SOSCase.__tablename__):
+            pairs = conn.execute(text(
+                f"SELECT DISTINCT city, state FROM {table} WHERE latitude IS NULL AND city IS NOT NULL"
+            )).fetchall()
+            updated[table] = 0
+            for city, state in pairs:
+                location = gazetteer.resolve(city, state)
+                if location is None:
+                    continue
+                updated[table] += conn.execute(text(
+                    f"UPDATE {table} SET latitude = :lat, longitude = :lon "
+                    "WHERE latitude IS NULL AND city = :city AND state IS :state"
+                ), {'lat': location.latitude, 'lon': location.longitude, 'city': city, 'state': state}).rowcount
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline gazetteer of Indian cities and PIN codes")
+    parser.add_argument("command", choices=["build", "lookup", "backfill"])
+    parser.add_argument("query", nargs="?", help="City name (lookup)")
+    parser.add_argument("--state")
+    parser.add_argument("--pincode")
+    parser.add_argument("--source", default=DEFAULT_GAZETTEER_PATH, help="Gazetteer CSV")
+    parser.add_argument("--db", default="data/organ_donation.db")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "build":
+        gazetteer = Gazetteer.from_csv(args.source)
+        gazetteer.save(compiled_path(args.source))
+        print(f"✅ Gazetteer compiled: {len(gazetteer)} places, {len(gazetteer.keys)} names, "
+              f"{len(gazetteer.pin_prefixes)} PIN prefixes -> {compiled_path(args.source)}")
+    elif args.command == "lookup":
+        gazetteer = Gazetteer.load(args.source)
+        location = gazetteer.resolve(args.query, args.state, args.pincode)
+        if location is None:
+            print(f"❌ No place found for {args.query or args.pincode!r}")
+        else:
+            gazetteer._resolve.cache_clear()
+            runs = 1000
+            lookup_started = time.perf_counter()
+            for _ in range(runs):
+                gazetteer._resolve_uncached(args.query, args.state, args.pincode)
+            per_lookup_us = (time.perf_counter() - lookup_started) / runs * 1e6
+            print(f"✅ {location.name}, {location.state} ({location.latitude:.4f}, {location.longitude:.4f}) "
+                  f"via {location.method}; {per_lookup_us:.1f} µs uncached")
+    else:
+        updated = backfill(DatabaseManager(args.db), Gazetteer.load(args.source))
+        print(f"✅ Coordinates cached in {time.perf_counter() - started:.1f}s: "
+              + ", ".join(f"{count} {table}" for table, count in updated.items()))
@@ -0,0 +1,338 @@
+"""Inverted HLA antigen index for Organ Donation Platform
+
+Donor HLA typings are split into antigens ("A2", "B44", "DR4") and stored as
+posting lists: hla_postings holds one (antigen, donor_id) row per antigen and
+is kept current by SQLAlchemy events on Donor writes (install_hla_index).
+
+HLAIndex loads the postings as sorted NumPy arrays and answers "donors that
+share at least k of the patient's antigens" by counting over the posting
+lists. A donor in k of m lists must appear in one of the m-k+1 shortest
+ones, so only those are scanned and the longer lists are probed by binary
+search - work follows the rarest antigens, not the registry size.
+
+Every write that changes postings bumps a version and appends the added and
+removed (antigen, donor) pairs to hla_index_log under that version, so a
+loaded index catches up by patching only the touched posting lists. A
+rebuild or a pruned log leaves a gap in the versions and forces a full
+reload instead.
+
+Writes that bypass the ORM (raw SQL on donors.hla_type) bump nothing, so
+loaded indexes cannot see them. The periodic reconcile job compares every
+donor's typing with its postings and logs the differences like an ORM
+write; run it (or rebuild) after bulk SQL changes.
+
+    python hla_index.py rebuild --db data/organ_donation.db
+    python hla_index.py reconcile --db data/organ_donation.db   # daily
+    python hla_index.py query --db data/organ_donation.db --hla "A2,B44,DR4" --min-shared 2
+"""
+import re
+import json
+import time
+import argparse
+import numpy as np
+from sqlalchemy import event, text, inspect
+from database import DatabaseManager, Donor
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+# Change-log versions kept for incremental refresh; older readers reload in full
+LOG_RETENTION_VERSIONS = 50000
+
+# Locus names as written in typings; two-field loci collapse to their serological name
+LOCUS_ALIASES = {'DRB1': 'DR', 'DQB1': 'DQ', 'DPB1': 'DP'}
+ANTIGEN_PATTERN = re.compile(r'(?:HLA-)?(DRB1|DQB1|DPB1|DR|DQ|DP|A|B|C)\s*\*?\s*(\d+)', re.IGNORECASE)
+
+def parse_hla(value):
+    """
+    Normalize an HLA typing to sorted antigen strings
+
+    Accepts "A2,A33,B44", "HLA-A*02:01 B*44:02", and the app's JSON form
+    {"A": [2], "B": [7], "DR": [4]} (as a dict or string).
+    """
+    if not value:
+        return []
+    if isinstance(value, str) and value.lstrip().startswith('{'):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if isinstance(value, dict):
+        pairs = [(locus, allele) for locus, alleles in value.items() for allele in (alleles or [])]
+    else:
+        pairs = ANTIGEN_PATTERN.findall(str(value))
+
+    antigens = set()
+    for locus, allele in pairs:
+        try:
+            number = int(str(allele).split(':')[0])
+        except ValueError:
+            continue
+        locus = str(locus).upper()
+        antigens.add(f"{LOCUS_ALIASES.get(locus, locus)}{number}")
+    return sorted(antigens)
+
+def _bump_version(conn, changes=None):
+    """
+    Advance the index version and log what changed under it
+
+    Args:
+        changes: (antigen, donor_id, added) tuples; None marks a full rebuild,
+            which clears the log so readers reload everything
+    """
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS hla_index_state (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    ))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS hla_index_log (version INTEGER NOT NULL, antigen TEXT, donor_id INTEGER, added INTEGER)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_hla_index_log_version ON hla_index_log (version)"))
+    conn.execute(text(
+        "INSERT INTO hla_index_state (id, version) VALUES (1, 1) "
+        "ON CONFLICT (id) DO UPDATE SET version = version + 1"
+    ))
+    version = _read_version(conn)
+    if changes is None:
+        conn.execute(text("DELETE FROM hla_index_log"))
+        conn.execute(text("INSERT INTO hla_index_log (version) VALUES (:version)"), {'version': version})
+        return
+    conn.execute(
+        text("INSERT INTO hla_index_log (version, antigen, donor_id, added) VALUES (:version, :antigen, :donor_id, :added)"),
+        [{'version': version, 'antigen': antigen, 'donor_id': donor_id, 'added': int(added)} for antigen, donor_id, added in changes]
+    )
+    if version % 1000 == 0:
+        conn.execute(text("DELETE FROM hla_index_log WHERE version <= :cutoff"), {'cutoff': version - LOG_RETENTION_VERSIONS})
+
+def _read_version(conn):
+    try:
+        return conn.execute(text("SELECT version FROM hla_index_state WHERE id = 1")).scalar() or 0
+    except Exception:
+        return 0
+
+def _write_postings(conn, donor_id, current, antigens):
+    """Move one donor's postings from `current` to `antigens`; returns the (antigen, donor_id, added) changes"""
+    removed, added = sorted(current - antigens), sorted(antigens - current)
+    if removed:
+        conn.execute(
+            text("DELETE FROM hla_postings WHERE antigen = :antigen AND donor_id = :donor_id"),
+            [{'antigen': antigen, 'donor_id': donor_id} for antigen in removed]
+        )
+    if added:
+        conn.execute(
+            text("INSERT INTO hla_postings (antigen, donor_id) VALUES (:antigen, :donor_id)"),
+            [{'antigen': antigen, 'donor_id': donor_id} for antigen in added]
+        )
+    return [(antigen, donor_id, False) for antigen in removed] + [(antigen, donor_id, True) for antigen in added]
+
+def index_donor(conn, donor_id, hla_type):
+    """Replace the postings of one donor (only the antigens that changed are written and logged)"""
+    current = set(conn.execute(
+        text("SELECT antigen FROM hla_postings WHERE donor_id = :id"), {'id': donor_id}
+    ).scalars())
+    changes = _write_postings(conn, donor_id, current, set(parse_hla(hla_type)))
+    if changes:
+        _bump_version(conn, changes)
+
+def _donor_written(mapper, connection, target):
+    if inspect(target).attrs.hla_type.history.has_changes():
+        index_donor(connection, target.id, target.hla_type)
+
+def _donor_deleted(mapper, connection, target):
+    index_donor(connection, target.id, None)
+
+def install_hla_index():
+    """Maintain hla_postings on every ORM Donor insert/update/delete (idempotent)"""
+    for name, handler in (('after_insert', _donor_written), ('after_update', _donor_written), ('after_delete', _donor_deleted)):
+        if not event.contains(Donor, name, handler):
+            event.listen(Donor, name, handler)
+
+def rebuild(db_manager=None, chunk_size=20000):
+    """
+    Re-index every donor (backfill, or after writes that bypassed the ORM)
+
+    Returns:
+        Number of postings written
+    """
+    db_manager = db_manager or DatabaseManager()
+    written = 0
+    with db_manager.engine.begin() as conn:
+        conn.execute(text("DELETE FROM hla_postings"))
+        result = conn.execute(text("SELECT id, hla_type FROM donors WHERE hla_type IS NOT NULL"))
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            postings = [
+                {'antigen': antigen, 'donor_id': donor_id}
+                for donor_id, hla_type in rows
+                for antigen in parse_hla(hla_type)
+            ]
+            if postings:
+                conn.execute(text("INSERT INTO hla_postings (antigen, donor_id) VALUES (:antigen, :donor_id)"), postings)
+            written += len(postings)
+        _bump_version(conn, None)
+    return written
+
+def reconcile(db_manager=None):
+    """
+    Periodic job: re-index donors whose typing no longer matches their postings
+
+    Catches raw-SQL inserts, updates and deletes on donors, which the ORM
+    events never see. The differences are logged under one version, so
+    loaded indexes patch them in without a full reload.
+
+    Returns:
+        Report dict (donors, added, removed) - donors re-indexed and postings written/deleted
+    """
+    db_manager = db_manager or DatabaseManager()
+    changes = []
+    with db_manager.engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT d.id, d.hla_type, group_concat(p.antigen) FROM donors d "
+            "LEFT JOIN hla_postings p ON p.donor_id = d.id GROUP BY d.id"
+        )).fetchall()
+        orphans = conn.execute(text(
+            "SELECT donor_id, group_concat(antigen) FROM hla_postings "
+            "WHERE donor_id NOT IN (SELECT id FROM donors) GROUP BY donor_id"
+        )).fetchall()
+        for donor_id, hla_type, current in rows + [(donor_id, None, current) for donor_id, current in orphans]:
+            if hla_type and hla_type == current:
+                continue  # typing already written as its own antigens
+            current = set(current.split(',')) if current else set()
+            antigens = set(parse_hla(hla_type))
+            if current != antigens:
+                changes += _write_postings(conn, donor_id, current, antigens)
+        if changes:
+            _bump_version(conn, changes)
+    added = sum(1 for change in changes if change[2])
+    return {'donors': len({change[1] for change in changes}), 'added': added, 'removed': len(changes) - added}
+
+class HLAIndex:
+    """In-memory posting lists, patched from hla_index_log when hla_postings changes"""
+    def __init__(self, db_manager=None, min_reload_interval_s=5.0):
+        self.db_manager = db_manager or DatabaseManager()
+        self.min_reload_interval_s = min_reload_interval_s
+        self.postings = {}
+        self.version = None
+        self._checked_at = 0.0
+
+    def refresh(self, force=False):
+        """Catch up with hla_postings if the index version moved (checked at most every min_reload_interval_s)"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < self.min_reload_interval_s:
+            return False
+        self._checked_at = now
+        with self.db_manager.engine.connect() as conn:
+            version = _read_version(conn)
+            if not force and version == self.version:
+                return False
+            if not force and self.version is not None and self._apply_log(conn, version):
+                return True
+            rows = conn.execute(text("SELECT antigen, donor_id FROM hla_postings ORDER BY antigen, donor_id")).fetchall()
+
+        postings = {}
+        if rows:
+            antigens = np.array([row[0] for row in rows])
+            donor_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+            names, starts = np.unique(antigens, return_index=True)
+            bounds = list(starts[1:]) + [len(rows)]
+            for name, start, end in zip(names, starts, bounds):
+                postings[str(name)] = donor_ids[start:end]
+        self.postings = postings
+        self.version = version
+        return True
+
+    def _apply_log(self, conn, version):
+        """
+        Patch the loaded posting lists with the logged changes up to version
+
+        Returns:
+            False when the log cannot bring this index up to date (full reload needed)
+        """
+        try:
+            rows = conn.execute(text(
+                "SELECT version, antigen, donor_id, added FROM hla_index_log "
+                "WHERE version > :loaded AND version <= :version ORDER BY version, rowid"
+            ), {'loaded': self.version, 'version': version}).fetchall()
+        except Exception:
+            return False
+        # Every logged version carries at least one row, so a missing one means lost changes
+        if len({row[0] for row in rows}) != version - self.version or any(row[1] is None for row in rows):
+            return False
+
+        final = {}
+        for _, antigen, donor_id, added in rows:
+            final[(antigen, donor_id)] = added
+        changes = {}
+        for (antigen, donor_id), added in final.items():
+            changes.setdefault(antigen, ([], []))[1 if added else 0].append(donor_id)
+
+        # Swap in a new dict so concurrent searches keep a consistent view
+        postings = dict(self.postings)
+        for antigen, (removed, added) in changes.items():
+            posting = postings.get(antigen, EMPTY)
+            if removed:
+                posting = posting[~np.isin(posting, np.asarray(removed, dtype=np.int64))]
+            if added:
+                posting = np.union1d(posting, np.asarray(added, dtype=np.int64))
+            if len(posting):
+                postings[antigen] = posting
+            else:
+                postings.pop(antigen, None)
+        self.postings = postings
+        self.version = version
+        return True
+
+    def posting(self, antigen):
+        return self.postings.get(antigen, EMPTY)
+
+    def donors_sharing(self, hla, min_shared=1):
+        """
+        Donors sharing at least min_shared antigens with an HLA typing
+
+        Args:
+            hla: Typing in any form parse_hla accepts, or a list of antigens
+
+        Returns:
+            (sorted donor ids, number of shared antigens per donor)
+        """
+        self.refresh()
+        antigens = parse_hla(hla) if not isinstance(hla, (list, tuple, set)) else sorted(set(hla))
+        lists = sorted((self.posting(antigen) for antigen in antigens), key=len)
+        k = max(1, int(min_shared))
+        if k > len(lists):
+            return EMPTY, EMPTY
+
+        # Anyone in k of the m lists appears in one of the m-k+1 shortest
+        seeds = np.unique(np.concatenate(lists[:len(lists) - k + 1]))
+        counts = np.zeros(len(seeds), dtype=np.int64)
+        for posting in lists:
+            if not len(posting):
+                continue
+            positions = np.minimum(np.searchsorted(posting, seeds), len(posting) - 1)
+            counts += posting[positions] == seeds
+        keep = counts >= k
+        return seeds[keep], counts[keep]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inverted HLA antigen index")
+    parser.add_argument("command", choices=["rebuild", "reconcile", "query"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--hla", help="Patient typing for query, e.g. \"A2,B44,DR4\"")
+    parser.add_argument("--min-shared", type=int, default=2)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    if args.command == "rebuild":
+        started = time.perf_counter()
+        print(f"✅ Indexed {rebuild(db_manager)} HLA postings in {time.perf_counter() - started:.1f}s")
+    elif args.command == "reconcile":
+        started = time.perf_counter()
+        report = reconcile(db_manager)
+        print(f"✅ Re-indexed {report['donors']} donors in {time.perf_counter() - started:.1f}s: "
+              f"{report['added']} postings added, {report['removed']} removed")
+    else:
+        index = HLAIndex(db_manager)
+        started = time.perf_counter()
+        donor_ids, counts = index.donors_sharing(args.hla, args.min_shared)
+        print(f"ℹ️ {len(donor_ids)} donors share >= {args.min_shared} antigens with {parse_hla(args.hla)} "
+              f"({(time.perf_counter() - started) * 1000:.1f} ms)")
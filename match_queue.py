@@ -0,0 +1,329 @@
+"""Background matching job queue for Organ Donation Platform
+
+SOS cases are matched by a pool of worker processes instead of in the
+caller. Jobs live in the match_jobs table, so they survive restarts:
+
+- priority is the case's urgency level; workers always claim the most urgent
+  pending job first (FIFO within a level), so EMERGENCY cases overtake a bulk
+  re-match backlog of LOW ones
+- a partial unique index keeps at most one pending job per case; enqueueing
+  again only raises the pending job's priority
+- a claim is a single UPDATE ... RETURNING, so two workers can never take the
+  same job
+
+The process that records SOS cases calls install_auto_enqueue() once at
+setup (or builds its engine with MatchingEngine(auto_enqueue=True)); nothing
+installs the hook implicitly.
+
+    python match_queue.py worker --db data/organ_donation.db --workers 4
+    python match_queue.py rematch --db data/organ_donation.db
+"""
+import os
+import time
+import socket
+import argparse
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, text
+from database import DatabaseManager, SOSCase
+from metrics import REGISTRY
+
+SQLITE_TS_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+FINISHED_STATUSES = ("done", "failed")
+
+QUEUE_JOBS = REGISTRY.counter(
+    'jeevsetu_match_jobs_total', 'Matching jobs by outcome', ['outcome']
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'jeevsetu_match_job_wait_seconds', 'Time from enqueue to claim by urgency level', ['priority'],
+    buckets=[0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600]
+)
+
+ENQUEUE_SQL = text("""
+    INSERT INTO match_jobs (sos_case_id, priority, status, attempts, max_results, search_radius_km, created_at)
+    VALUES (:sos_case_id, :priority, 'pending', 0, :max_results, :search_radius_km, :now)
+    ON CONFLICT (sos_case_id) WHERE status = 'pending'
+    DO UPDATE SET priority = MAX(priority, excluded.priority)
+""")
+
+CLAIM_SQL = text("""
+    UPDATE match_jobs
+    SET status = 'running', worker = :worker, started_at = :now, attempts = attempts + 1
+    WHERE id = (
+        SELECT id FROM match_jobs WHERE status = 'pending'
+        ORDER BY priority DESC, id
+        LIMIT 1
+    )
+    RETURNING id, sos_case_id, priority, max_results, search_radius_km, created_at
+""")
+
+def _now():
+    return datetime.now(timezone.utc).strftime(SQLITE_TS_FORMAT)
+
+def _parse_ts(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+class JobHandle:
+    """Pollable reference to a queued matching job"""
+    def __init__(self, job_queue, job_id):
+        self.queue = job_queue
+        self.job_id = job_id
+
+    def status(self):
+        job = self.queue.get_job(self.job_id)
+        return job['status'] if job else None
+
+    def done(self):
+        return self.status() in FINISHED_STATUSES
+
+    def wait(self, timeout=None, poll_interval=0.25):
+        """
+        Block until the job has finished
+
+        Returns:
+            Job dict, or None if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.queue.get_job(self.job_id)
+            if job is None or job['status'] in FINISHED_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def __repr__(self):
+        return f"JobHandle(job_id={self.job_id})"
+
+class MatchJobQueue:
+    def __init__(self, db_manager=None, max_attempts=3):
+        self.db_manager = db_manager or DatabaseManager()
+        self.max_attempts = max_attempts
+
+    def enqueue(self, sos_case_id, priority=None, max_results=20, search_radius_km=500):
+        """
+        Queue matching for an SOS case (deduplicated per pending case)
+
+        Args:
+            priority: Defaults to the case's urgency_level
+
+        Returns:
+            JobHandle of the pending job
+        """
+        with self.db_manager.engine.begin() as conn:
+            if priority is None:
+                priority = conn.execute(
+                    text("SELECT urgency_level FROM sos_cases WHERE id = :id"), {'id': sos_case_id}
+                ).scalar()
+                if priority is None:
+                    raise ValueError(f"SOS case {sos_case_id} not found")
+            job_id = _enqueue(conn, sos_case_id, priority, max_results, search_radius_km)
+        QUEUE_JOBS.labels(outcome="enqueued").inc()
+        return JobHandle(self, job_id)
+
+    def enqueue_active_cases(self, max_results=20, search_radius_km=500):
+        """Bulk re-match: queue every active case at its own urgency"""
+        now = _now()
+        with self.db_manager.engine.begin() as conn:
+            cases = conn.execute(text("SELECT id, urgency_level FROM sos_cases WHERE status = 'active'")).fetchall()
+            conn.execute(ENQUEUE_SQL, [
+                {'sos_case_id': case_id, 'priority': urgency, 'max_results': max_results,
+                 'search_radius_km': search_radius_km, 'now': now}
+                for case_id, urgency in cases
+            ])
+        QUEUE_JOBS.labels(outcome="enqueued").inc(len(cases))
+        return len(cases)
+
+    def claim(self, worker):
+        """Atomically take the most urgent pending job, or None"""
+        with self.db_manager.engine.begin() as conn:
+            row = conn.execute(CLAIM_SQL, {'worker': worker, 'now': _now()}).fetchone()
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        created = _parse_ts(job['created_at'])
+        if created is not None:
+            waited = datetime.now(timezone.utc) - created.replace(tzinfo=timezone.utc)
+            QUEUE_WAIT_SECONDS.labels(priority=job['priority']).observe(waited.total_seconds())
+        return job
+
+    def complete(self, job_id, result_count):
+        with self.db_manager.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE match_jobs SET status = 'done', result_count = :n, error = NULL, finished_at = :now WHERE id = :id"
+            ), {'n': result_count, 'now': _now(), 'id': job_id})
+        QUEUE_JOBS.labels(outcome="done").inc()
+
+    def fail(self, job_id, error, retry=True):
+        """Return the job to the queue, or mark it failed after max_attempts (at once when retry is False)"""
+        with self.db_manager.engine.begin() as conn:
+            retried = 0
+            if retry:
+                # OR IGNORE: a newer pending job for the same case supersedes the retry
+                retried = conn.execute(text(
+                    "UPDATE OR IGNORE match_jobs SET status = 'pending', error = :error "
+                    "WHERE id = :id AND attempts < :max_attempts"
+                ), {'error': str(error), 'id': job_id, 'max_attempts': self.max_attempts}).rowcount
+            if not retried:
+                conn.execute(text(
+                    "UPDATE match_jobs SET status = 'failed', error = :error, finished_at = :now WHERE id = :id"
+                ), {'error': str(error), 'now': _now(), 'id': job_id})
+        QUEUE_JOBS.labels(outcome="retried" if retried else "failed").inc()
+
+    def requeue_stale(self, timeout_s=600):
+        """Give jobs of crashed workers back to the queue"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=timeout_s)).strftime(SQLITE_TS_FORMAT)
+        with self.db_manager.engine.begin() as conn:
+            requeued = conn.execute(text(
+                "UPDATE OR IGNORE match_jobs SET status = 'pending' WHERE status = 'running' AND started_at < :cutoff"
+            ), {'cutoff': cutoff}).rowcount
+            # Cases that meanwhile got a new pending job
+            conn.execute(text(
+                "UPDATE match_jobs SET status = 'failed', error = 'superseded', finished_at = :now "
+                "WHERE status = 'running' AND started_at < :cutoff"
+            ), {'cutoff': cutoff, 'now': _now()})
+        return requeued
+
+    def get_job(self, job_id):
+        with self.db_manager.engine.connect() as conn:
+            row = conn.execute(text("SELECT * FROM match_jobs WHERE id = :id"), {'id': job_id}).fetchone()
+        return dict(row._mapping) if row else None
+
+    def stats(self):
+        """Job counts per status and pending jobs per priority"""
+        with self.db_manager.engine.connect() as conn:
+            by_status = dict(conn.execute(text("SELECT status, COUNT(*) FROM match_jobs GROUP BY status")).fetchall())
+            pending = dict(conn.execute(text(
+                "SELECT priority, COUNT(*) FROM match_jobs WHERE status = 'pending' GROUP BY priority"
+            )).fetchall())
+        return {'by_status': by_status, 'pending_by_priority': pending}
+
+def _enqueue(conn, sos_case_id, priority, max_results=20, search_radius_km=500):
+    conn.execute(ENQUEUE_SQL, {
+        'sos_case_id': sos_case_id, 'priority': priority, 'max_results': max_results,
+        'search_radius_km': search_radius_km, 'now': _now()
+    })
+    return conn.execute(text(
+        "SELECT id FROM match_jobs WHERE sos_case_id = :id AND status = 'pending'"
+    ), {'id': sos_case_id}).scalar()
+
+def _enqueue_new_case(mapper, connection, target):
+    _enqueue(connection, target.id, target.urgency_level or 3)
+
+def install_auto_enqueue():
+    """Queue matching whenever a new SOSCase row is inserted (idempotent)"""
+    if not event.contains(SOSCase, 'after_insert', _enqueue_new_case):
+        event.listen(SOSCase, 'after_insert', _enqueue_new_case)
+
+def run_worker(db_path, model_path="data/match_model.pkl", poll_interval=0.5, stop_event=None, max_jobs=None):
+    """
+    Worker loop: claim the most urgent job, run find_matches, record the outcome
+
+    Runs until stop_event is set (or max_jobs have been processed).
+    """
+    from matching_engine import MatchingEngine, PatientNotFound
+
+    db_manager = DatabaseManager(db_path)
+    job_queue = MatchJobQueue(db_manager)
+    engine = MatchingEngine(db_manager, model_path=model_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    while stop_event is None or not stop_event.is_set():
+        job = job_queue.claim(worker)
+        if job is None:
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        try:
+            matches = engine.find_matches(
+                sos_case_id=job['sos_case_id'],
+                max_results=job['max_results'] or 20,
+                search_radius_km=job['search_radius_km'] or 500,
+                raise_errors=True
+            )
+            job_queue.complete(job['id'], len(matches))
+        except PatientNotFound as e:
+            # A deleted case will not come back; retrying only delays the failure
+            print(f"❌ Matching job {job['id']} failed: {str(e)}")
+            job_queue.fail(job['id'], e, retry=False)
+        except Exception as e:
+            print(f"❌ Matching job {job['id']} failed: {str(e)}")
+            job_queue.fail(job['id'], e)
+        processed += 1
+        if max_jobs is not None and processed >= max_jobs:
+            break
+    return processed
+
+class WorkerPool:
+    """Pool of matching worker processes sharing one queue"""
+    def __init__(self, db_path, workers=None, model_path="data/match_model.pkl", poll_interval=0.5):
+        self.db_path = db_path
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.model_path = model_path
+        self.poll_interval = poll_interval
+        self._stop = multiprocessing.Event()
+        self._processes = []
+
+    def start(self):
+        MatchJobQueue(DatabaseManager(self.db_path)).requeue_stale()
+        for i in range(self.workers):
+            process = multiprocessing.Process(
+                target=run_worker, name=f"match-worker-{i}",
+                args=(self.db_path, self.model_path, self.poll_interval, self._stop), daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+        print(f"🔁 Started {self.workers} matching workers")
+        return self
+
+    def stop(self, timeout=10):
+        """Let workers finish their current job, then exit"""
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background matching job queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Run a pool of matching workers")
+    worker_parser.add_argument("--workers", type=int, default=None)
+    worker_parser.add_argument("--model", default="data/match_model.pkl")
+    worker_parser.add_argument("--poll-interval", type=float, default=0.5)
+    enqueue_parser = subparsers.add_parser("enqueue", help="Queue matching for one SOS case")
+    enqueue_parser.add_argument("case_id", type=int)
+    enqueue_parser.add_argument("--priority", type=int, default=None)
+    subparsers.add_parser("rematch", help="Queue every active SOS case")
+    subparsers.add_parser("status", help="Show queue counts")
+    for sub in subparsers.choices.values():
+        sub.add_argument("--db", default="data/organ_donation.db")
+    args = parser.parse_args()
+
+    job_queue = MatchJobQueue(DatabaseManager(args.db))
+    if args.command == "worker":
+        pool = WorkerPool(args.db, workers=args.workers, model_path=args.model, poll_interval=args.poll_interval)
+        with pool:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("ℹ️ Stopping workers...")
+    elif args.command == "enqueue":
+        handle = job_queue.enqueue(args.case_id, priority=args.priority)
+        print(f"✅ Queued job {handle.job_id} for SOS case {args.case_id}")
+    elif args.command == "rematch":
+        print(f"✅ Queued {job_queue.enqueue_active_cases()} active SOS cases")
+    else:
+        print(job_queue.stats())
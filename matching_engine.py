@@ -2,25 +2,131 @@
 import os
 import pickle
 from datetime import datetime, timezone
+import numpy as np
 from database import (
     DatabaseManager, Donor, Match, SOSCase, BloodGroup, OrganType,
-    get_blood_compatible_groups, ApprovalStatus
+    get_blood_compatible_groups, ApprovalStatus, haversine_distance
 )
 from sqlalchemy import and_, or_
+from metrics import REGISTRY, DEFAULT_COUNT_BUCKETS, StageTimer, start_http_server_from_env
+from travel_time import TravelTimeMatrix, DEFAULT_MATRIX_PATH, hospital_key, city_key, place_key
+from donor_store import DonorStore, DonorSelection, NO_DAY, today_day
+from hla_index import HLAIndex, install_hla_index
+from tree_model import load_compiled
+from donor_features import DonorFeatureStore, install_donor_features
+from workload import get_recorder
+from gazetteer import get_gazetteer, install_geocoding, normalize_state, NO_PLACE
+from match_queue import install_auto_enqueue
+
+MATCH_STAGE_SECONDS = REGISTRY.histogram(
+    'jeevsetu_match_stage_seconds', 'Duration of find_matches pipeline stages', ['stage']
+)
+MATCH_CANDIDATES = REGISTRY.histogram(
+    'jeevsetu_match_candidates', 'Donors returned by the candidate query per search',
+    buckets=DEFAULT_COUNT_BUCKETS
+)
+MATCH_FALLBACKS = REGISTRY.counter(
+    'jeevsetu_match_fallbacks_total', 'Donor rows scored through a fallback path', ['reason']
+)
+MATCH_DROPPED = REGISTRY.counter(
+    'jeevsetu_match_dropped_total', 'Candidates removed before scoring', ['reason']
+)
+MATCH_SEARCHES = REGISTRY.counter(
+    'jeevsetu_match_searches_total', 'find_matches calls by outcome', ['outcome']
+)
+
+# Larger HLA candidate sets are applied after the query instead of as an IN (...) list
+HLA_IN_LIST_LIMIT = 900
+
+# Final-score blend of rule-based compatibility, ML probability, urgency and donor reliability
+DEFAULT_SCORE_WEIGHTS = {'compatibility': 0.4, 'ml_probability': 0.3, 'urgency': 0.2, 'reliability': 0.1}
+
+# Column order of the ML feature matrix (must match MLMatchingModel.feature_names)
+FEATURE_NAMES = [
+    'blood_compatible',
+    'organ_match',
+    'age_compatible',
+    'distance_normalized',
+    'urgency_weight',
+    'reliability_score',
+    'freshness_score',
+    'compatibility_score'
+]
+
+FEATURE_LABELS = {
+    'blood_compatible': "Blood compatibility",
+    'organ_match': "Organ match",
+    'age_compatible': "Age compatibility",
+    'distance_normalized': "Distance",
+    'urgency_weight': "Urgency",
+    'reliability_score': "Donor reliability",
+    'freshness_score': "Listing freshness",
+    'compatibility_score': "Rule-based compatibility",
+    'compatibility': "Rule-based compatibility",
+    'ml_probability': "ML success probability",
+    'urgency': "Urgency",
+    'reliability': "Donor reliability"
+}
+
+def _as_utc(value):
+    """SQLite returns naive datetimes; treat them as UTC"""
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+class PatientNotFound(LookupError):
+    """Raised by find_matches(raise_errors=True) when the SOS case does not exist"""
 
 class MatchingEngine:
-    def __init__(self, db_manager=None, model_path="data/match_model.pkl"):
+    def __init__(self, db_manager=None, model_path="data/match_model.pkl", travel_matrix_path=DEFAULT_MATRIX_PATH, donor_store=None, hla_index=None, ml_model=None, donor_features=None, score_weights=None, recorder=None, gazetteer=None, auto_enqueue=False):
         self.db_manager = db_manager or DatabaseManager()
+        self.score_weights = dict(score_weights or DEFAULT_SCORE_WEIGHTS)
         self.model_path = model_path
-        self.ml_model = None
-        self.load_model()
+        self.ml_model = ml_model
+        if ml_model is None:
+            self.load_model()
+        self.travel_matrix = TravelTimeMatrix.load_if_exists(travel_matrix_path)
+        # Shared-memory donor columns (donor_store.py); set JEEVSETU_DONOR_STORE to attach by name (False disables)
+        if donor_store is None and os.environ.get('JEEVSETU_DONOR_STORE'):
+            donor_store = DonorStore.attach_if_exists(os.environ['JEEVSETU_DONOR_STORE'])
+        self.donor_store = donor_store
+        # Posting lists are loaded on the first search that asks for shared HLA antigens
+        self.hla_index = hla_index
+        install_hla_index()
+        # Precomputed donor-side features (donor_features.py); pass False to always build per row
+        self.donor_features = donor_features
+        install_donor_features()
+        # Opt-in workload capture (workload.py): JEEVSETU_RECORD_PATH, or pass a WorkloadRecorder (False disables)
+        self.recorder = get_recorder() if recorder is None else (recorder or None)
+        # Offline city/PIN gazetteer (gazetteer.py) for real distances; pass False for the city/state approximation
+        self.gazetteer = gazetteer
+        self._city_places = (None, None)
+        install_geocoding()
+        # Queue a background match (match_queue.py) for every SOS case this process inserts; off by
+        # default so load tests, simulators and replays leave no jobs behind
+        if auto_enqueue:
+            install_auto_enqueue()
+        start_http_server_from_env()
     
     def load_model(self):
-        """Load trained ML model if available"""
-        if os.path.exists(self.model_path):
+        """Load trained ML model if available (the compiled NumPy trees when exported)"""
+        try:
+            compiled = load_compiled(self.model_path)
+        except Exception as e:
+            print(f"⚠️ Could not load compiled ML model: {str(e)}")
+            compiled = None
+        if compiled is not None:
+            self.ml_model = compiled
+            print("✅ ML model loaded successfully (compiled trees)")
+        elif os.path.exists(self.model_path):
             try:
                 with open(self.model_path, 'rb') as f:
-                    self.ml_model = pickle.load(f)
+                    model = pickle.load(f)
+                if not (hasattr(model, 'predict_proba') or hasattr(model, 'predict')):
+                    raise TypeError(f"{type(model).__name__} is not a predictive model")
+                self.ml_model = model
                 print("✅ ML model loaded successfully")
             except Exception as e:
                 print(f"⚠️ Could not load ML model: {str(e)}")
@@ -28,7 +134,7 @@ class MatchingEngine:
         else:
             print("⚠️ ML model not found. Using rule-based matching only.")
     
-    def find_matches(self, sos_case_id=None, patient_data=None, max_results=20, search_radius_km=500):
+    def find_matches(self, sos_case_id=None, patient_data=None, max_results=20, search_radius_km=500, include_timings=False, explain_top_k=0, predict=None, raise_errors=False):
         """
         Find matching donors based on SOS case or patient data
         
@@ -37,195 +143,674 @@ class MatchingEngine:
             patient_data: Dict with patient info if not using SOS case
             max_results: Maximum number of matches to return
             search_radius_km: Maximum search radius
+            include_timings: Attach per-stage durations (ms) to each match
+            explain_top_k: Attach per-feature contributions to the first k matches
+            predict: Feature matrix -> probabilities; defaults to predict_batch
+                (the scoring server passes its micro-batcher)
+            raise_errors: Raise instead of returning [] on errors, and raise
+                PatientNotFound when the SOS case does not exist
         
         Returns:
             List of match objects with scores
         """
         session = self.db_manager.get_session()
+        # Returned matches carry ORM donors; keep them readable after persist commits
+        session.expire_on_commit = False
+        timer = StageTimer(MATCH_STAGE_SECONDS)
+        outcome = "ok"
+        patient = None
+        matches = []
         
         try:
-            # Get patient information
-            if sos_case_id:
-                sos_case = session.query(SOSCase).filter_by(id=sos_case_id).first()
-                if not sos_case:
+            with timer.stage("total"):
+                with timer.stage("patient_lookup"):
+                    patient = self.get_patient(session, sos_case_id, patient_data)
+                if patient is None:
+                    outcome = "no_patient"
+                    if raise_errors:
+                        raise PatientNotFound(f"SOS case {sos_case_id} not found")
                     return []
                 
-                patient_blood_group = sos_case.blood_group
-                organ_required = sos_case.organ_required
-                urgency_level = sos_case.urgency_level
-                patient_age = sos_case.patient_age
-                patient_city = sos_case.city
-                patient_state = sos_case.state
-            elif patient_data:
-                patient_blood_group = patient_data.get('blood_group')
-                organ_required = patient_data.get('organ_type')
-                urgency_level = patient_data.get('urgency_level', 3)
-                patient_age = patient_data.get('age')
-                patient_city = patient_data.get('city')
-                patient_state = patient_data.get('state')
-            else:
-                return []
-            
-            # Step 1: Rule-based filtering
-            compatible_blood_groups = get_blood_compatible_groups(patient_blood_group)
-            
-            # Query available donors
-            donors_query = session.query(Donor).filter(
-                and_(
-                    Donor.organ_type == organ_required,
-                    Donor.availability_status == True,
-                    Donor.approval_status == ApprovalStatus.APPROVED,
-                    Donor.blood_group.in_(compatible_blood_groups)
-                )
-            )
-            
-            donors = donors_query.all()
-            
-            if not donors:
-                return []
-            
-            # Step 2: Calculate features and scores for each donor
-            matches = []
-            for donor in donors:
-                # Blood compatibility
-                blood_compatible = donor.blood_group in compatible_blood_groups
-                
-                # Organ match (already filtered)
-                organ_match = donor.organ_type == organ_required
-                
-                # Age compatibility (within 20 years for most organs)
-                age_diff = abs(donor.age - patient_age)
-                age_compatible = age_diff <= 20
-                
-                # Location matching and distance
-                distance_km = None
-                location_score = 0.5
-                
-                # Simple city/state matching
-                if donor.city and patient_city:
-                    if donor.city.lower() == patient_city.lower():
-                        location_score = 1.0
-                        distance_km = 0
-                    elif donor.state and patient_state and donor.state.lower() == patient_state.lower():
-                        location_score = 0.7
-                        distance_km = 100  # Approximate
-                    else:
-                        location_score = 0.3
-                        distance_km = 300  # Approximate
-                
-                # Skip if too far
-                if distance_km and distance_km > search_radius_km:
-                    continue
-                
-                # Compatibility score (0-1)
-                compatibility_score = (
-                    (1.0 if blood_compatible else 0.0) * 0.4 +
-                    (1.0 if organ_match else 0.0) * 0.3 +
-                    (1.0 if age_compatible else 0.5) * 0.2 +
-                    location_score * 0.1
-                )
-                
-                # Urgency weight (1-5 scale)
-                urgency_weight = urgency_level / 5.0
-                
-                # Donor reliability score
-                reliability = donor.reliability_score or 0.5
-                
-                # Calculate listing freshness (days since registration)
-                days_since_registration = (datetime.now(timezone.utc) - donor.registration_date).days
-                freshness_score = max(0.5, 1.0 - (days_since_registration / 365))
-                
-                # Feature vector for ML model
-                features = {
-                    'blood_compatible': 1.0 if blood_compatible else 0.0,
-                    'organ_match': 1.0 if organ_match else 0.0,
-                    'age_compatible': 1.0 if age_compatible else 0.0,
-                    'distance_normalized': min(1.0, (distance_km or 100) / search_radius_km) if distance_km else 0.5,
-                    'urgency_weight': urgency_weight,
-                    'reliability_score': reliability,
-                    'freshness_score': freshness_score,
-                    'compatibility_score': compatibility_score
-                }
-                
-                # ML prediction (if model available)
-                match_probability = 0.5
-                if self.ml_model:
-                    try:
-                        feature_vector = [
-                            features['blood_compatible'],
-                            features['organ_match'],
-                            features['age_compatible'],
-                            features['distance_normalized'],
-                            features['urgency_weight'],
-                            features['reliability_score'],
-                            features['freshness_score'],
-                            features['compatibility_score']
-                        ]
-                        match_probability = self.ml_model.predict_proba([feature_vector])[0][1]
-                    except Exception as e:
-                        print(f"⚠️ ML prediction error: {str(e)}")
-                        match_probability = compatibility_score
-                
-                # Final score (hybrid: rule-based + ML)
-                final_score = (
-                    compatibility_score * 0.4 +
-                    match_probability * 0.3 +
-                    urgency_weight * 0.2 +
-                    reliability * 0.1
-                )
+                with timer.stage("donor_query"):
+                    donors = self.query_candidates(session, patient)
+                MATCH_CANDIDATES.observe(len(donors))
+                if not donors:
+                    outcome = "no_candidates"
+                    return []
                 
-                # Create match object
-                match_data = {
-                    'donor': donor,
-                    'donor_id': donor.id,
-                    'compatibility_score': round(compatibility_score, 3),
-                    'distance_km': distance_km,
-                    'match_probability': round(match_probability, 3),
-                    'urgency_weight': round(urgency_weight, 3),
-                    'final_score': round(final_score, 3),
-                    'blood_compatible': blood_compatible,
-                    'organ_match': organ_match,
-                    'age_compatible': age_compatible,
-                    'features': features
-                }
+                with timer.stage("feature_build"):
+                    candidates = self.build_candidates(donors, patient, search_radius_km)
+                with timer.stage("model_inference"):
+                    probabilities = (predict or self.predict_batch)([c['feature_vector'] for c in candidates])
+                with timer.stage("ranking"):
+                    matches = self.rank_candidates(candidates, probabilities, max_results)
+                    self.attach_donors(session, matches)
+                if explain_top_k:
+                    with timer.stage("explanation"):
+                        self.explain_matches(matches[:explain_top_k])
                 
-                matches.append(match_data)
-            
-            # Sort by final score (descending)
-            matches.sort(key=lambda x: x['final_score'], reverse=True)
+                # Save matches to database if SOS case exists
+                if sos_case_id:
+                    with timer.stage("persist"):
+                        self.save_matches(session, sos_case_id, matches)
             
-            # Limit results
-            matches = matches[:max_results]
-            
-            # Save matches to database if SOS case exists
-            if sos_case_id:
+            if include_timings:
+                timings = timer.as_ms()
                 for match_data in matches:
-                    match_record = Match(
-                        sos_case_id=sos_case_id,
-                        donor_id=match_data['donor_id'],
-                        compatibility_score=match_data['compatibility_score'],
-                        distance_km=match_data['distance_km'],
-                        match_probability=match_data['match_probability'],
-                        urgency_weight=match_data['urgency_weight'],
-                        final_score=match_data['final_score'],
-                        blood_compatible=match_data['blood_compatible'],
-                        organ_match=match_data['organ_match'],
-                        age_compatible=match_data['age_compatible'],
-                        status='pending'
-                    )
-                    session.add(match_record)
-                
-                session.commit()
+                    match_data['timings'] = timings
             
             return matches
             
         except Exception as e:
-            session.rollback()
+            if outcome != "no_patient":
+                outcome = "error"
+                session.rollback()
+            if raise_errors:
+                raise
             print(f"❌ Error in matching: {str(e)}")
             return []
         finally:
+            MATCH_SEARCHES.labels(outcome=outcome).inc()
+            if self.recorder is not None:
+                self.recorder.record_search(patient, max_results, search_radius_km, timer.durations, outcome, matches)
             session.close()
     
+    def get_patient(self, session, sos_case_id=None, patient_data=None):
+        """Resolve patient information from an SOS case or a patient dict"""
+        if sos_case_id:
+            sos_case = session.query(SOSCase).filter_by(id=sos_case_id).first()
+            if not sos_case:
+                return None
+            
+            return {
+                'blood_group': sos_case.blood_group,
+                'organ_type': sos_case.organ_required,
+                'urgency_level': sos_case.urgency_level,
+                'age': sos_case.patient_age,
+                'city': sos_case.city,
+                'state': sos_case.state,
+                'latitude': sos_case.latitude,
+                'longitude': sos_case.longitude,
+                'ischemia_elapsed_hours': 0.0
+            }
+        elif patient_data:
+            return {
+                'blood_group': patient_data.get('blood_group'),
+                'organ_type': patient_data.get('organ_type'),
+                'urgency_level': patient_data.get('urgency_level', 3),
+                'age': patient_data.get('age'),
+                'city': patient_data.get('city'),
+                'state': patient_data.get('state'),
+                'pincode': patient_data.get('pincode'),
+                'latitude': patient_data.get('latitude'),
+                'longitude': patient_data.get('longitude'),
+                'ischemia_elapsed_hours': patient_data.get('ischemia_elapsed_hours', 0.0),
+                'hla_type': patient_data.get('hla_type'),
+                'min_shared_antigens': patient_data.get('min_shared_antigens', 0)
+            }
+        return None
+    
+    def query_candidates(self, session, patient):
+        """Step 1: Rule-based filtering of available donors"""
+        compatible_blood_groups = get_blood_compatible_groups(patient['blood_group'])
+        
+        hla_ids = self.hla_candidate_ids(patient)
+        if hla_ids is not None and not len(hla_ids):
+            return []
+        
+        store = self.active_donor_store()
+        if store is not None:
+            selection = store.select(patient['organ_type'], compatible_blood_groups)
+            if hla_ids is not None:
+                selection = selection.filter(np.isin(selection.column('donor_id'), hla_ids, assume_unique=True))
+            return self.filter_feasible(selection, patient)
+        
+        filters = and_(
+            Donor.organ_type == patient['organ_type'],
+            Donor.availability_status == True,
+            Donor.approval_status == ApprovalStatus.APPROVED,
+            Donor.blood_group.in_(compatible_blood_groups)
+        )
+        hla_in_list = hla_ids is not None and len(hla_ids) <= HLA_IN_LIST_LIMIT
+        
+        features = self.active_feature_store()
+        if features is not None:
+            # Only ids come from SQL; donor-side features are joined from the store
+            ids_query = session.query(Donor.id).filter(filters)
+            if hla_in_list:
+                ids_query = ids_query.filter(Donor.id.in_(hla_ids.tolist()))
+            donor_ids = np.fromiter((donor_id for (donor_id,) in ids_query), dtype=np.int64)
+            if hla_ids is not None and not hla_in_list:
+                donor_ids = donor_ids[np.isin(donor_ids, hla_ids, assume_unique=True)]
+            selection, missing = features.select(donor_ids)
+            if not missing:
+                return self.filter_feasible(selection, patient)
+            MATCH_FALLBACKS.labels(reason="donor_features").inc(missing)
+        
+        donors_query = session.query(Donor).filter(filters)
+        if hla_in_list:
+            donors_query = donors_query.filter(Donor.id.in_(hla_ids.tolist()))
+            return self.filter_feasible(donors_query.all(), patient)
+        
+        donors = donors_query.all()
+        if hla_ids is not None:
+            allowed = set(hla_ids.tolist())
+            donors = [donor for donor in donors if donor.id in allowed]
+        return self.filter_feasible(donors, patient)
+    
+    def hla_candidate_ids(self, patient):
+        """
+        Donor ids sharing at least min_shared_antigens with the patient's HLA typing
+        
+        Returns:
+            Sorted id array, or None when the search is not HLA-restricted
+            (or the index is empty, e.g. never built for this database)
+        """
+        min_shared = patient.get('min_shared_antigens') or 0
+        if not patient.get('hla_type') or min_shared <= 0:
+            return None
+        try:
+            if self.hla_index is None:
+                self.hla_index = HLAIndex(self.db_manager)
+            donor_ids, _ = self.hla_index.donors_sharing(patient['hla_type'], min_shared)
+            if not self.hla_index.postings:
+                MATCH_FALLBACKS.labels(reason="hla_index").inc()
+                return None
+            return donor_ids
+        except Exception as e:
+            print(f"⚠️ HLA index unavailable, not filtering by antigens: {str(e)}")
+            MATCH_FALLBACKS.labels(reason="hla_index").inc()
+            return None
+    
+    def active_donor_store(self):
+        """The attached donor store at its latest version, or None to query SQLite"""
+        # Explicit checks: an attached store that is still empty is falsy via __len__
+        if self.donor_store is None or self.donor_store is False:
+            return None
+        try:
+            self.donor_store.refresh()
+            return self.donor_store
+        except Exception as e:
+            print(f"⚠️ Donor store unavailable, querying the database: {str(e)}")
+            MATCH_FALLBACKS.labels(reason="donor_store").inc()
+            return None
+    
+    def active_feature_store(self):
+        """Precomputed donor features, or None when the table has not been built"""
+        if self.donor_features is False:
+            return None
+        try:
+            if self.donor_features is None:
+                self.donor_features = DonorFeatureStore(self.db_manager)
+            self.donor_features.refresh()
+            return self.donor_features if len(self.donor_features) else None
+        except Exception as e:
+            print(f"⚠️ Donor features unavailable, building them per row: {str(e)}")
+            MATCH_FALLBACKS.labels(reason="donor_features").inc()
+            return None
+    
+    def active_gazetteer(self):
+        """The gazetteer, or None to approximate distances from city/state equality"""
+        if self.gazetteer is False:
+            return None
+        try:
+            if self.gazetteer is None:
+                self.gazetteer = get_gazetteer()
+            return self.gazetteer
+        except Exception as e:
+            print(f"⚠️ Gazetteer unavailable, approximating distances by city/state: {str(e)}")
+            MATCH_FALLBACKS.labels(reason="gazetteer").inc()
+            self.gazetteer = False
+            return None
+    
+    def patient_origin(self, patient, gazetteer):
+        """
+        Where distances are measured from
+        
+        Returns:
+            (place id, latitude, longitude, state code) - coordinates cached on the
+            SOS case win over the gazetteer's - or None when the patient cannot be placed
+        """
+        location = gazetteer.resolve(patient.get('city'), patient.get('state'), patient.get('pincode'))
+        latitude, longitude = patient.get('latitude'), patient.get('longitude')
+        if latitude is None or longitude is None:
+            if location is None:
+                return None
+            latitude, longitude = location.latitude, location.longitude
+        if location is not None:
+            return location.place_id, latitude, longitude, int(gazetteer.state_codes[location.place_id])
+        return NO_PLACE, latitude, longitude, gazetteer.state_index.get(normalize_state(patient.get('state')), -1)
+    
+    def city_places(self, city_index, gazetteer):
+        """Gazetteer place per donor-store city code (NO_PLACE when unresolved), cached per dictionary"""
+        cached_index, places = self._city_places
+        if cached_index is not city_index:
+            places = np.full(len(city_index), NO_PLACE, dtype=np.int64)
+            for name, code in city_index.items():
+                places[code] = gazetteer.place_id(name)
+            self._city_places = (city_index, places)
+        return places
+    
+    def travel_destination(self, patient):
+        """
+        Travel-matrix key for the patient's city
+        
+        The place the gazetteer resolves (aliases, misspellings, PIN codes)
+        comes first; the resolved and raw city names cover matrices built
+        without gazetteer places.
+        """
+        keys = []
+        gazetteer = self.active_gazetteer()
+        location = gazetteer.resolve(patient.get('city'), patient.get('state'), patient.get('pincode')) if gazetteer else None
+        if location is not None:
+            keys += [place_key(location.name, location.state), city_key(location.name)]
+        keys.append(city_key(patient['city']))
+        for key in keys:
+            if key in self.travel_matrix.destination_index:
+                return key
+        return keys[-1]
+    
+    def filter_feasible(self, donors, patient):
+        """Drop donors whose organ cannot reach the patient within its viability window"""
+        if self.travel_matrix is None or not patient.get('city'):
+            return donors
+        
+        destination = self.travel_destination(patient)
+        organ = patient['organ_type']
+        elapsed = patient.get('ischemia_elapsed_hours') or 0.0
+        if isinstance(donors, DonorSelection):
+            # One lookup per hospital instead of per donor
+            hospital_ids = donors.column('hospital_id')
+            unique_ids, inverse = np.unique(hospital_ids, return_inverse=True)
+            ok = np.array([
+                self.travel_matrix.is_feasible(hospital_key(int(hid)), destination, organ, elapsed)
+                for hid in unique_ids
+            ], dtype=bool)
+            feasible = donors.filter(ok[inverse]) if len(unique_ids) else donors
+        else:
+            feasible = [
+                donor for donor in donors
+                if self.travel_matrix.is_feasible(hospital_key(donor.hospital_id), destination, organ, elapsed)
+            ]
+        
+        dropped = len(donors) - len(feasible)
+        if dropped:
+            MATCH_DROPPED.labels(reason="ischemia_time").inc(dropped)
+        return feasible
+    
+    def build_candidates(self, donors, patient, search_radius_km=500):
+        """
+        Step 2: Calculate rule-based features for each donor
+        
+        Returns:
+            List of candidate dicts, each carrying the ML feature vector
+        """
+        if isinstance(donors, DonorSelection):
+            return self.build_candidates_from_store(donors, patient, search_radius_km)
+        
+        compatible_blood_groups = get_blood_compatible_groups(patient['blood_group'])
+        organ_required = patient['organ_type']
+        patient_age = patient['age']
+        patient_city = patient['city']
+        patient_state = patient['state']
+        
+        # Urgency weight (1-5 scale)
+        urgency_weight = patient['urgency_level'] / 5.0
+        now = datetime.now(timezone.utc)
+        missing_location = 0
+        unresolved_location = 0
+        
+        gazetteer = self.active_gazetteer() if patient_city else None
+        origin = self.patient_origin(patient, gazetteer) if gazetteer else None
+        place_distances = {}
+        
+        candidates = []
+        for donor in donors:
+            # Blood compatibility
+            blood_compatible = donor.blood_group in compatible_blood_groups
+            
+            # Organ match (already filtered)
+            organ_match = donor.organ_type == organ_required
+            
+            # Age compatibility (within 20 years for most organs)
+            age_diff = abs(donor.age - patient_age)
+            age_compatible = age_diff <= 20
+            
+            # Location matching and distance
+            distance_km = None
+            location_score = 0.5
+            
+            place = gazetteer.place_id(donor.city, donor.state) if origin and donor.city else NO_PLACE
+            if place != NO_PLACE:
+                # Great-circle distance between the resolved places
+                if place not in place_distances:
+                    place_distances[place] = haversine_distance(
+                        origin[1], origin[2], float(gazetteer.latitude[place]), float(gazetteer.longitude[place]))
+                distance_km = place_distances[place]
+                if place == origin[0] or (origin[0] == NO_PLACE and donor.city.lower() == patient_city.lower()):
+                    location_score = 1.0
+                elif gazetteer.state_codes[place] == origin[3]:
+                    location_score = 0.7
+                else:
+                    location_score = 0.3
+            # Simple city/state matching
+            elif donor.city and patient_city:
+                if origin:
+                    unresolved_location += 1
+                if donor.city.lower() == patient_city.lower():
+                    location_score = 1.0
+                    distance_km = 0
+                elif donor.state and patient_state and donor.state.lower() == patient_state.lower():
+                    location_score = 0.7
+                    distance_km = 100  # Approximate
+                else:
+                    location_score = 0.3
+                    distance_km = 300  # Approximate
+            else:
+                missing_location += 1
+            
+            # Skip if too far
+            if distance_km and distance_km > search_radius_km:
+                continue
+            
+            # Compatibility score (0-1)
+            compatibility_score = (
+                (1.0 if blood_compatible else 0.0) * 0.4 +
+                (1.0 if organ_match else 0.0) * 0.3 +
+                (1.0 if age_compatible else 0.5) * 0.2 +
+                location_score * 0.1
+            )
+            
+            # Donor reliability score
+            reliability = donor.reliability_score or 0.5
+            
+            # Calculate listing freshness (days since registration)
+            days_since_registration = (now - _as_utc(donor.registration_date)).days
+            freshness_score = max(0.5, 1.0 - (days_since_registration / 365))
+            
+            # Feature vector for ML model
+            features = {
+                'blood_compatible': 1.0 if blood_compatible else 0.0,
+                'organ_match': 1.0 if organ_match else 0.0,
+                'age_compatible': 1.0 if age_compatible else 0.0,
+                'distance_normalized': min(1.0, (distance_km or 100) / search_radius_km) if distance_km else 0.5,
+                'urgency_weight': urgency_weight,
+                'reliability_score': reliability,
+                'freshness_score': freshness_score,
+                'compatibility_score': compatibility_score
+            }
+            
+            candidates.append({
+                'donor': donor,
+                'donor_id': donor.id,
+                'compatibility_score': compatibility_score,
+                'distance_km': distance_km,
+                'urgency_weight': urgency_weight,
+                'reliability': reliability,
+                'blood_compatible': blood_compatible,
+                'organ_match': organ_match,
+                'age_compatible': age_compatible,
+                'features': features,
+                'feature_vector': [features[name] for name in FEATURE_NAMES]
+            })
+        
+        if missing_location:
+            MATCH_FALLBACKS.labels(reason="missing_location").inc(missing_location)
+        if unresolved_location:
+            MATCH_FALLBACKS.labels(reason="unresolved_location").inc(unresolved_location)
+        
+        return candidates
+    
+    def build_candidates_from_store(self, selection, patient, search_radius_km=500):
+        """
+        Vectorized build_candidates over donor store or donor feature columns
+        
+        Same features as the ORM path; blood group and organ are guaranteed by
+        the selection, and a precomputed freshness column is used as is. Candidates carry donor=None until attach_donors loads
+        the ranked ones.
+        """
+        if not len(selection):
+            return []
+        patient_city = patient['city']
+        patient_state = patient['state']
+        urgency_weight = patient['urgency_level'] / 5.0
+        
+        age_compatible = np.abs(selection.column('age').astype(np.int64) - patient['age']) <= 20
+        
+        # Same city / same state / elsewhere, as in the row-by-row path (gazetteer places when resolved)
+        city = selection.column('city')
+        has_location = (city >= 0) & bool(patient_city)
+        same_city = has_location & (city == selection.city_code(patient_city))
+        state = selection.column('state')
+        same_state = has_location & ~same_city & (state >= 0) & bool(patient_state) & (state == selection.state_code(patient_state))
+        distance = np.where(same_city, 0.0, np.where(same_state, 100.0, 300.0))
+        unresolved_location = 0
+        
+        gazetteer = self.active_gazetteer() if patient_city else None
+        origin = self.patient_origin(patient, gazetteer) if gazetteer else None
+        places = self.city_places(selection.city_index, gazetteer) if origin else None
+        if places is not None and len(places):
+            # Real distances wherever the donor's city resolves; one haversine per city code
+            city_code = np.maximum(city, 0)
+            donor_place = np.where(city >= 0, places[city_code], NO_PLACE)
+            resolved = has_location & (donor_place != NO_PLACE)
+            if origin[0] != NO_PLACE:
+                same_city = np.where(resolved, donor_place == origin[0], same_city)
+            place_state = gazetteer.state_codes[np.maximum(donor_place, 0)]
+            same_state = np.where(resolved, ~same_city & (place_state == origin[3]), same_state)
+            distance = np.where(resolved, gazetteer.distances_km(origin[1], origin[2], places)[city_code], distance)
+            unresolved_location = int(np.count_nonzero(has_location & ~resolved))
+        location_score = np.where(same_city, 1.0, np.where(same_state, 0.7, np.where(has_location, 0.3, 0.5)))
+        
+        in_radius = ~has_location | (distance <= search_radius_km)
+        missing_location = int(np.count_nonzero(~has_location))
+        
+        compatibility_score = 0.4 + 0.3 + np.where(age_compatible, 1.0, 0.5) * 0.2 + location_score * 0.1
+        reliability = np.round(selection.column('reliability').astype(np.float64), 6)
+        reliability = np.where(np.isnan(reliability) | (reliability == 0), 0.5, reliability)
+        if 'freshness' in selection.columns:
+            freshness_score = selection.column('freshness')
+        else:
+            registration_day = selection.column('registration_day').astype(np.int64)
+            days_since_registration = np.where(registration_day == NO_DAY, 0, today_day() - registration_day)
+            freshness_score = np.maximum(0.5, 1.0 - days_since_registration / 365)
+        distance_normalized = np.where(has_location & (distance > 0), np.minimum(1.0, distance / search_radius_km), 0.5)
+        
+        X = np.column_stack([
+            np.ones(len(selection)),
+            np.ones(len(selection)),
+            age_compatible.astype(np.float64),
+            distance_normalized,
+            np.full(len(selection), urgency_weight),
+            reliability,
+            freshness_score,
+            compatibility_score
+        ])[in_radius]
+        donor_ids = selection.column('donor_id')[in_radius].tolist()
+        age_flags = age_compatible[in_radius].tolist()
+        distances = np.where(has_location, distance, np.nan)[in_radius].tolist()
+        
+        candidates = []
+        for donor_id, row, age_ok, distance_km in zip(donor_ids, X.tolist(), age_flags, distances):
+            features = dict(zip(FEATURE_NAMES, row))
+            candidates.append({
+                'donor': None,
+                'donor_id': donor_id,
+                'compatibility_score': features['compatibility_score'],
+                'distance_km': None if distance_km != distance_km else distance_km,
+                'urgency_weight': urgency_weight,
+                'reliability': features['reliability_score'],
+                'blood_compatible': True,
+                'organ_match': True,
+                'age_compatible': age_ok,
+                'features': features,
+                'feature_vector': row
+            })
+        
+        if missing_location:
+            MATCH_FALLBACKS.labels(reason="missing_location").inc(missing_location)
+        if unresolved_location:
+            MATCH_FALLBACKS.labels(reason="unresolved_location").inc(unresolved_location)
+        
+        return candidates
+    
+    def attach_donors(self, session, matches):
+        """Load ORM donors for ranked matches that were built from the donor store"""
+        missing = [m['donor_id'] for m in matches if m.get('donor') is None]
+        if not missing:
+            return matches
+        donors = {donor.id: donor for donor in session.query(Donor).filter(Donor.id.in_(missing))}
+        for match_data in matches:
+            if match_data.get('donor') is None:
+                match_data['donor'] = donors.get(match_data['donor_id'])
+        return matches
+    
+    def predict_batch(self, feature_vectors):
+        """
+        Score a whole candidate matrix with a single model call
+        
+        Returns:
+            List of match probabilities, or None for every row when no model
+            is loaded or the prediction fails (callers fall back to rules)
+        """
+        if not feature_vectors:
+            return []
+        if self.ml_model is None:
+            return [None] * len(feature_vectors)
+        
+        try:
+            X = np.asarray(feature_vectors, dtype=np.float64)
+            if hasattr(self.ml_model, 'predict_proba'):
+                proba = self.ml_model.predict_proba(X)[:, 1]
+            else:
+                # Raw LightGBM Booster trained by MLMatchingModel
+                proba = self.ml_model.predict(X)
+            return [float(p) for p in proba]
+        except Exception as e:
+            print(f"⚠️ ML prediction error: {str(e)}")
+            MATCH_FALLBACKS.labels(reason="ml_error").inc(len(feature_vectors))
+            return [None] * len(feature_vectors)
+    
+    def contributions_batch(self, feature_vectors):
+        """
+        Per-feature contributions (log-odds) for a matrix in one model call
+        
+        Returns:
+            List of (contributions dict, base value) per row, or None when the
+            loaded model cannot attribute its predictions
+        """
+        if self.ml_model is None or not feature_vectors:
+            return None
+        
+        X = np.asarray(feature_vectors, dtype=np.float64)
+        try:
+            model = self.ml_model
+            if hasattr(model, 'load_source'):
+                # Compiled trees only score; SHAP values come from the original Booster
+                model = model.load_source()
+                if model is None:
+                    return None
+            booster = getattr(model, 'booster_', model)
+            if hasattr(booster, 'feature_importance'):
+                # LightGBM: last column is the expected value (bias)
+                contrib = np.asarray(booster.predict(X, pred_contrib=True))
+                values, base = contrib[:, :-1], contrib[:, -1]
+            elif hasattr(model, 'coef_'):
+                # Linear models: coefficient x feature value
+                coef = np.asarray(model.coef_).reshape(-1)
+                values = X * coef
+                base = np.full(len(X), float(np.asarray(model.intercept_).reshape(-1)[0]))
+            else:
+                return None
+        except Exception as e:
+            print(f"⚠️ ML explanation error: {str(e)}")
+            return None
+        
+        return [
+            ({name: float(v) for name, v in zip(FEATURE_NAMES, row)}, float(b))
+            for row, b in zip(values, base)
+        ]
+    
+    def explain_matches(self, matches):
+        """Attach model contributions and the final-score breakdown to ranked matches in place"""
+        if not matches:
+            return matches
+        
+        attributions = self.contributions_batch(
+            [[m['features'][name] for name in FEATURE_NAMES] for m in matches]
+        )
+        weights = self.score_weights
+        for i, match_data in enumerate(matches):
+            match_data['score_breakdown'] = {
+                'compatibility': round(match_data['compatibility_score'] * weights['compatibility'], 4),
+                'ml_probability': round(match_data['match_probability'] * weights['ml_probability'], 4),
+                'urgency': round(match_data['urgency_weight'] * weights['urgency'], 4),
+                'reliability': round(match_data['features']['reliability_score'] * weights['reliability'], 4)
+            }
+            if attributions is not None:
+                contributions, base_value = attributions[i]
+                match_data['contributions'] = contributions
+                match_data['contribution_base'] = base_value
+        return matches
+    
+    def rank_candidates(self, candidates, probabilities, max_results=20):
+        """Step 3: Blend rule-based and ML scores and keep the best matches"""
+        weights = self.score_weights
+        matches = []
+        for candidate, match_probability in zip(candidates, probabilities):
+            compatibility_score = candidate['compatibility_score']
+            if match_probability is None:
+                match_probability = 0.5 if self.ml_model is None else compatibility_score
+            
+            # Final score (hybrid: rule-based + ML)
+            final_score = (
+                compatibility_score * weights['compatibility'] +
+                match_probability * weights['ml_probability'] +
+                candidate['urgency_weight'] * weights['urgency'] +
+                candidate['reliability'] * weights['reliability']
+            )
+            
+            # Create match object
+            matches.append({
+                'donor': candidate['donor'],
+                'donor_id': candidate['donor_id'],
+                'compatibility_score': round(compatibility_score, 3),
+                'distance_km': candidate['distance_km'],
+                'match_probability': round(match_probability, 3),
+                'urgency_weight': round(candidate['urgency_weight'], 3),
+                'final_score': round(final_score, 3),
+                'blood_compatible': candidate['blood_compatible'],
+                'organ_match': candidate['organ_match'],
+                'age_compatible': candidate['age_compatible'],
+                'features': candidate['features']
+            })
+        
+        # Sort by final score (descending)
+        matches.sort(key=lambda x: x['final_score'], reverse=True)
+        
+        # Limit results
+        return matches[:max_results]
+    
+    def save_matches(self, session, sos_case_id, matches):
+        """Persist ranked matches for an SOS case"""
+        for match_data in matches:
+            match_record = Match(
+                sos_case_id=sos_case_id,
+                donor_id=match_data['donor_id'],
+                compatibility_score=match_data['compatibility_score'],
+                distance_km=match_data['distance_km'],
+                match_probability=match_data['match_probability'],
+                urgency_weight=match_data['urgency_weight'],
+                final_score=match_data['final_score'],
+                blood_compatible=match_data['blood_compatible'],
+                organ_match=match_data['organ_match'],
+                age_compatible=match_data['age_compatible'],
+                status='pending'
+            )
+            session.add(match_record)
+        
+        session.commit()
+    
     def get_match_explanation(self, match_data):
         """Generate human-readable explanation for a match"""
         explanations = []
@@ -246,9 +831,54 @@ class MatchingEngine:
         
         explanations.append(f"🎯 Match Score: {match_data['final_score']:.2f}/1.0")
         
+        contributions = match_data.get('contributions')
+        if contributions:
+            top = sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)[:3]
+            for name, value in top:
+                arrow = "📈" if value >= 0 else "📉"
+                explanations.append(f"{arrow} {FEATURE_LABELS.get(name, name)} {value:+.2f}")
+        
         return " | ".join(explanations)
+    
+    def compare_matches(self, match_a, match_b):
+        """
+        Explain why match_a outranks match_b
+        
+        Returns:
+            List of (component, difference) sorted by absolute impact, using
+            the final-score breakdown and, when available, model contributions
+        """
+        differences = []
+        for key, prefix in (('score_breakdown', "Score"), ('contributions', "Model")):
+            a, b = match_a.get(key), match_b.get(key)
+            if not (a and b):
+                continue
+            for name in a:
+                label = FEATURE_LABELS.get(name, name)
+                differences.append((f"{prefix} - {label}", round(a[name] - b.get(name, 0.0), 4)))
+        differences.sort(key=lambda item: abs(item[1]), reverse=True)
+        return differences
 
 if __name__ == "__main__":
-    # Test matching engine
-    engine = MatchingEngine()
-    print("✅ Matching engine initialized")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="JeevSetu matching engine")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Run the shared match-scoring server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--socket", dest="socket_path", help="Serve on a Unix socket instead of TCP")
+    serve_parser.add_argument("--max-batch-rows", type=int, default=4096)
+    serve_parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+    
+    if args.command == "serve":
+        from scoring_server import serve
+        serve(
+            host=args.host, port=args.port, socket_path=args.socket_path,
+            max_batch_rows=args.max_batch_rows, max_wait_ms=args.max_wait_ms
+        )
+    else:
+        # Test matching engine
+        engine = MatchingEngine()
+        print("✅ Matching engine initialized")
@@ -1,18 +1,115 @@
 """Machine Learning Model for Organ Donation Matching"""
 import os
+import json
+import time
+import shutil
 import pickle
+import random
+import tempfile
+import multiprocessing
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import precision_score, recall_score, roc_auc_score, average_precision_score
+from sklearn.metrics import precision_score, recall_score, roc_auc_score, average_precision_score, log_loss
+from sqlalchemy import func
 import lightgbm as lgb
-from database import DatabaseManager, Donor, Match, SOSCase, BloodGroup, OrganType, DonorType
+from database import DatabaseManager, Donor, Match, SOSCase, Donation, BloodGroup, OrganType, DonorType
+
+DEFAULT_PARAMS = {
+    'objective': 'binary',
+    'metric': 'auc',
+    'boosting_type': 'gbdt',
+    'num_leaves': 31,
+    'learning_rate': 0.05,
+    'feature_fraction': 0.9,
+    'bagging_fraction': 0.8,
+    'bagging_freq': 5,
+    'verbose': -1,
+    'max_depth': 6,
+    'min_child_samples': 20
+}
+
+# Hyperparameter search space for MLMatchingModel.tune
+SEARCH_SPACE = {
+    'num_leaves': [7, 15, 31, 63, 127],
+    'learning_rate': [0.01, 0.02, 0.05, 0.1, 0.2],
+    'min_child_samples': [5, 10, 20, 40, 80],
+    'max_depth': [-1, 3, 4, 6, 8],
+    'feature_fraction': [0.6, 0.7, 0.8, 0.9, 1.0],
+    'bagging_fraction': [0.6, 0.7, 0.8, 0.9, 1.0],
+    'lambda_l1': [0.0, 0.01, 0.1, 1.0],
+    'lambda_l2': [0.0, 0.1, 1.0, 10.0],
+    'min_gain_to_split': [0.0, 0.01, 0.1],
+}
+
+def sample_params(rng):
+    """Draw one random configuration from SEARCH_SPACE on top of DEFAULT_PARAMS"""
+    params = dict(DEFAULT_PARAMS)
+    for name, choices in SEARCH_SPACE.items():
+        params[name] = rng.choice(choices)
+    return params
+
+# Best finished-trial AUC shared by the tuning workers (NaN until one finishes)
+_best_auc = None
+
+def _init_tune_worker(best_auc):
+    global _best_auc
+    _best_auc = best_auc
+
+def _run_cv_trial(dataset_path, params, n_folds, num_boost_round, deadline, prune_after, prune_margin, seed):
+    """
+    One k-fold cross-validated trial (runs in a worker process)
+
+    The training Dataset is loaded from the shared binary file instead of being
+    rebuilt. The trial is pruned once it trails the best finished trial by more
+    than prune_margin after prune_after rounds, or when the wall-clock deadline
+    passes. The best AUC is read from shared memory every round, so trials
+    already running see improvements from trials that finish after them.
+    """
+    started = time.time()
+    state = {'pruned': False, 'timed_out': False}
+
+    def prune(env):
+        auc = env.evaluation_result_list[0][2]
+        if time.time() > deadline:
+            state['timed_out'] = True
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+        best_auc = _best_auc.value if _best_auc is not None else float('nan')
+        if not np.isnan(best_auc) and env.iteration + 1 >= prune_after and auc < best_auc - prune_margin:
+            state['pruned'] = True
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+    train_set = lgb.Dataset(dataset_path, params={'feature_pre_filter': False, 'verbose': -1})
+    results = lgb.cv(
+        params,
+        train_set,
+        num_boost_round=num_boost_round,
+        nfold=n_folds,
+        stratified=True,
+        seed=seed,
+        callbacks=[prune, lgb.early_stopping(stopping_rounds=20, verbose=False)]
+    )
+    aucs = results['valid auc-mean']
+    best_round = int(np.argmax(aucs))
+    return {
+        'params': params,
+        'auc': float(aucs[best_round]),
+        'auc_std': float(results['valid auc-stdv'][best_round]),
+        'best_iteration': best_round + 1,
+        'pruned': state['pruned'],
+        'timed_out': state['timed_out'],
+        'seconds': round(time.time() - started, 3)
+    }
 
 class MLMatchingModel:
     def __init__(self, model_path="data/match_model.pkl"):
         self.model_path = model_path
         self.model = None
+        self.params = dict(DEFAULT_PARAMS)
+        self.version = 0
+        self.last_outcome_at = None
         self.feature_names = [
             'blood_compatible',
             'organ_match',
@@ -88,13 +185,15 @@ class MLMatchingModel:
         
         return X, y
     
-    def train(self, X=None, y=None):
+    def train(self, X=None, y=None, params=None, num_boost_round=200):
         """
         Train LightGBM model for match prediction
         
         Args:
             X: Feature matrix (if None, generates synthetic data)
             y: Labels (if None, generates synthetic data)
+            params: LightGBM parameters (defaults to the last tuned or DEFAULT_PARAMS)
+            num_boost_round: Maximum boosting rounds
         """
         print("🎯 Training ML Matching Model...")
         
@@ -115,24 +214,13 @@ class MLMatchingModel:
         train_data = lgb.Dataset(X_train, label=y_train, feature_name=self.feature_names)
         test_data = lgb.Dataset(X_test, label=y_test, reference=train_data, feature_name=self.feature_names)
         
-        params = {
-            'objective': 'binary',
-            'metric': 'auc',
-            'boosting_type': 'gbdt',
-            'num_leaves': 31,
-            'learning_rate': 0.05,
-            'feature_fraction': 0.9,
-            'bagging_fraction': 0.8,
-            'bagging_freq': 5,
-            'verbose': -1,
-            'max_depth': 6,
-            'min_child_samples': 20
-        }
+        if params is not None:
+            self.params = dict(params)
         
         self.model = lgb.train(
-            params,
+            self.params,
             train_data,
-            num_boost_round=200,
+            num_boost_round=num_boost_round,
             valid_sets=[train_data, test_data],
             valid_names=['train', 'test'],
             callbacks=[lgb.log_evaluation(period=50), lgb.early_stopping(stopping_rounds=20)]
@@ -142,10 +230,235 @@ class MLMatchingModel:
         self.evaluate(X_test, y_test)
         
         # Save model
+        self.version += 1
         self.save_model()
         
         print("✅ Model training complete!")
     
+    def tune(self, X=None, y=None, n_trials=40, n_folds=5, time_budget_s=600, n_jobs=None,
+             num_boost_round=500, prune_after=30, prune_margin=0.01, seed=42):
+        """
+        Parallel cross-validated hyperparameter search, then retrain with the winner
+        
+        Args:
+            X, y: Training data (if None, generates synthetic data)
+            n_trials: Maximum number of sampled configurations
+            n_folds: Cross-validation folds per trial
+            time_budget_s: Wall-clock budget for the whole search
+            n_jobs: Worker processes (defaults to every core)
+            num_boost_round: Maximum boosting rounds per trial
+            prune_after: Rounds before a trailing trial may be pruned
+            prune_margin: AUC gap to the best trial that triggers pruning
+        
+        Returns:
+            List of trial results, best first
+        """
+        if X is None or y is None:
+            print("📊 Generating synthetic training data...")
+            X, y = self.generate_synthetic_training_data(n_samples=5000)
+        
+        n_jobs = n_jobs or os.cpu_count() or 1
+        threads_per_trial = max(1, (os.cpu_count() or 1) // n_jobs)
+        started = time.time()
+        deadline = started + time_budget_s
+        rng = random.Random(seed)
+        
+        # Build the Dataset once; every worker loads the same binary file
+        workdir = tempfile.mkdtemp(prefix="jeevsetu-tune-")
+        dataset_path = os.path.join(workdir, "train.bin")
+        lgb.Dataset(
+            X, label=y, feature_name=self.feature_names,
+            params={'feature_pre_filter': False, 'verbose': -1}
+        ).save_binary(dataset_path)
+        
+        print(f"🔎 Tuning: up to {n_trials} trials x {n_folds} folds on {n_jobs} workers, budget {time_budget_s}s")
+        
+        candidates = [dict(self.params)] + [sample_params(rng) for _ in range(n_trials - 1)]
+        trials = []
+        best_auc = None
+        shared_best_auc = multiprocessing.Value('d', float('nan'), lock=False)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_tune_worker, initargs=(shared_best_auc,)) as pool:
+                pending = set()
+                while candidates or pending:
+                    while candidates and len(pending) < n_jobs and time.time() < deadline:
+                        params = candidates.pop(0)
+                        params['num_threads'] = threads_per_trial
+                        pending.add(pool.submit(
+                            _run_cv_trial, dataset_path, params, n_folds, num_boost_round,
+                            deadline, prune_after, prune_margin, seed
+                        ))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, timeout=max(0.1, deadline - time.time() + 5), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"⚠️ Trial failed: {str(e)}")
+                            continue
+                        trials.append(result)
+                        if not result['pruned'] and (best_auc is None or result['auc'] > best_auc):
+                            best_auc = result['auc']
+                            shared_best_auc.value = best_auc
+                        status = "pruned" if result['pruned'] else f"auc={result['auc']:.4f}"
+                        print(f"  trial {len(trials):3d}: {status} ({result['seconds']:.1f}s)")
+                    if time.time() >= deadline:
+                        candidates = []
+        finally:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+        
+        completed = sorted((t for t in trials if not t['pruned']), key=lambda t: t['auc'], reverse=True)
+        if not completed:
+            print("⚠️ No trial finished within the budget; keeping current parameters")
+            return trials
+        
+        best = completed[0]
+        print(f"🏆 Best CV AUC {best['auc']:.4f} ± {best['auc_std']:.4f} after {best['best_iteration']} rounds "
+              f"({len(trials)} trials, {sum(t['pruned'] for t in trials)} pruned, {time.time() - started:.0f}s)")
+        
+        best_params = {k: v for k, v in best['params'].items() if k != 'num_threads'}
+        self.train(X, y, params=best_params, num_boost_round=max(best['best_iteration'], 20))
+        return completed + [t for t in trials if t['pruned']]
+    
+    def build_outcome_dataset(self, db_manager=None, since=None):
+        """
+        Build training rows from donation outcomes recorded after `since`
+        
+        Each Donation is joined to the latest Match scored for its donor on or
+        before the donation date (the pairing rollups.py counts as a
+        conversion); the match's stored features form the row and
+        Donation.success the label. Matches scored after the donation are
+        never used.
+        
+        Returns:
+            X, y and the newest Donation.created_at seen (the next high-water mark)
+        """
+        db_manager = db_manager or DatabaseManager()
+        session = db_manager.get_session()
+        try:
+            latest_match_id = session.query(Match.id).filter(
+                Match.donor_id == Donation.donor_id,
+                Match.created_at <= Donation.donation_date
+            ).order_by(
+                Match.created_at.desc(), Match.id.desc()
+            ).limit(1).correlate(Donation).scalar_subquery()
+            
+            query = session.query(Donation, Match, Donor).join(
+                Match, Match.id == latest_match_id
+            ).join(
+                Donor, Donor.id == Donation.donor_id
+            )
+            if since is not None:
+                query = query.filter(Donation.created_at > since)
+            rows = query.order_by(Donation.created_at).all()
+        finally:
+            session.close()
+        
+        X, y = [], []
+        high_water_mark = since
+        for donation, match, donor in rows:
+            scored_at = match.created_at or donation.donation_date
+            registered = donor.registration_date or scored_at
+            freshness_score = max(0.5, 1.0 - ((scored_at - registered).days / 365))
+            X.append([
+                1.0 if match.blood_compatible else 0.0,
+                1.0 if match.organ_match else 0.0,
+                1.0 if match.age_compatible else 0.0,
+                min(1.0, match.distance_km / 500) if match.distance_km else 0.5,
+                match.urgency_weight or 0.5,
+                donor.reliability_score or 0.5,
+                freshness_score,
+                match.compatibility_score
+            ])
+            y.append(1 if donation.success else 0)
+            if donation.created_at and (high_water_mark is None or donation.created_at > high_water_mark):
+                high_water_mark = donation.created_at
+        
+        return np.array(X, dtype=np.float64).reshape(-1, len(self.feature_names)), np.array(y, dtype=np.int64), high_water_mark
+    
+    def _holdout_score(self, model, X, y):
+        """AUC when both classes are present, otherwise negative log loss (higher is better)"""
+        proba = model.predict(X)
+        if len(np.unique(y)) > 1:
+            return roc_auc_score(y, proba)
+        return -log_loss(y, proba, labels=[0, 1])
+    
+    def update(self, X_new=None, y_new=None, db_manager=None, num_boost_round=50,
+               holdout_fraction=0.2, validation_fraction=0.2, min_samples=50, tolerance=0.0):
+        """
+        Continue boosting the saved model on outcomes recorded since the last version
+        
+        The new trees are trained with init_model=<current booster> on the new
+        outcomes only. The candidate is promoted only if it scores at least as
+        well as the current model (minus `tolerance`) on a holdout of those
+        outcomes. Early stopping watches a separate validation split of the
+        training part, so the holdout stays unseen until the comparison.
+        
+        Returns:
+            True if a new model version was promoted
+        """
+        if self.model is None and not self.load_model():
+            print("⚠️ No saved model to update; run a full training first")
+            return False
+        if not hasattr(self.model, 'feature_importance'):
+            print(f"⚠️ Saved model ({type(self.model).__name__}) is not a LightGBM booster; run a full training first")
+            return False
+        
+        high_water_mark = self.last_outcome_at
+        if X_new is None or y_new is None:
+            X_new, y_new, high_water_mark = self.build_outcome_dataset(db_manager, since=self.last_outcome_at)
+        
+        if len(y_new) < min_samples:
+            print(f"ℹ️ {len(y_new)} new outcomes (< {min_samples}); skipping update")
+            return False
+        
+        stratify = y_new if len(np.unique(y_new)) > 1 and min(np.bincount(y_new)) >= 2 else None
+        X_train, X_hold, y_train, y_hold = train_test_split(
+            X_new, y_new, test_size=holdout_fraction, random_state=42, stratify=stratify
+        )
+        
+        stratify = y_train if len(np.unique(y_train)) > 1 and min(np.bincount(y_train)) >= 2 else None
+        X_fit, X_valid, y_fit, y_valid = train_test_split(
+            X_train, y_train, test_size=validation_fraction, random_state=42, stratify=stratify
+        )
+        
+        print(f"🔁 Updating model v{self.version} with {len(X_fit)} new outcomes "
+              f"(validation {len(X_valid)}, holdout {len(X_hold)})")
+        params = {k: v for k, v in self.params.items() if k != 'num_threads'}
+        train_data = lgb.Dataset(X_fit, label=y_fit, feature_name=self.feature_names)
+        valid_data = lgb.Dataset(X_valid, label=y_valid, reference=train_data, feature_name=self.feature_names)
+        candidate = lgb.train(
+            params,
+            train_data,
+            num_boost_round=num_boost_round,
+            init_model=self.model,
+            valid_sets=[valid_data],
+            valid_names=['validation'],
+            callbacks=[lgb.early_stopping(stopping_rounds=10, verbose=False)]
+        )
+        
+        current_score = self._holdout_score(self.model, X_hold, y_hold)
+        candidate_score = self._holdout_score(candidate, X_hold, y_hold)
+        print(f"   holdout: current={current_score:.4f} candidate={candidate_score:.4f}")
+        
+        if candidate_score < current_score - tolerance:
+            print("⚠️ Candidate model is worse on the holdout; keeping the current version")
+            return False
+        
+        # Keep the previous version around for rollback
+        if os.path.exists(self.model_path):
+            shutil.copyfile(self.model_path, os.path.splitext(self.model_path)[0] + f".v{self.version}.pkl")
+        
+        self.model = candidate
+        self.version += 1
+        self.last_outcome_at = high_water_mark
+        self.save_model()
+        print(f"✅ Promoted model v{self.version}")
+        return True
+    
     def evaluate(self, X_test, y_test, k_values=[5, 10, 20]):
         """Evaluate model performance"""
         print("\n📊 Model Evaluation:")
@@ -184,18 +497,44 @@ class MLMatchingModel:
         
         print("=" * 50)
     
+    @property
+    def meta_path(self):
+        return os.path.splitext(self.model_path)[0] + ".meta.json"
+    
     def save_model(self):
-        """Save trained model to disk"""
+        """Save trained model (and the parameters it was trained with) to disk"""
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         with open(self.model_path, 'wb') as f:
             pickle.dump(self.model, f)
+        with open(self.meta_path, 'w') as f:
+            json.dump({
+                'params': self.params,
+                'version': self.version,
+                'last_outcome_at': self.last_outcome_at.isoformat() if self.last_outcome_at else None,
+                'trained_at': datetime.now(timezone.utc).isoformat()
+            }, f, indent=2)
         print(f"✅ Model saved to {self.model_path}")
+        
+        # NumPy export for serving without lightgbm (verified against Booster.predict)
+        try:
+            from tree_model import export
+            compiled_path, deviation = export(self.model_path)
+            print(f"✅ Compiled trees saved to {compiled_path} (max deviation {deviation:.1e})")
+        except Exception as e:
+            print(f"⚠️ Could not export compiled trees: {str(e)}")
     
     def load_model(self):
         """Load trained model from disk"""
         if os.path.exists(self.model_path):
             with open(self.model_path, 'rb') as f:
                 self.model = pickle.load(f)
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                self.params = meta.get('params', self.params)
+                self.version = meta.get('version', 0)
+                if meta.get('last_outcome_at'):
+                    self.last_outcome_at = datetime.fromisoformat(meta['last_outcome_at'])
             print(f"✅ Model loaded from {self.model_path}")
             return True
         else:
@@ -228,7 +567,28 @@ def train_and_save_model():
     return model
 
 if __name__ == "__main__":
-    # Train model with synthetic data
-    print("🚀 Starting ML Model Training...\n")
-    model = train_and_save_model()
-    print("\n✨ Training complete! Model ready for use.")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the matching model")
+    parser.add_argument("--tune", action="store_true", help="Run a parallel hyperparameter search first")
+    parser.add_argument("--trials", type=int, default=40)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=600, help="Tuning wall-clock budget in seconds")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--update", action="store_true", help="Continue boosting on donation outcomes since the last version")
+    parser.add_argument("--db", default="data/organ_donation.db", help="Registry database for --update")
+    args = parser.parse_args()
+    
+    if args.update:
+        model = MLMatchingModel()
+        model.update(db_manager=DatabaseManager(args.db))
+    elif args.tune:
+        print("🚀 Starting ML Model Tuning...\n")
+        model = MLMatchingModel()
+        model.tune(n_trials=args.trials, n_folds=args.folds, time_budget_s=args.budget, n_jobs=args.jobs)
+        print("\n✨ Tuning complete! Model ready for use.")
+    else:
+        # Train model with synthetic data
+        print("🚀 Starting ML Model Training...\n")
+        model = train_and_save_model()
+        print("\n✨ Training complete! Model ready for use.")
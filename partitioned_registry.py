@@ -0,0 +1,303 @@
+"""State-partitioned donor registry for Organ Donation Platform
+
+Donors are split by state into one SQLite file per partition (with the
+hospitals they reference), and each partition gets its own MatchingEngine,
+HLA index and, when published, its own shared-memory donor store. A search
+runs against the patient's home state first and only fans out - concurrently -
+to neighbouring states when the home partition cannot fill the top-k, so
+per-query work follows the size of the region, not the national registry,
+and a busy region does not lock the others' files.
+
+Partitions keep the registry's donor ids, so matches can still be saved
+against SOS cases in the main database.
+
+    python partitioned_registry.py split --db data/organ_donation.db --out data/partitions
+    python partitioned_registry.py publish --out data/partitions
+    python partitioned_registry.py search --out data/partitions --organ kidney --blood O+ --state Goa --city Panaji
+"""
+import os
+import re
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from database import DatabaseManager, Base, BloodGroup, OrganType
+from donor_store import DonorStore, DEFAULT_STORE_NAME, publish as publish_store
+from hla_index import rebuild as rebuild_hla_index
+from matching_engine import MatchingEngine
+from metrics import REGISTRY
+
+DEFAULT_PARTITION_DIR = "data/partitions"
+UNASSIGNED = "unassigned"
+
+PARTITION_SEARCHES = REGISTRY.counter(
+    'jeevsetu_partition_searches_total', 'Partitioned searches by how far they fanned out', ['scope']
+)
+PARTITION_QUERIES = REGISTRY.counter(
+    'jeevsetu_partition_queries_total', 'Per-partition find_matches calls', ['partition']
+)
+
+# Land borders between states and union territories (islands map to their usual transfer hubs)
+STATE_BORDERS = [
+    ("Andhra Pradesh", "Telangana"), ("Andhra Pradesh", "Karnataka"), ("Andhra Pradesh", "Tamil Nadu"),
+    ("Andhra Pradesh", "Odisha"), ("Andhra Pradesh", "Chhattisgarh"), ("Andhra Pradesh", "Puducherry"),
+    ("Arunachal Pradesh", "Assam"), ("Arunachal Pradesh", "Nagaland"),
+    ("Assam", "Nagaland"), ("Assam", "Manipur"), ("Assam", "Mizoram"), ("Assam", "Tripura"),
+    ("Assam", "Meghalaya"), ("Assam", "West Bengal"),
+    ("Bihar", "Uttar Pradesh"), ("Bihar", "Jharkhand"), ("Bihar", "West Bengal"),
+    ("Chhattisgarh", "Madhya Pradesh"), ("Chhattisgarh", "Uttar Pradesh"), ("Chhattisgarh", "Jharkhand"),
+    ("Chhattisgarh", "Odisha"), ("Chhattisgarh", "Telangana"), ("Chhattisgarh", "Maharashtra"),
+    ("Goa", "Maharashtra"), ("Goa", "Karnataka"),
+    ("Gujarat", "Rajasthan"), ("Gujarat", "Madhya Pradesh"), ("Gujarat", "Maharashtra"),
+    ("Gujarat", "Dadra and Nagar Haveli and Daman and Diu"),
+    ("Haryana", "Punjab"), ("Haryana", "Himachal Pradesh"), ("Haryana", "Uttarakhand"),
+    ("Haryana", "Uttar Pradesh"), ("Haryana", "Rajasthan"), ("Haryana", "Delhi"), ("Haryana", "Chandigarh"),
+    ("Himachal Pradesh", "Jammu and Kashmir"), ("Himachal Pradesh", "Ladakh"), ("Himachal Pradesh", "Punjab"),
+    ("Himachal Pradesh", "Uttarakhand"),
+    ("Jharkhand", "West Bengal"), ("Jharkhand", "Odisha"), ("Jharkhand", "Uttar Pradesh"),
+    ("Karnataka", "Maharashtra"), ("Karnataka", "Telangana"), ("Karnataka", "Tamil Nadu"), ("Karnataka", "Kerala"),
+    ("Kerala", "Tamil Nadu"), ("Kerala", "Puducherry"), ("Kerala", "Lakshadweep"),
+    ("Madhya Pradesh", "Rajasthan"), ("Madhya Pradesh", "Uttar Pradesh"), ("Madhya Pradesh", "Maharashtra"),
+    ("Maharashtra", "Telangana"), ("Maharashtra", "Dadra and Nagar Haveli and Daman and Diu"),
+    ("Manipur", "Nagaland"), ("Manipur", "Mizoram"), ("Mizoram", "Tripura"),
+    ("Odisha", "West Bengal"),
+    ("Punjab", "Jammu and Kashmir"), ("Punjab", "Rajasthan"), ("Punjab", "Chandigarh"),
+    ("Rajasthan", "Uttar Pradesh"),
+    ("Sikkim", "West Bengal"),
+    ("Tamil Nadu", "Puducherry"), ("Tamil Nadu", "Andaman and Nicobar Islands"),
+    ("West Bengal", "Andaman and Nicobar Islands"),
+    ("Uttar Pradesh", "Uttarakhand"), ("Uttar Pradesh", "Delhi"), ("Uttar Pradesh", "Himachal Pradesh"),
+    ("Jammu and Kashmir", "Ladakh"),
+]
+
+def _build_neighbors(borders):
+    neighbors = {}
+    for a, b in borders:
+        neighbors.setdefault(a, set()).add(b)
+        neighbors.setdefault(b, set()).add(a)
+    return {state: sorted(adjacent) for state, adjacent in neighbors.items()}
+
+STATE_NEIGHBORS = _build_neighbors(STATE_BORDERS)
+
+def partition_key(state):
+    """File-safe partition name of a state ("Tamil Nadu" -> "tamil_nadu")"""
+    if not state or not state.strip():
+        return UNASSIGNED
+    return re.sub(r'[^a-z0-9]+', '_', state.strip().lower()).strip('_') or UNASSIGNED
+
+NEIGHBOR_KEYS = {
+    partition_key(state): [partition_key(n) for n in adjacent]
+    for state, adjacent in STATE_NEIGHBORS.items()
+}
+
+def _column_list(table_name):
+    return ", ".join(column.name for column in Base.metadata.tables[table_name].columns)
+
+def split_registry(db_manager=None, out_dir=DEFAULT_PARTITION_DIR):
+    """
+    Write one SQLite file per donor state
+
+    Each file holds that state's donors plus the hospitals they belong to and
+    gets its HLA index built. Files are written aside and swapped in
+    atomically, so engines reading the old partition are not disturbed.
+
+    Returns:
+        Dict of partition key -> donor count
+    """
+    db_manager = db_manager or DatabaseManager()
+    source_path = os.path.abspath(db_manager.db_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with db_manager.engine.connect() as conn:
+        states = [row[0] for row in conn.execute(text("SELECT DISTINCT state FROM donors"))]
+    groups = {}
+    for state in states:
+        groups.setdefault(partition_key(state), []).append(state)
+
+    donor_columns = _column_list('donors')
+    hospital_columns = _column_list('hospitals')
+    counts = {}
+    for key, members in sorted(groups.items()):
+        path = os.path.abspath(os.path.join(out_dir, f"{key}.db"))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        partition = DatabaseManager(tmp_path)
+
+        named = [m for m in members if m is not None]
+        conditions = []
+        params = {f"s{i}": state for i, state in enumerate(named)}
+        if named:
+            conditions.append(f"state IN ({', '.join(':' + name for name in params)})")
+        if len(named) < len(members):
+            conditions.append("state IS NULL")
+        where = " OR ".join(conditions)
+
+        with partition.engine.connect() as conn:
+            conn.execute(text("ATTACH DATABASE :path AS registry"), {'path': source_path})
+            conn.execute(text(
+                f"INSERT INTO hospitals ({hospital_columns}) SELECT {hospital_columns} FROM registry.hospitals "
+                f"WHERE id IN (SELECT hospital_id FROM registry.donors WHERE {where})"
+            ), params)
+            conn.execute(text(
+                f"INSERT INTO donors ({donor_columns}) SELECT {donor_columns} FROM registry.donors WHERE {where}"
+            ), params)
+            counts[key] = conn.execute(text("SELECT COUNT(*) FROM donors")).scalar()
+            conn.commit()
+            conn.execute(text("DETACH DATABASE registry"))
+        rebuild_hla_index(partition)
+        partition.engine.dispose()
+        os.replace(tmp_path, path)
+    return counts
+
+class Partition:
+    """One state's registry file with its own engine, HLA index and donor store"""
+    def __init__(self, key, path, ml_model=None, store_prefix=None):
+        self.key = key
+        self.path = path
+        self.db_manager = DatabaseManager(path)
+        self.store_name = f"{store_prefix}_{key}" if store_prefix else None
+        donor_store = DonorStore.attach_if_exists(self.store_name) if self.store_name else None
+        self.engine = MatchingEngine(self.db_manager, donor_store=donor_store, ml_model=ml_model)
+
+    def find_matches(self, patient_data, max_results, search_radius_km):
+        PARTITION_QUERIES.labels(partition=self.key).inc()
+        return self.engine.find_matches(
+            patient_data=patient_data, max_results=max_results, search_radius_km=search_radius_km
+        )
+
+class PartitionedRegistry:
+    """
+    Route searches to the patient's home state, widening to neighbours only when needed
+
+    Args:
+        directory: Folder written by split_registry
+        db_manager: Main registry (SOS case lookup and saving matches)
+        store_prefix: Donor store name prefix used by `publish`, or None to query SQLite
+        max_hops: How many rings of neighbouring states a search may widen to
+    """
+    def __init__(self, directory=DEFAULT_PARTITION_DIR, db_manager=None, model_path="data/match_model.pkl",
+                 store_prefix=DEFAULT_STORE_NAME, max_hops=1, max_workers=8):
+        self.directory = directory
+        self.main = MatchingEngine(db_manager or DatabaseManager(), model_path=model_path)
+        self.store_prefix = store_prefix
+        self.max_hops = max_hops
+        self.partitions = {}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="partition")
+
+    def available(self):
+        """Partition keys that have a file on disk"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db"))
+
+    def partition(self, key):
+        """Open partitions lazily; states without donors have no file and return None"""
+        if key not in self.partitions:
+            path = os.path.join(self.directory, f"{key}.db")
+            if not os.path.exists(path):
+                return None
+            self.partitions[key] = Partition(key, path, self.main.ml_model, self.store_prefix)
+        return self.partitions[key]
+
+    def rings(self, state):
+        """Partition keys by distance from the home state: [[home], [neighbours], ...]"""
+        home = partition_key(state)
+        if home == UNASSIGNED:
+            return [self.available()]
+        rings, seen = [[home]], {home}
+        for _ in range(self.max_hops):
+            ring = sorted({n for key in rings[-1] for n in NEIGHBOR_KEYS.get(key, [])} - seen)
+            if not ring:
+                break
+            seen.update(ring)
+            rings.append(ring)
+        return rings
+
+    def find_matches(self, sos_case_id=None, patient_data=None, max_results=20, search_radius_km=500):
+        """
+        Same contract as MatchingEngine.find_matches, searched partition by partition
+
+        Returns:
+            Up to max_results matches, best final_score first
+        """
+        session = self.main.db_manager.get_session()
+        try:
+            patient = self.main.get_patient(session, sos_case_id, patient_data)
+        finally:
+            session.close()
+        if patient is None:
+            return []
+
+        matches, scope = [], "home"
+        for depth, ring in enumerate(self.rings(patient.get('state'))):
+            if depth:
+                scope = "neighbors"
+            partitions = [p for p in (self.partition(key) for key in ring) if p is not None]
+            if len(partitions) == 1:
+                matches.extend(partitions[0].find_matches(patient, max_results, search_radius_km))
+            elif partitions:
+                futures = [self.pool.submit(p.find_matches, patient, max_results, search_radius_km) for p in partitions]
+                for future in futures:
+                    matches.extend(future.result())
+            if len(matches) >= max_results:
+                break
+        PARTITION_SEARCHES.labels(scope=scope).inc()
+
+        matches.sort(key=lambda x: x['final_score'], reverse=True)
+        matches = matches[:max_results]
+        if sos_case_id and matches:
+            session = self.main.db_manager.get_session()
+            try:
+                self.main.save_matches(session, sos_case_id, matches)
+            except Exception as e:
+                session.rollback()
+                print(f"❌ Could not save partitioned matches: {str(e)}")
+            finally:
+                session.close()
+        return matches
+
+    def publish_stores(self):
+        """Publish one shared-memory donor store per partition; returns {key: version}"""
+        return {
+            key: publish_store(DatabaseManager(os.path.join(self.directory, f"{key}.db")), f"{self.store_prefix}_{key}")
+            for key in self.available()
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="State-partitioned donor registry")
+    parser.add_argument("command", choices=["split", "publish", "search"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--out", default=DEFAULT_PARTITION_DIR)
+    parser.add_argument("--store-prefix", default=DEFAULT_STORE_NAME)
+    parser.add_argument("--organ", default="kidney")
+    parser.add_argument("--blood", default="O+")
+    parser.add_argument("--age", type=int, default=40)
+    parser.add_argument("--city")
+    parser.add_argument("--state")
+    parser.add_argument("--max-results", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        started = time.perf_counter()
+        counts = split_registry(DatabaseManager(args.db), args.out)
+        print(f"✅ Split {sum(counts.values())} donors into {len(counts)} partitions "
+              f"in {time.perf_counter() - started:.1f}s -> {args.out}")
+        for key, count in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"   {key}: {count}")
+    else:
+        registry = PartitionedRegistry(args.out, DatabaseManager(args.db), store_prefix=args.store_prefix)
+        if args.command == "publish":
+            for key, version in registry.publish_stores().items():
+                print(f"✅ Published {args.store_prefix}_{key} v{version}")
+        else:
+            started = time.perf_counter()
+            matches = registry.find_matches(patient_data={
+                'organ_type': OrganType(args.organ), 'blood_group': BloodGroup(args.blood),
+                'age': args.age, 'city': args.city, 'state': args.state
+            }, max_results=args.max_results)
+            print(f"ℹ️ {len(matches)} matches in {(time.perf_counter() - started) * 1000:.1f} ms")
+        registry.close()
@@ -0,0 +1,247 @@
+"""Retention, compaction and archiving for the matches table
+
+find_matches appends up to max_results Match rows on every call. This module
+keeps the hot table small:
+
+1. compact: for active SOS cases keep only the latest scoring per
+   (sos_case_id, donor_id)
+2. archive: move matches of resolved cases, or older than the retention
+   window, into Parquet files partitioned by year/month
+3. maintain: reclaim free pages incrementally and refresh planner statistics
+
+Every step works in bounded batches with one short transaction each, so it can
+run next to live traffic.
+
+    python retention.py --db data/organ_donation.db --retention-days 90
+"""
+import os
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from database import DatabaseManager
+
+DEFAULT_ARCHIVE_DIR = "data/archive/matches"
+SQLITE_TS_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+MATCH_COLUMNS = [
+    'id', 'sos_case_id', 'donor_id', 'compatibility_score', 'distance_km', 'match_probability',
+    'urgency_weight', 'final_score', 'blood_compatible', 'organ_match', 'age_compatible',
+    'status', 'created_at'
+]
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Match archiving requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+def _parse_ts(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _archive_schema(pa):
+    """Parquet schema of archived match rows"""
+    return pa.schema([
+        ('id', pa.int64()),
+        ('sos_case_id', pa.int64()),
+        ('donor_id', pa.int64()),
+        ('compatibility_score', pa.float64()),
+        ('distance_km', pa.float64()),
+        ('match_probability', pa.float64()),
+        ('urgency_weight', pa.float64()),
+        ('final_score', pa.float64()),
+        ('blood_compatible', pa.bool_()),
+        ('organ_match', pa.bool_()),
+        ('age_compatible', pa.bool_()),
+        ('status', pa.string()),
+        ('created_at', pa.timestamp('us')),
+        ('case_status', pa.string()),
+    ])
+
+class MatchRetention:
+    def __init__(self, db_manager=None, archive_dir=DEFAULT_ARCHIVE_DIR, retention_days=90, batch_size=5000):
+        self.db_manager = db_manager or DatabaseManager()
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        """Indexes the batch queries rely on (no-ops on databases created by this schema)"""
+        with self.db_manager.engine.begin() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_matches_case_donor ON matches (sos_case_id, donor_id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_matches_created_at ON matches (created_at)"))
+
+    def compact(self, max_batches=None):
+        """
+        Delete superseded scorings for active SOS cases
+
+        Returns:
+            Number of rows deleted
+        """
+        select_superseded = text("""
+            SELECT m.id FROM matches m
+            JOIN sos_cases s ON s.id = m.sos_case_id
+            WHERE s.status = 'active'
+              AND m.id < (
+                  SELECT MAX(m2.id) FROM matches m2
+                  WHERE m2.sos_case_id = m.sos_case_id AND m2.donor_id = m.donor_id
+              )
+            LIMIT :limit
+        """)
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with self.db_manager.engine.begin() as conn:
+                ids = [row[0] for row in conn.execute(select_superseded, {'limit': self.batch_size})]
+                if not ids:
+                    break
+                self._delete_ids(conn, ids)
+            deleted += len(ids)
+            batches += 1
+        return deleted
+
+    def _delete_ids(self, conn, ids):
+        placeholders = ",".join(str(int(i)) for i in ids)
+        conn.execute(text(f"DELETE FROM matches WHERE id IN ({placeholders})"))
+
+    def archive(self, now=None, max_batches=None):
+        """
+        Move matches of resolved cases or older than the retention window to Parquet
+
+        Each batch is written to its year/month partitions before the rows are
+        deleted, so a crash can at worst duplicate a batch in the archive,
+        never lose it.
+
+        Returns:
+            Number of rows archived
+        """
+        pa, pq = _require_pyarrow()
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=self.retention_days)).strftime(SQLITE_TS_FORMAT)
+        select_archivable = text(f"""
+            SELECT {", ".join("m." + c for c in MATCH_COLUMNS)}, s.status AS case_status
+            FROM matches m
+            LEFT JOIN sos_cases s ON s.id = m.sos_case_id
+            WHERE (s.id IS NOT NULL AND s.status != 'active') OR m.created_at < :cutoff
+            ORDER BY m.id
+            LIMIT :limit
+        """)
+
+        archived = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with self.db_manager.engine.begin() as conn:
+                rows = conn.execute(select_archivable, {'cutoff': cutoff, 'limit': self.batch_size}).fetchall()
+                if not rows:
+                    break
+                self._write_partitions(pa, pq, rows)
+                self._delete_ids(conn, [row[0] for row in rows])
+            archived += len(rows)
+            batches += 1
+        return archived
+
+    def _write_partitions(self, pa, pq, rows):
+        columns = MATCH_COLUMNS + ['case_status']
+        partitions = {}
+        for row in rows:
+            record = dict(zip(columns, row))
+            record['created_at'] = _parse_ts(record['created_at'])
+            for flag in ('blood_compatible', 'organ_match', 'age_compatible'):
+                if record[flag] is not None:
+                    record[flag] = bool(record[flag])
+            created = record['created_at'] or datetime.now(timezone.utc)
+            partitions.setdefault((created.year, created.month), []).append(record)
+
+        stamp = f"{int(time.time() * 1000)}-{rows[0][0]}"
+        for (year, month), records in partitions.items():
+            directory = os.path.join(self.archive_dir, f"year={year}", f"month={month:02d}")
+            os.makedirs(directory, exist_ok=True)
+            table = pa.Table.from_pylist(records, schema=_archive_schema(pa))
+            path = os.path.join(directory, f"part-{stamp}.parquet")
+            pq.write_table(table, path + ".tmp", compression='zstd')
+            os.replace(path + ".tmp", path)
+
+    def maintain(self, vacuum_pages=2000):
+        """
+        Incremental VACUUM and ANALYZE
+
+        Incremental vacuum only works once the database has been switched to
+        auto_vacuum=INCREMENTAL (see enable_incremental_vacuum); until then
+        only statistics are refreshed.
+        """
+        raw = self.db_manager.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            mode = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+            freed = 0
+            if mode == 2:
+                before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                # executescript steps the pragma to completion; execute() would free a single page
+                raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+                freed = before - cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            cursor.execute("ANALYZE matches")
+            raw.commit()
+        finally:
+            raw.close()
+        return {'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(mode, mode), 'pages_freed': freed}
+
+    def enable_incremental_vacuum(self):
+        """One-off: switch to auto_vacuum=INCREMENTAL (requires a full VACUUM)"""
+        with self.db_manager.engine.connect() as conn:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        print("✅ Incremental auto-vacuum enabled")
+
+    def run(self, max_batches=None, vacuum_pages=2000):
+        """Compact, archive and maintain; returns a summary report"""
+        started = time.perf_counter()
+        report = {
+            'compacted': self.compact(max_batches=max_batches),
+            'archived': self.archive(max_batches=max_batches),
+        }
+        report.update(self.maintain(vacuum_pages=vacuum_pages))
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
+
+def read_archive(archive_dir=DEFAULT_ARCHIVE_DIR, filter=None, columns=None):
+    """
+    Query archived matches offline
+
+    Args:
+        filter: Optional pyarrow.dataset expression, e.g.
+            (ds.field('year') == 2025) & (ds.field('donor_id') == 42)
+        columns: Optional list of columns to read
+
+    Returns:
+        pyarrow.Table (call .to_pandas() for a DataFrame)
+    """
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=filter, columns=columns)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact and archive the matches table")
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR)
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop each step after this many batches")
+    parser.add_argument("--vacuum-pages", type=int, default=2000)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    retention = MatchRetention(
+        DatabaseManager(args.db), archive_dir=args.archive_dir,
+        retention_days=args.retention_days, batch_size=args.batch_size
+    )
+    if args.enable_incremental_vacuum:
+        retention.enable_incremental_vacuum()
+    report = retention.run(max_batches=args.max_batches, vacuum_pages=args.vacuum_pages)
+    print(f"✅ Retention: compacted {report['compacted']}, archived {report['archived']}, "
+          f"freed {report['pages_freed']} pages ({report['auto_vacuum']} vacuum) in {report['seconds']:.1f}s")
@@ -0,0 +1,200 @@
+"""Incremental reporting rollups for Organ Donation Platform
+
+Success rate (donations) and match-to-donation conversion are kept as small
+aggregate tables keyed by month, organ and donor state (rollup_outcomes,
+rollup_conversions). Each update folds in only the donations and matches
+created since the stored high-water mark, so report queries read a few
+hundred rollup rows no matter how much history the registry holds - and the
+counts survive match retention archiving old rows.
+
+A donation converts the latest match scored for its donor on or before the
+donation date (newest id on ties) - the same pairing
+MLMatchingModel.build_outcome_dataset trains on. Rows younger than
+ROLLUP_LAG_S are left for the next run so late-committing writers are not
+skipped.
+
+    python rollups.py update --db data/organ_donation.db    # cron, e.g. every 5 minutes
+    python rollups.py rebuild --db data/organ_donation.db
+    python rollups.py report --db data/organ_donation.db --by organ
+"""
+import time
+import argparse
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import text
+from database import DatabaseManager, OrganType
+
+ROLLUP_LAG_S = 60
+# SQLAlchemy's SQLite DateTime storage format; marks compare as strings
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+DIMENSIONS = {'organ': 'organ_type', 'state': 'state', 'month': 'month'}
+
+STATE_KEY = "COALESCE(NULLIF(trim(dn.state), ''), 'Unknown')"
+
+OUTCOMES_SQL = f"""
+    INSERT INTO rollup_outcomes (month, organ_type, state, donations, successes)
+    SELECT strftime('%Y-%m', d.donation_date), d.organ_type, {STATE_KEY},
+           COUNT(*), SUM(CASE WHEN d.success THEN 1 ELSE 0 END)
+    FROM donations d LEFT JOIN donors dn ON dn.id = d.donor_id
+    WHERE d.created_at > :since AND d.created_at <= :until
+    GROUP BY 1, 2, 3
+    ON CONFLICT (month, organ_type, state) DO UPDATE SET
+        donations = donations + excluded.donations, successes = successes + excluded.successes
+"""
+
+MATCHES_SQL = f"""
+    INSERT INTO rollup_conversions (month, organ_type, state, matches, conversions)
+    SELECT strftime('%Y-%m', m.created_at), dn.organ_type, {STATE_KEY}, COUNT(*), 0
+    FROM matches m JOIN donors dn ON dn.id = m.donor_id
+    WHERE m.created_at > :since AND m.created_at <= :until
+    GROUP BY 1, 2, 3
+    ON CONFLICT (month, organ_type, state) DO UPDATE SET matches = matches + excluded.matches
+"""
+
+# Credited to the converted match's bucket, which MATCHES_SQL has already counted
+CONVERSIONS_SQL = f"""
+    INSERT INTO rollup_conversions (month, organ_type, state, matches, conversions)
+    SELECT strftime('%Y-%m', m.created_at), dn.organ_type, {STATE_KEY}, 0, COUNT(*)
+    FROM donations d
+    JOIN matches m ON m.id = (
+        SELECT latest.id FROM matches latest
+        WHERE latest.donor_id = d.donor_id AND latest.created_at <= d.donation_date
+        ORDER BY latest.created_at DESC, latest.id DESC LIMIT 1
+    )
+    JOIN donors dn ON dn.id = m.donor_id
+    WHERE d.created_at > :since AND d.created_at <= :until
+    GROUP BY 1, 2, 3
+    ON CONFLICT (month, organ_type, state) DO UPDATE SET conversions = conversions + excluded.conversions
+"""
+
+def _claim(conn):
+    """Lock the rollup state row and return the current high-water mark"""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS rollup_state (id INTEGER PRIMARY KEY CHECK (id = 1), "
+        "high_water_mark TEXT NOT NULL, updated_at TEXT)"
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO rollup_state (id, high_water_mark) VALUES (1, '')"))
+    # Writing before reading takes SQLite's write lock, so concurrent updaters
+    # serialize instead of both folding in the same window
+    conn.execute(text("UPDATE rollup_state SET updated_at = :now WHERE id = 1"),
+                 {'now': datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)})
+    return conn.execute(text("SELECT high_water_mark FROM rollup_state WHERE id = 1")).scalar()
+
+def _apply(conn, since, until):
+    window = {'since': since, 'until': until}
+    counts = {
+        'donations': conn.execute(text(
+            "SELECT COUNT(*) FROM donations WHERE created_at > :since AND created_at <= :until"), window).scalar(),
+        'matches': conn.execute(text(
+            "SELECT COUNT(*) FROM matches WHERE created_at > :since AND created_at <= :until"), window).scalar(),
+    }
+    if counts['matches']:
+        conn.execute(text(MATCHES_SQL), window)
+    if counts['donations']:
+        conn.execute(text(OUTCOMES_SQL), window)
+        conn.execute(text(CONVERSIONS_SQL), window)
+    conn.execute(text("UPDATE rollup_state SET high_water_mark = :until WHERE id = 1"), window)
+    return counts
+
+def update(db_manager=None, lag_s=ROLLUP_LAG_S):
+    """
+    Fold donations and matches created since the last run into the rollups
+
+    Returns:
+        Report dict (since, until, donations, matches)
+    """
+    db_manager = db_manager or DatabaseManager()
+    until = (datetime.now(timezone.utc) - timedelta(seconds=lag_s)).strftime(TIMESTAMP_FORMAT)
+    with db_manager.engine.begin() as conn:
+        since = _claim(conn)
+        if until <= since:
+            return {'since': since, 'until': since, 'donations': 0, 'matches': 0}
+        counts = _apply(conn, since, until)
+    return {'since': since, 'until': until, **counts}
+
+def rebuild(db_manager=None, lag_s=ROLLUP_LAG_S):
+    """Recompute the rollups from the rows currently in the registry"""
+    db_manager = db_manager or DatabaseManager()
+    until = (datetime.now(timezone.utc) - timedelta(seconds=lag_s)).strftime(TIMESTAMP_FORMAT)
+    with db_manager.engine.begin() as conn:
+        _claim(conn)
+        conn.execute(text("DELETE FROM rollup_outcomes"))
+        conn.execute(text("DELETE FROM rollup_conversions"))
+        counts = _apply(conn, '', until)
+    return {'since': '', 'until': until, **counts}
+
+def high_water_mark(db_manager):
+    """Newest created_at folded into the rollups (UTC), or None before the first run"""
+    with db_manager.engine.connect() as conn:
+        try:
+            mark = conn.execute(text("SELECT high_water_mark FROM rollup_state WHERE id = 1")).scalar()
+        except Exception:
+            return None
+    return datetime.strptime(mark, TIMESTAMP_FORMAT) if mark else None
+
+def _label(by, key):
+    if by == 'organ':
+        try:
+            return OrganType[key].value
+        except KeyError:
+            return key
+    return key
+
+def _grouped(db_manager, table, columns, by, since_month):
+    column = DIMENSIONS[by]
+    where = "WHERE month >= :since_month" if since_month else ""
+    with db_manager.engine.connect() as conn:
+        return conn.execute(text(
+            f"SELECT {column}, {', '.join(f'SUM({c})' for c in columns)} FROM {table} {where} "
+            f"GROUP BY {column} ORDER BY {column}"
+        ), {'since_month': since_month}).fetchall()
+
+def success_rates(db_manager, by='organ', since_month=None):
+    """
+    Donation success rate grouped by organ, state or month (reads only rollup_outcomes)
+
+    Args:
+        by: 'organ', 'state' or 'month'
+        since_month: Optional 'YYYY-MM' lower bound on the donation month
+
+    Returns:
+        List of dicts (key, donations, successes, success_rate)
+    """
+    rows = _grouped(db_manager, 'rollup_outcomes', ('donations', 'successes'), by, since_month)
+    return [{
+        'key': _label(by, key), 'donations': donations, 'successes': successes,
+        'success_rate': successes / donations if donations else None
+    } for key, donations, successes in rows]
+
+def conversion_rates(db_manager, by='organ', since_month=None):
+    """Match-to-donation conversion grouped by organ, state or month (reads only rollup_conversions)"""
+    rows = _grouped(db_manager, 'rollup_conversions', ('matches', 'conversions'), by, since_month)
+    return [{
+        'key': _label(by, key), 'matches': matches, 'conversions': conversions,
+        'conversion_rate': conversions / matches if matches else None
+    } for key, matches, conversions in rows]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental success and conversion rollups")
+    parser.add_argument("command", choices=["update", "rebuild", "report"])
+    parser.add_argument("--db", default="data/organ_donation.db")
+    parser.add_argument("--by", choices=list(DIMENSIONS), default="organ")
+    parser.add_argument("--since-month", help="YYYY-MM")
+    parser.add_argument("--lag", type=float, default=ROLLUP_LAG_S, help="Seconds to leave for late commits")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    started = time.perf_counter()
+    if args.command == "report":
+        print(f"{args.by:<16} {'donations':>10} {'success':>8} {'matches':>10} {'converted':>10}")
+        outcomes = {row['key']: row for row in success_rates(db_manager, args.by, args.since_month)}
+        conversions = {row['key']: row for row in conversion_rates(db_manager, args.by, args.since_month)}
+        for key in sorted(set(outcomes) | set(conversions)):
+            outcome, conversion = outcomes.get(key, {}), conversions.get(key, {})
+            success = f"{outcome['success_rate']:.1%}" if outcome.get('success_rate') is not None else "-"
+            converted = f"{conversion['conversion_rate']:.2%}" if conversion.get('conversion_rate') is not None else "-"
+            print(f"{key:<16} {outcome.get('donations', 0):>10} {success:>8} {conversion.get('matches', 0):>10} {converted:>10}")
+        print(f"ℹ️ Rollups current to {high_water_mark(db_manager)} UTC ({(time.perf_counter() - started) * 1000:.1f} ms)")
+    else:
+        report = (update if args.command == "update" else rebuild)(db_manager, args.lag)
+        print(f"✅ Rollups {'updated' if args.command == 'update' else 'rebuilt'} in {time.perf_counter() - started:.1f}s: "
+              f"{report['donations']} donations and {report['matches']} matches up to {report['until'] or 'now'}")
@@ -0,0 +1,351 @@
+"""Local match-scoring service for Organ Donation Platform
+
+One warm MatchingEngine is shared by every client. Concurrent requests build
+their rule-based features in their own handler thread, then hand the feature
+matrix to a MicroBatcher which coalesces everything queued within a few
+milliseconds into a single vectorized model call.
+"""
+import os
+import json
+import queue
+import socket
+import threading
+import time
+import http.client
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from database import BloodGroup, OrganType
+from metrics import REGISTRY, DEFAULT_COUNT_BUCKETS, CONTENT_TYPE
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+BATCH_REQUESTS = REGISTRY.histogram(
+    'jeevsetu_scoring_batch_requests', 'Requests coalesced into one model call',
+    buckets=DEFAULT_COUNT_BUCKETS
+)
+BATCH_ROWS = REGISTRY.histogram(
+    'jeevsetu_scoring_batch_rows', 'Feature rows scored by one model call',
+    buckets=DEFAULT_COUNT_BUCKETS
+)
+QUEUE_DEPTH = REGISTRY.gauge('jeevsetu_scoring_queue_depth', 'Requests waiting for the micro-batcher')
+
+class _PendingBatch:
+    def __init__(self, feature_vectors):
+        self.feature_vectors = feature_vectors
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+class MicroBatcher:
+    """Coalesces concurrent scoring requests into micro-batches"""
+    def __init__(self, predict_fn, max_batch_rows=4096, max_wait_ms=5):
+        self.predict_fn = predict_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests_per_batch = BATCH_REQUESTS
+        self.rows_per_batch = BATCH_ROWS
+        self.max_queue_depth = 0
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, feature_vectors):
+        """Queue a feature matrix; returns a Future resolving to its probabilities"""
+        pending = _PendingBatch(feature_vectors)
+        if not feature_vectors:
+            pending.future.set_result([])
+            return pending.future
+        self._queue.put(pending)
+        depth = self._queue.qsize()
+        QUEUE_DEPTH.set(depth)
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        return pending.future
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=1)
+
+    def _collect(self):
+        """Block for the first request, then drain until the batch is full or the wait expires"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        rows = len(first.feature_vectors)
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item.feature_vectors)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            matrix = []
+            for item in batch:
+                matrix.extend(item.feature_vectors)
+
+            QUEUE_DEPTH.set(self._queue.qsize())
+            self.batches += 1
+            self.requests_per_batch.observe(len(batch))
+            self.rows_per_batch.observe(len(matrix))
+
+            try:
+                probabilities = self.predict_fn(matrix)
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            offset = 0
+            for item in batch:
+                n = len(item.feature_vectors)
+                item.future.set_result(probabilities[offset:offset + n])
+                offset += n
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'batches': self.batches,
+            'requests_per_batch': self.requests_per_batch.snapshot(),
+            'rows_per_batch': self.rows_per_batch.snapshot()
+        }
+
+def _coerce_patient(patient_data):
+    """Convert JSON strings (e.g. "O+", "kidney") into the enums the engine expects"""
+    patient = dict(patient_data)
+    if isinstance(patient.get('blood_group'), str):
+        patient['blood_group'] = BloodGroup(patient['blood_group'])
+    if isinstance(patient.get('organ_type'), str):
+        patient['organ_type'] = OrganType(patient['organ_type'].lower())
+    return patient
+
+def serialize_match(match_data):
+    """JSON-safe view of a match dict (drops the ORM donor object)"""
+    donor = match_data.get('donor')
+    result = {k: v for k, v in match_data.items() if k != 'donor'}
+    if donor is not None:
+        result['donor_summary'] = {
+            'donor_name': donor.donor_name,
+            'hospital_id': donor.hospital_id,
+            'age': donor.age,
+            'blood_group': donor.blood_group.value if donor.blood_group else None,
+            'organ_type': donor.organ_type.value if donor.organ_type else None,
+            'city': donor.city,
+            'state': donor.state
+        }
+    return result
+
+class ScoringService:
+    """Runs the matching pipeline with model inference routed through a MicroBatcher"""
+    def __init__(self, engine=None, max_batch_rows=4096, max_wait_ms=5, result_timeout_s=30):
+        if engine is None:
+            from matching_engine import MatchingEngine
+            engine = MatchingEngine()
+        self.engine = engine
+        self.result_timeout_s = result_timeout_s
+        self.batcher = MicroBatcher(engine.predict_batch, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+        self.requests_served = 0
+
+    def score(self, request):
+        """
+        Score one match request
+
+        Args:
+            request: Dict with either 'sos_case_id' or 'patient' plus optional
+                'max_results', 'search_radius_km', 'include_timings' and
+                'explain_top_k'
+
+        Returns:
+            List of JSON-safe match dicts
+        """
+        from matching_engine import PatientNotFound
+
+        sos_case_id = request.get('sos_case_id')
+        patient_data = _coerce_patient(request['patient']) if request.get('patient') else None
+        try:
+            matches = self.engine.find_matches(
+                sos_case_id=sos_case_id,
+                patient_data=patient_data,
+                max_results=int(request.get('max_results', 20)),
+                search_radius_km=float(request.get('search_radius_km', 500)),
+                include_timings=bool(request.get('include_timings')),
+                explain_top_k=int(request.get('explain_top_k', 0)),
+                predict=self.predict,
+                raise_errors=True
+            )
+        except PatientNotFound:
+            return []
+        self.requests_served += 1
+        return [serialize_match(m) for m in matches]
+
+    def predict(self, feature_vectors):
+        """Model inference through the shared micro-batcher"""
+        future = self.batcher.submit(feature_vectors)
+        return future.result(timeout=self.result_timeout_s)
+
+    def stats(self):
+        stats = self.batcher.stats()
+        stats['requests_served'] = self.requests_served
+        stats['model_loaded'] = self.engine.ml_model is not None
+        return stats
+
+    def close(self):
+        self.batcher.stop()
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """POST /match, GET /stats, GET /metrics, GET /health"""
+    server_version = "JeevSetuScoring/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.service.stats())
+        elif self.path == '/metrics':
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/match':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self._send_json(400, {'error': f'invalid JSON: {e}'})
+            return
+        try:
+            matches = self.server.service.score(request)
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'matches': matches})
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) tuple
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return 'unix'
+
+    def log_message(self, format, *args):
+        if os.environ.get('SCORING_SERVER_ACCESS_LOG'):
+            super().log_message(format, *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """Bind the scoring service to a TCP port or a Unix socket"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, ScoringRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ScoringRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, max_batch_rows=4096, max_wait_ms=5, engine=None):
+    """Start the scoring server and block until interrupted"""
+    service = ScoringService(engine=engine, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+    server = create_server(service, host=host, port=port, socket_path=socket_path)
+    where = socket_path or f"http://{host}:{port}"
+    print(f"✅ Scoring server listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 Scoring server stopped")
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class ScoringClient:
+    """Thin client for UI processes and batch jobs"""
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        if self.socket_path:
+            conn = _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(payload).encode('utf-8') if payload is not None else None
+            headers = {'Content-Type': 'application/json'} if body else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b'{}')
+            if response.status != 200:
+                raise RuntimeError(data.get('error', f'HTTP {response.status}'))
+            return data
+        finally:
+            conn.close()
+
+    def find_matches(self, sos_case_id=None, patient_data=None, max_results=20, search_radius_km=500, include_timings=False, explain_top_k=0):
+        payload = {
+            'max_results': max_results, 'search_radius_km': search_radius_km,
+            'include_timings': include_timings, 'explain_top_k': explain_top_k
+        }
+        if sos_case_id:
+            payload['sos_case_id'] = sos_case_id
+        if patient_data:
+            payload['patient'] = {k: getattr(v, 'value', v) for k, v in patient_data.items()}
+        return self._request('POST', '/match', payload)['matches']
+
+    def stats(self):
+        return self._request('GET', '/stats')
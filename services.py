@@ -0,0 +1,84 @@
+"""Framework-free services shared by the Streamlit app, benchmarks and batch jobs"""
+import os
+import json
+import hashlib
+from math import radians, sin, cos, asin, sqrt, floor, log2
+
+CITIES = {"New Delhi": (28.6139, 77.2090), "Mumbai": (19.0760, 72.8777), "Pune": (18.5204, 73.8567), "Bangalore": (12.9716, 77.5946)}
+ORGAN_LIMITS = {"Heart": 4, "Lungs": 6, "Liver": 12, "Kidney": 36, "Pancreas": 12}
+
+class SecurityService:
+    @staticmethod
+    def hash_password(password, salt=None):
+        if not salt: salt = os.urandom(16).hex()
+        return hashlib.sha256((salt + password).encode()).hexdigest(), salt
+
+class MLService:
+    @staticmethod
+    def haversine(lat1, lon1, lat2, lon2):
+        R = 6371
+        dlat, dlon = radians(lat2 - lat1), radians(lon2 - lon1)
+        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+        return R * 2 * asin(sqrt(a))
+
+    @staticmethod
+    def calculate_compatibility(donor_row, patient_dict):
+        d_blood = donor_row[3]
+        if d_blood != 'O-' and d_blood != patient_dict['blood_type']:
+            if d_blood != patient_dict['blood_type']: return 0, 0 
+        
+        try:
+            d_hla = json.loads(donor_row[6])
+            p_hla = patient_dict['hla']
+            matches = 0
+            matches += len(set(d_hla.get('A',[])).intersection(p_hla.get('A',[])))
+            matches += len(set(d_hla.get('B',[])).intersection(p_hla.get('B',[])))
+            hla_score = (matches / 6) * 60
+        except: hla_score = 10 
+            
+        dist = MLService.haversine(patient_dict['lat'], patient_dict['lon'], donor_row[4], donor_row[5])
+        if dist > 3000: return 0, dist
+        
+        dist_score = max(0, 40 * (1 - (dist / 3000)))
+        return min(round(hla_score + dist_score, 1), 100), int(dist)
+
+class MapService:
+    @staticmethod
+    def fit_zoom(points, default=4, max_zoom=12):
+        """Web-map zoom level that roughly fits all (lat, lon) points"""
+        if not points: return default
+        lats, lons = [p[0] for p in points], [p[1] for p in points]
+        span = max(max(lats) - min(lats), max(lons) - min(lons), 1e-6)
+        return max(1, min(max_zoom, int(log2(900 / span))))  # ~2.5 map tiles across
+
+    @staticmethod
+    def cluster_points(points, zoom, max_clusters=400):
+        """
+        Server-side grid clustering for one map layer
+
+        Args:
+            points: Iterable of (id, lat, lon)
+            zoom: Web-map zoom level; grid cells are 1/16 of a map tile (22.5 / 2**zoom degrees)
+            max_clusters: Payload bound; zoom is lowered until the clusters fit
+
+        Returns:
+            (clusters, point_of, zoom) - clusters numbered from 1 by size, each
+            {'point', 'lat', 'lon', 'count', 'ids'}, id -> point number, and
+            the zoom level actually used
+        """
+        points = [p for p in points if p[1] is not None and p[2] is not None]
+        while True:
+            cell = 22.5 / (2 ** zoom)
+            cells = {}
+            for pid, lat, lon in points:
+                c = cells.setdefault((floor(lat / cell), floor(lon / cell)), [0.0, 0.0, []])
+                c[0] += lat; c[1] += lon; c[2].append(pid)
+            if len(cells) <= max_clusters or zoom <= 0: break
+            zoom -= 1
+
+        clusters = sorted(cells.values(), key=lambda c: -len(c[2]))
+        result, point_of = [], {}
+        for n, (lat_sum, lon_sum, ids) in enumerate(clusters, start=1):
+            result.append({'point': n, 'lat': lat_sum / len(ids), 'lon': lon_sum / len(ids), 'count': len(ids), 'ids': ids})
+            for pid in ids: point_of[pid] = n
+        return result, point_of, zoom
@@ -0,0 +1,514 @@
+"""Discrete-event allocation simulator for Organ Donation Platform
+
+Simulates a year (or any horizon) of organ offers and SOS cases to compare
+score weightings and search radii before they reach production. Donors and
+patients arrive as Poisson processes; offered organs expire after their
+viability window, patients leave the waiting list after an urgency-dependent
+deadline, and allocated organs travel hospital -> patient city using the
+travel_time.py road/air model.
+
+Every search goes through the real MatchingEngine batched path
+(build_candidates_from_store -> predict_batch -> rank_candidates) over an
+in-memory DonorSelection of the offers still on the table. SOS cases search
+on arrival; new offers are allocated in rounds (waiting list in match_queue
+claim order: urgency, then FIFO). Graft outcomes are drawn from a simple
+ground-truth model (ischemia, age match, donor reliability) that is
+independent of the engine's scores.
+
+Replications run in parallel processes; each configuration sees the same
+arrival streams per replication (common random numbers), so differences
+between configurations are not arrival noise.
+
+    python simulator.py --days 365 --replications 8 --workers 8
+    python simulator.py --weights 0.4,0.3,0.2,0.1 --weights 0.5,0.2,0.1,0.2 --radius 500 --radius 150 --output sim.json
+"""
+import os
+import json
+import time
+import heapq
+import atexit
+import shutil
+import bisect
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from database import DatabaseManager, BloodGroup, OrganType, get_blood_compatible_groups
+from donor_store import DonorSelection
+from travel_time import ORGAN_TYPE_LIMITS, UNREACHABLE, compute_travel_minutes
+from matching_engine import MatchingEngine, DEFAULT_SCORE_WEIGHTS
+from benchmarks.seed_registry import SEED_CITIES
+
+# Viability windows for organs travel_time.py does not limit
+SIM_VIABILITY_HOURS = {
+    **ORGAN_TYPE_LIMITS,
+    OrganType.INTESTINE: 8,
+    OrganType.BONE_MARROW: 72,
+    OrganType.CORNEA: 14 * 24,
+}
+
+ORGAN_MIX = {
+    OrganType.KIDNEY: 0.42, OrganType.LIVER: 0.20, OrganType.CORNEA: 0.16, OrganType.BONE_MARROW: 0.07,
+    OrganType.HEART: 0.05, OrganType.LUNG: 0.04, OrganType.PANCREAS: 0.03, OrganType.INTESTINE: 0.03,
+}
+# Indian population ABO/Rh frequencies (approximate)
+BLOOD_MIX = {
+    BloodGroup.O_POS: 0.32, BloodGroup.B_POS: 0.31, BloodGroup.A_POS: 0.22, BloodGroup.AB_POS: 0.08,
+    BloodGroup.O_NEG: 0.02, BloodGroup.B_NEG: 0.02, BloodGroup.A_NEG: 0.02, BloodGroup.AB_NEG: 0.01,
+}
+URGENCY_MIX = {1: 0.20, 2: 0.25, 3: 0.30, 4: 0.15, 5: 0.10}
+# Mean days a patient can wait before leaving the list, by urgency level
+PATIENT_DEADLINE_DAYS = {1: 365, 2: 180, 3: 90, 4: 30, 5: 7}
+
+# Ground-truth graft model: full viability used up costs 40% of the success odds
+GRAFT_BASE_SUCCESS = 0.92
+GRAFT_ISCHEMIA_PENALTY = 0.4
+GRAFT_AGE_MISMATCH_FACTOR = 0.85
+
+DEFAULT_SCENARIO = {
+    'days': 365,
+    'warmup_days': 30,
+    'donor_rate_per_day': 60.0,
+    'sos_rate_per_day': 80.0,
+    'hospitals': 250,
+    'round_hours': 1.0,
+    'search_radius_km': 500,
+    'score_weights': DEFAULT_SCORE_WEIGHTS,
+}
+
+KEY_METRICS = [
+    'transplants', 'graft_success_rate', 'organ_utilization', 'organs_expired',
+    'patients_died', 'mean_wait_days', 'mean_transport_hours', 'same_city_share',
+]
+
+ORGANS = list(OrganType)
+BLOODS = list(BloodGroup)
+ORGAN_CODES = {organ: code for code, organ in enumerate(ORGANS)}
+BLOOD_CODES = {blood: code for code, blood in enumerate(BLOODS)}
+# Donor blood codes each patient blood code can receive from (set and [patient, donor] lookup table)
+RECEIVES_FROM = [
+    {BLOOD_CODES[donor] for donor in BLOODS if patient in get_blood_compatible_groups(donor)}
+    for patient in BLOODS
+]
+RECEIVES_MASK = np.array([[code in receivable for code in range(len(BLOODS))] for receivable in RECEIVES_FROM])
+DONATES_TO = [[patient for patient in range(len(BLOODS)) if RECEIVES_MASK[patient, donor]] for donor in range(len(BLOODS))]
+
+def _cumulative(mix):
+    weights = np.array(list(mix.values()), dtype=np.float64)
+    return list(mix), np.cumsum(weights / weights.sum())
+
+DRAWS = {name: _cumulative(mix) for name, mix in (('organ', ORGAN_MIX), ('blood', BLOOD_MIX), ('urgency', URGENCY_MIX))}
+
+def _choice(rng, name):
+    keys, cumulative = DRAWS[name]
+    return keys[min(int(np.searchsorted(cumulative, rng.random(), side='right')), len(keys) - 1)]
+
+class Simulation:
+    """One replication: an event queue over offered organs and the waiting list"""
+    DONOR_ARRIVAL, SOS_ARRIVAL, ROUND, ORGAN_EXPIRY, PATIENT_DEADLINE = range(5)
+
+    def __init__(self, engine, scenario, seed):
+        self.engine = engine
+        self.scenario = {**DEFAULT_SCENARIO, **scenario}
+        # Arrivals draw from their own stream so every configuration sees the same traffic
+        self.arrival_rng = np.random.default_rng([seed, 0])
+        self.outcome_rng = np.random.default_rng([seed, 1])
+        self.horizon_h = self.scenario['days'] * 24.0
+        self.warmup_h = self.scenario['warmup_days'] * 24.0
+
+        geography = np.random.default_rng([seed, 2])
+        self.city_names = [city for city, _, _, _ in SEED_CITIES]
+        self.city_states = [state for _, state, _, _ in SEED_CITIES]
+        city_points = np.array([(lat, lon) for _, _, lat, lon in SEED_CITIES])
+        self.hospital_city = geography.integers(0, len(SEED_CITIES), self.scenario['hospitals'])
+        hospital_points = city_points[self.hospital_city] + geography.normal(0, 0.05, (self.scenario['hospitals'], 2))
+        minutes = compute_travel_minutes(hospital_points, city_points).min(axis=0).astype(np.float64)
+        self.travel_hours = np.where(minutes >= UNREACHABLE, np.inf, minutes / 60.0)
+        self.city_index = {name.lower(): i for i, name in enumerate(self.city_names)}
+        states = sorted(set(self.city_states))
+        self.state_index = {state.lower(): i for i, state in enumerate(states)}
+        self.city_state_code = np.array([self.state_index[state.lower()] for state in self.city_states], dtype=np.int16)
+        self.in_radius = self._radius_table()
+
+        capacity = int(self.scenario['donor_rate_per_day'] * self.scenario['days'] * 1.2) + 16
+        self.columns = {
+            'donor_id': np.arange(capacity, dtype=np.int64),
+            'age': np.zeros(capacity, dtype=np.int16),
+            'reliability': np.zeros(capacity, dtype=np.float64),
+            'freshness': np.ones(capacity, dtype=np.float64),
+            'city': np.zeros(capacity, dtype=np.int32),
+            'state': np.zeros(capacity, dtype=np.int16),
+        }
+        self.donor_hospital = np.zeros(capacity, dtype=np.int32)
+        self.donor_blood = np.zeros(capacity, dtype=np.int8)
+        self.donor_arrival = np.zeros(capacity, dtype=np.float64)
+        self.donor_expiry = np.zeros(capacity, dtype=np.float64)
+        self.donor_count = 0
+        self.available = {organ: set() for organ in ORGANS}
+        self.new_offers = {organ: [] for organ in ORGANS}
+
+        self.patients = []
+        # Waiting list per organ, bucketed by (patient city, blood code); each bucket in claim order
+        self.waiting = {organ: {} for organ in ORGANS}
+        self.events = []
+        self._sequence = itertools.count()
+        self.round_pending = False
+        self.stats = {'donors': 0, 'patients': 0, 'organs_expired': 0, 'patients_died': 0, 'searches': 0}
+        self.transplants = []
+
+    def _radius_table(self):
+        """
+        [patient city, donor city] pairs the engine keeps within the search radius
+
+        Asked from build_candidates_from_store itself (one probe donor per city),
+        so the simulator never re-implements the engine's distance rule.
+        """
+        cities = len(self.city_names)
+        probe = {
+            'donor_id': np.arange(cities, dtype=np.int64),
+            'age': np.full(cities, 40, dtype=np.int16),
+            'reliability': np.full(cities, 0.5),
+            'freshness': np.ones(cities),
+            'city': np.arange(cities, dtype=np.int32),
+            'state': self.city_state_code.copy(),
+        }
+        selection = DonorSelection(probe, np.arange(cities), self.city_index, self.state_index)
+        table = np.zeros((cities, cities), dtype=bool)
+        for city in range(cities):
+            patient = {'city': self.city_names[city], 'state': self.city_states[city], 'urgency_level': 3, 'age': 40}
+            kept = [c['donor_id'] for c in self.engine.build_candidates_from_store(selection, patient, self.scenario['search_radius_km'])]
+            table[city, kept] = True
+        return table
+
+    def schedule(self, at, kind, payload=None):
+        if at <= self.horizon_h:
+            heapq.heappush(self.events, (at, next(self._sequence), kind, payload))
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.resize(column, len(column) * 2)
+            if name == 'donor_id':
+                grown = np.arange(len(grown), dtype=np.int64)
+            self.columns[name] = grown
+        for name in ('donor_hospital', 'donor_blood', 'donor_arrival', 'donor_expiry'):
+            setattr(self, name, np.resize(getattr(self, name), len(getattr(self, name)) * 2))
+
+    # ---- arrivals ----
+
+    def donor_arrives(self, now):
+        rng = self.arrival_rng
+        self.schedule(now + rng.exponential(24.0 / self.scenario['donor_rate_per_day']), self.DONOR_ARRIVAL)
+        if self.donor_count == len(self.donor_arrival):
+            self._grow()
+        i = self.donor_count
+        self.donor_count += 1
+        organ = _choice(rng, 'organ')
+        hospital = int(rng.integers(0, len(self.hospital_city)))
+        city = int(self.hospital_city[hospital])
+        self.columns['age'][i] = int(rng.integers(18, 70))
+        self.columns['reliability'][i] = round(float(rng.beta(5, 2)), 3)
+        self.columns['city'][i] = city
+        self.columns['state'][i] = self.city_state_code[city]
+        self.donor_hospital[i] = hospital
+        self.donor_blood[i] = BLOOD_CODES[_choice(rng, 'blood')]
+        self.donor_arrival[i] = now
+        self.donor_expiry[i] = now + SIM_VIABILITY_HOURS[organ]
+        if now >= self.warmup_h:
+            self.stats['donors'] += 1
+
+        self.available[organ].add(i)
+        self.new_offers[organ].append(i)
+        self.schedule(self.donor_expiry[i], self.ORGAN_EXPIRY, (organ, i))
+        if not self.round_pending:
+            round_hours = self.scenario['round_hours']
+            self.schedule((np.floor(now / round_hours) + 1) * round_hours, self.ROUND)
+            self.round_pending = True
+
+    def sos_arrives(self, now):
+        rng = self.arrival_rng
+        self.schedule(now + rng.exponential(24.0 / self.scenario['sos_rate_per_day']), self.SOS_ARRIVAL)
+        city = int(rng.integers(0, len(self.city_names)))
+        urgency = _choice(rng, 'urgency')
+        patient = {
+            'id': len(self.patients),
+            'organ': _choice(rng, 'organ'),
+            'blood': BLOOD_CODES[_choice(rng, 'blood')],
+            'age': int(rng.integers(5, 75)),
+            'city_code': city,
+            'urgency': urgency,
+            'arrival': now,
+            'deadline': now + rng.exponential(PATIENT_DEADLINE_DAYS[urgency] * 24.0),
+            'status': 'waiting',
+        }
+        # Engine-facing patient dict (same keys as MatchingEngine.get_patient)
+        patient['search'] = {
+            'blood_group': BLOODS[patient['blood']], 'organ_type': patient['organ'],
+            'urgency_level': urgency, 'age': patient['age'],
+            'city': self.city_names[city], 'state': self.city_states[city],
+        }
+        self.patients.append(patient)
+        if now >= self.warmup_h:
+            self.stats['patients'] += 1
+
+        if self.try_allocate(patient, now) is None:
+            bucket = self.waiting[patient['organ']].setdefault((city, patient['blood']), [])
+            bisect.insort(bucket, self._queue_key(patient))
+            self.schedule(patient['deadline'], self.PATIENT_DEADLINE, patient['id'])
+
+    @staticmethod
+    def _queue_key(patient):
+        return (-patient['urgency'], patient['arrival'], patient['id'])
+
+    # ---- matching ----
+
+    def search(self, patient, now):
+        """Best feasible offer for a patient through the engine's batched path, or None"""
+        offers = self.available[patient['organ']]
+        if not offers:
+            return None
+        indices = np.fromiter(offers, dtype=np.int64, count=len(offers))
+        # Mirrors MatchingEngine.filter_feasible: the organ must arrive inside its remaining window
+        travel = self.travel_hours[self.donor_hospital[indices], patient['city_code']]
+        feasible = RECEIVES_MASK[patient['blood']][self.donor_blood[indices]] & (now + travel <= self.donor_expiry[indices])
+        indices = indices[feasible]
+        if not len(indices):
+            return None
+
+        self.stats['searches'] += 1
+        selection = DonorSelection(self.columns, indices, self.city_index, self.state_index)
+        candidates = self.engine.build_candidates_from_store(selection, patient['search'], self.scenario['search_radius_km'])
+        if not candidates:
+            return None
+        probabilities = self.engine.predict_batch([c['feature_vector'] for c in candidates])
+        return self.engine.rank_candidates(candidates, probabilities, max_results=1)[0]
+
+    def try_allocate(self, patient, now):
+        """Transplant the patient's top match; returns the donor index or None"""
+        match = self.search(patient, now)
+        if match is None:
+            return None
+        donor = match['donor_id']
+        self.available[patient['organ']].discard(donor)
+        patient['status'] = 'transplanted'
+
+        transport = float(self.travel_hours[self.donor_hospital[donor], patient['city_code']])
+        ischemia_fraction = min(1.0, (now - self.donor_arrival[donor] + transport) / SIM_VIABILITY_HOURS[patient['organ']])
+        probability = (GRAFT_BASE_SUCCESS * (1.0 - GRAFT_ISCHEMIA_PENALTY * ischemia_fraction)
+                       * (1.0 if match['age_compatible'] else GRAFT_AGE_MISMATCH_FACTOR)
+                       * (0.85 + 0.15 * self.columns['reliability'][donor]))
+        success = bool(self.outcome_rng.random() < probability)
+        if patient['arrival'] >= self.warmup_h:
+            self.transplants.append((
+                now - patient['arrival'], transport, success,
+                int(self.columns['city'][donor]) == patient['city_code']
+            ))
+        return donor
+
+    def allocation_round(self, now):
+        """Offer this round's new organs down the waiting list"""
+        self.round_pending = False
+        for organ, offered in self.new_offers.items():
+            if not offered:
+                continue
+            fresh = [i for i in offered if i in self.available[organ]]
+            self.new_offers[organ] = []
+            if not fresh:
+                continue
+            # Only new offers can change a waiting patient's search result, so only
+            # buckets that could receive one of them (blood, radius, travel time) are asked
+            waiting = self.waiting[organ]
+            reachable = set()
+            for i in fresh:
+                cities = np.flatnonzero(
+                    self.in_radius[:, self.columns['city'][i]]
+                    & (now + self.travel_hours[self.donor_hospital[i]] <= self.donor_expiry[i])
+                ).tolist()
+                reachable.update((city, blood) for city in cities for blood in DONATES_TO[self.donor_blood[i]])
+            buckets = {bucket: waiting[bucket] for bucket in reachable if waiting.get(bucket)}
+            queue = heapq.merge(*[[(key, bucket) for key in keys] for bucket, keys in buckets.items()])
+            remaining = set(fresh)
+            for key, bucket in queue:
+                donor = self.try_allocate(self.patients[key[2]], now)
+                if donor is None:
+                    continue
+                keys = waiting[bucket]
+                del keys[bisect.bisect_left(keys, key)]
+                remaining.discard(donor)
+                # Older offers were already turned down by everyone still waiting
+                if not remaining:
+                    break
+
+    def organ_expires(self, organ, donor):
+        if donor in self.available[organ]:
+            self.available[organ].discard(donor)
+            if self.donor_arrival[donor] >= self.warmup_h:
+                self.stats['organs_expired'] += 1
+
+    def patient_deadline(self, patient_id):
+        patient = self.patients[patient_id]
+        if patient['status'] != 'waiting':
+            return
+        patient['status'] = 'died'
+        waiting = self.waiting[patient['organ']].get((patient['city_code'], patient['blood']), [])
+        key = self._queue_key(patient)
+        position = bisect.bisect_left(waiting, key)
+        if position < len(waiting) and waiting[position] == key:
+            del waiting[position]
+        if patient['arrival'] >= self.warmup_h:
+            self.stats['patients_died'] += 1
+
+    # ---- run ----
+
+    def run(self):
+        started = time.perf_counter()
+        self.schedule(self.arrival_rng.exponential(24.0 / self.scenario['donor_rate_per_day']), self.DONOR_ARRIVAL)
+        self.schedule(self.arrival_rng.exponential(24.0 / self.scenario['sos_rate_per_day']), self.SOS_ARRIVAL)
+        while self.events:
+            now, _, kind, payload = heapq.heappop(self.events)
+            if kind == self.DONOR_ARRIVAL:
+                self.donor_arrives(now)
+            elif kind == self.SOS_ARRIVAL:
+                self.sos_arrives(now)
+            elif kind == self.ROUND:
+                self.allocation_round(now)
+            elif kind == self.ORGAN_EXPIRY:
+                self.organ_expires(*payload)
+            else:
+                self.patient_deadline(payload)
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, wall_s):
+        waits = np.array([t[0] for t in self.transplants]) / 24.0
+        transport = np.array([t[1] for t in self.transplants])
+        successes = sum(1 for t in self.transplants if t[2])
+        count = len(self.transplants)
+        return {
+            **self.stats,
+            'transplants': count,
+            'graft_success_rate': successes / count if count else None,
+            'organ_utilization': count / self.stats['donors'] if self.stats['donors'] else None,
+            'waiting_at_end': sum(len(keys) for buckets in self.waiting.values() for keys in buckets.values()),
+            'mean_wait_days': float(waits.mean()) if count else None,
+            'p90_wait_days': float(np.percentile(waits, 90)) if count else None,
+            'mean_transport_hours': float(transport.mean()) if count else None,
+            'same_city_share': sum(1 for t in self.transplants if t[3]) / count if count else None,
+            'wall_s': round(wall_s, 2),
+        }
+
+# ---- parallel replications ----
+
+_WORKER = {}
+
+def _worker_engine(model_path):
+    """One MatchingEngine per process (the model is loaded once, never the database)"""
+    if model_path not in _WORKER:
+        workdir = tempfile.mkdtemp(prefix="jeevsetu-sim-")
+        atexit.register(shutil.rmtree, workdir, True)
+        _WORKER[model_path] = MatchingEngine(
+            db_manager=DatabaseManager(os.path.join(workdir, "simulation.db")),
+            model_path=model_path,
+            travel_matrix_path=os.path.join(workdir, "no_matrix.npy"),
+            donor_features=False
+        )
+    return _WORKER[model_path]
+
+def run_replication(task):
+    """Process-pool entry point: (config index, replication, scenario, seed, model path)"""
+    config_index, replication, scenario, seed, model_path = task
+    engine = _worker_engine(model_path)
+    engine.score_weights = dict(scenario['score_weights'])
+    return config_index, replication, Simulation(engine, scenario, seed).run()
+
+def summarize(results):
+    """Mean and 95% confidence half-width per metric across replications"""
+    summary = {}
+    for name in results[0]:
+        values = np.array([r[name] for r in results if r[name] is not None], dtype=np.float64)
+        if not len(values):
+            continue
+        half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+        summary[name] = {'mean': float(values.mean()), 'ci95': float(half_width)}
+    return summary
+
+def run_experiment(configs, replications=4, workers=None, seed=42, model_path="data/match_model.pkl"):
+    """
+    Simulate each configuration with the same per-replication seeds
+
+    Args:
+        configs: List of scenario override dicts (score_weights, search_radius_km, ...)
+        replications: Independent replications per configuration
+        workers: Process count (default: CPU count)
+
+    Returns:
+        List of {'scenario', 'replications', 'summary'} in config order
+    """
+    scenarios = [{**DEFAULT_SCENARIO, **config} for config in configs]
+    tasks = [
+        (c, r, scenario, seed + r, model_path)
+        for c, scenario in enumerate(scenarios) for r in range(replications)
+    ]
+    runs = [[None] * replications for _ in scenarios]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for config_index, replication, result in pool.map(run_replication, tasks):
+            runs[config_index][replication] = result
+    return [
+        {'scenario': scenario, 'replications': results, 'summary': summarize(results)}
+        for scenario, results in zip(scenarios, runs)
+    ]
+
+def parse_weights(value):
+    """'0.4,0.3,0.2,0.1' -> score_weights dict (compatibility, ml_probability, urgency, reliability)"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != len(DEFAULT_SCORE_WEIGHTS):
+        raise argparse.ArgumentTypeError(f"expected {len(DEFAULT_SCORE_WEIGHTS)} comma-separated weights")
+    return dict(zip(DEFAULT_SCORE_WEIGHTS, parts))
+
+def _format(stat, name):
+    if stat is None:
+        return "-"
+    if name.endswith(('_rate', '_utilization', '_share')):
+        return f"{stat['mean']:.1%}±{stat['ci95']:.1%}"
+    return f"{stat['mean']:.1f}±{stat['ci95']:.1f}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of organ allocation")
+    parser.add_argument("--days", type=float, default=DEFAULT_SCENARIO['days'])
+    parser.add_argument("--warmup-days", type=float, default=DEFAULT_SCENARIO['warmup_days'])
+    parser.add_argument("--donor-rate", type=float, default=DEFAULT_SCENARIO['donor_rate_per_day'], help="Organ offers per day")
+    parser.add_argument("--sos-rate", type=float, default=DEFAULT_SCENARIO['sos_rate_per_day'], help="SOS cases per day")
+    parser.add_argument("--hospitals", type=int, default=DEFAULT_SCENARIO['hospitals'])
+    parser.add_argument("--round-hours", type=float, default=DEFAULT_SCENARIO['round_hours'])
+    parser.add_argument("--weights", type=parse_weights, action="append", help="compatibility,ml,urgency,reliability (repeatable)")
+    parser.add_argument("--radius", type=float, action="append", help="Search radius in km (repeatable)")
+    parser.add_argument("--replications", type=int, default=4)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", default="data/match_model.pkl")
+    parser.add_argument("--output", help="Write full results as JSON")
+    args = parser.parse_args()
+
+    base = {
+        'days': args.days, 'warmup_days': args.warmup_days, 'donor_rate_per_day': args.donor_rate,
+        'sos_rate_per_day': args.sos_rate, 'hospitals': args.hospitals, 'round_hours': args.round_hours,
+    }
+    configs = [
+        {**base, 'score_weights': weights, 'search_radius_km': radius}
+        for weights in (args.weights or [DEFAULT_SCORE_WEIGHTS])
+        for radius in (args.radius or [DEFAULT_SCENARIO['search_radius_km']])
+    ]
+    started = time.perf_counter()
+    experiment = run_experiment(configs, args.replications, args.workers, args.seed, args.model)
+
+    print(f"\n📈 {len(configs)} configurations x {args.replications} replications of {args.days:g} days "
+          f"in {time.perf_counter() - started:.1f}s")
+    for result in experiment:
+        scenario, summary = result['scenario'], result['summary']
+        weights = ",".join(f"{w:g}" for w in scenario['score_weights'].values())
+        print(f"\nweights {weights} · radius {scenario['search_radius_km']:g} km")
+        for name in KEY_METRICS:
+            print(f"  {name:<22} {_format(summary.get(name), name)}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'configs': experiment}, f, indent=2, default=str)
+        print(f"\n✅ Results written to {args.output}")
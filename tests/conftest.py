@@ -0,0 +1,22 @@
+import os
+import sys
+import shutil
+import pytest
+
+# Root modules (matching_engine, tree_model, ...) and the benchmarks package import from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def seeded_registry(tmp_path_factory):
+    """Small synthetic registry (benchmarks.seed_registry), built once per session"""
+    from benchmarks.seed_registry import RegistrySeeder
+    path = str(tmp_path_factory.mktemp("registry") / "registry.db")
+    RegistrySeeder(path).seed(hospitals=5, donors=2000, sos_cases=20, matches=500, donations=100)
+    return path
+
+@pytest.fixture
+def registry_path(seeded_registry, tmp_path):
+    """Private copy of the seeded registry for tests that write to it"""
+    path = str(tmp_path / "registry.db")
+    shutil.copy(seeded_registry, path)
+    return path
@@ -0,0 +1,30 @@
+"""Schema upgrades DatabaseManager applies to databases created before newer models"""
+import sqlite3
+
+from database import DatabaseManager, ADDED_INDEXES
+
+def _indexes(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[1] for row in conn.execute(f"PRAGMA index_list({table})")}
+    finally:
+        conn.close()
+
+def test_missing_indexes_are_added_to_existing_tables(registry_path):
+    conn = sqlite3.connect(registry_path)
+    for names in ADDED_INDEXES.values():
+        for name in names:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    conn.close()
+
+    DatabaseManager(registry_path)
+    for table, names in ADDED_INDEXES.items():
+        assert set(names) <= _indexes(registry_path, table)
+
+    conn = sqlite3.connect(registry_path)
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM matches WHERE donor_id = 1 ORDER BY created_at DESC"
+    ))
+    conn.close()
+    assert "ix_matches_donor_id" in plan
@@ -0,0 +1,38 @@
+"""Daily donor_features refresh (donor_features.py) against writes that bypass the ORM"""
+import sqlite3
+
+import donor_features
+from database import DatabaseManager
+
+def _feature(path, donor_id):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT hospital_id, age, reliability, city_key FROM donor_features WHERE donor_id = ?", (donor_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+def test_refresh_picks_up_raw_sql_updates(registry_path):
+    db = DatabaseManager(registry_path)
+    donor_features.rebuild(db)
+    assert donor_features.refresh(db)['updated'] == 0
+
+    conn = sqlite3.connect(registry_path)
+    donor_id, hospital_id = conn.execute("SELECT id, hospital_id FROM donors ORDER BY id LIMIT 1").fetchone()
+    other_hospital = conn.execute("SELECT MAX(id) FROM hospitals WHERE id != ?", (hospital_id,)).fetchone()[0]
+    conn.execute("UPDATE donors SET age = 71, city = ' Nashik ', reliability_score = 0.25, hospital_id = ? WHERE id = ?",
+                 (other_hospital, donor_id))
+    conn.execute("DELETE FROM donors WHERE id = (SELECT MAX(id) FROM donors)")
+    conn.commit()
+    conn.close()
+
+    store = donor_features.DonorFeatureStore(db, min_reload_interval_s=0)
+    store.refresh(force=True)
+    report = donor_features.refresh(db)
+    assert (report['updated'], report['removed']) == (1, 1)
+    assert _feature(registry_path, donor_id) == (other_hospital, 71, 0.25, 'nashik')
+    assert store.refresh()
+    row = int(store.columns['donor_id'].searchsorted(donor_id))
+    assert int(store.columns['age'][row]) == 71
+    assert donor_features.refresh(db)['updated'] == 0
@@ -0,0 +1,30 @@
+"""Shared-memory donor store (donor_store.py)"""
+import gc
+import os
+import pytest
+
+from database import DatabaseManager, BloodGroup, OrganType
+import donor_store
+
+@pytest.fixture
+def store_name():
+    name = f"jeevsetu_test_{os.getpid()}"
+    yield name
+    donor_store.unlink(name)
+
+def test_selection_survives_refresh(registry_path, store_name):
+    db_manager = DatabaseManager(registry_path)
+    donor_store.publish(db_manager, name=store_name)
+    store = donor_store.DonorStore.attach(store_name)
+    selection = store.select(OrganType.KIDNEY, list(BloodGroup))
+    narrowed = selection.filter(selection.column('age') >= 18)
+    ages = selection.column('age').copy()
+
+    donor_store.publish(db_manager, name=store_name)
+    assert store.refresh()
+    gc.collect()
+
+    # Both views still read the segment they were taken from
+    assert len(ages) and (selection.column('age') == ages).all()
+    assert (narrowed.column('age') >= 18).all()
+    assert len(store.select(OrganType.KIDNEY, list(BloodGroup))) == len(selection)
@@ -0,0 +1,32 @@
+"""HLA posting lists (hla_index.py) after writes that bypass the ORM"""
+import sqlite3
+
+import hla_index
+from database import DatabaseManager
+
+def test_reconcile_picks_up_raw_sql_typing_changes(registry_path, monkeypatch):
+    db = DatabaseManager(registry_path)
+    hla_index.rebuild(db)
+    assert hla_index.reconcile(db)['donors'] == 0
+
+    index = hla_index.HLAIndex(db, min_reload_interval_s=0)
+    index.refresh()
+    conn = sqlite3.connect(registry_path)
+    changed, deleted = [r[0] for r in conn.execute("SELECT id FROM donors ORDER BY id LIMIT 2")]
+    conn.execute("UPDATE donors SET hla_type = 'HLA-A*80:01 B*83:01 DRB1*18:01' WHERE id = ?", (changed,))
+    conn.execute("DELETE FROM donors WHERE id = ?", (deleted,))
+    conn.commit()
+    conn.close()
+    assert changed not in index.posting('A80')
+
+    report = hla_index.reconcile(db)
+    assert report['donors'] == 2 and report['added'] == 3
+    # Logged like an ORM write, so the loaded index patches instead of reloading
+    patched = []
+    apply_log = index._apply_log
+    monkeypatch.setattr(index, '_apply_log', lambda conn, version: patched.append(apply_log(conn, version)) or patched[-1])
+    assert index.refresh() and patched == [True]
+    assert list(index.posting('A80')) == [changed]
+    assert sorted(index.donors_sharing('A80,B83,DR18', min_shared=3)[0]) == [changed]
+    assert all(deleted not in posting for posting in index.postings.values())
+    assert hla_index.reconcile(db)['donors'] == 0
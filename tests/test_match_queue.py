@@ -0,0 +1,43 @@
+"""Auto-enqueue of new SOS cases (match_queue.py) is opt-in"""
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+import match_queue
+from database import DatabaseManager, SOSCase, BloodGroup, OrganType
+from matching_engine import MatchingEngine
+
+@pytest.fixture
+def db(registry_path):
+    yield DatabaseManager(registry_path)
+    if event.contains(SOSCase, 'after_insert', match_queue._enqueue_new_case):
+        event.remove(SOSCase, 'after_insert', match_queue._enqueue_new_case)
+
+def _file_case(db, path):
+    user_id = sqlite3.connect(path).execute("SELECT MIN(id) FROM users").fetchone()[0]
+    session = db.get_session()
+    try:
+        case = SOSCase(user_id=user_id, patient_name="Test Patient", patient_age=40,
+                       blood_group=BloodGroup.O_POS, organ_required=OrganType.KIDNEY, urgency_level=5,
+                       city="Pune", state="Maharashtra")
+        session.add(case)
+        session.commit()
+        return case.id
+    finally:
+        session.close()
+
+def _jobs(path, case_id):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT priority, status FROM match_jobs WHERE sos_case_id = ?", (case_id,)).fetchall()
+    finally:
+        conn.close()
+
+def test_engine_does_not_enqueue_by_default(db, registry_path, tmp_path):
+    MatchingEngine(db, model_path=str(tmp_path / "model.pkl"), donor_store=False)
+    assert _jobs(registry_path, _file_case(db, registry_path)) == []
+
+def test_installed_hook_enqueues_new_cases(db, registry_path):
+    match_queue.install_auto_enqueue()
+    assert _jobs(registry_path, _file_case(db, registry_path)) == [(5, 'pending')]
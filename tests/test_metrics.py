@@ -0,0 +1,13 @@
+"""Prometheus text exposition (metrics.py)"""
+from metrics import MetricsRegistry
+
+def test_label_values_and_help_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_errors_total', 'Errors by message\nand C:\\ path', ['message'])
+    counter.labels(message='bad "quote" in C:\\tmp\nsecond line').inc()
+    lines = registry.render().splitlines()
+    assert lines == [
+        '# HELP test_errors_total Errors by message\\nand C:\\\\ path',
+        '# TYPE test_errors_total counter',
+        'test_errors_total{message="bad \\"quote\\" in C:\\\\tmp\\nsecond line"} 1',
+    ]
@@ -0,0 +1,33 @@
+"""Hyperparameter search pruning (ml_model.py) against the shared best score"""
+import multiprocessing
+import time
+
+import pytest
+
+lgb = pytest.importorskip("lightgbm")
+
+import ml_model
+from ml_model import MLMatchingModel, DEFAULT_PARAMS
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    model = MLMatchingModel(model_path=None)
+    X, y = model.generate_synthetic_training_data(n_samples=1000)
+    path = str(tmp_path / "train.bin")
+    lgb.Dataset(X, label=y, params={'feature_pre_filter': False, 'verbose': -1}).save_binary(path)
+    return path
+
+def _trial(dataset_path, best_auc):
+    shared = multiprocessing.Value('d', best_auc, lock=False)
+    ml_model._init_tune_worker(shared)
+    try:
+        params = dict(DEFAULT_PARAMS, num_threads=1, verbose=-1)
+        return ml_model._run_cv_trial(dataset_path, params, 3, 200, time.time() + 60, 5, 0.01, 0)
+    finally:
+        ml_model._init_tune_worker(None)
+
+def test_running_trial_reads_the_shared_best_auc(dataset_path):
+    # A trial that finished elsewhere with a (here unreachable) best score prunes this one
+    pruned = _trial(dataset_path, 1.5)
+    assert pruned['pruned'] and pruned['best_iteration'] <= 5
+    assert not _trial(dataset_path, float('nan'))['pruned']
@@ -0,0 +1,85 @@
+"""Conversion rollups (rollups.py) and the outcome pairing ml_model.py trains on"""
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+
+import rollups
+from database import DatabaseManager
+from ml_model import MLMatchingModel
+
+def _ts(dt):
+    return dt.strftime(rollups.TIMESTAMP_FORMAT)
+
+def _add_outcomes(path):
+    """A donor scored before and after its donation, and one scored only after"""
+    now = datetime.utcnow() - timedelta(days=1)
+    conn = sqlite3.connect(path)
+    donor_a, donor_b = [r[0] for r in conn.execute("SELECT id FROM donors ORDER BY id LIMIT 2")]
+    case_id = conn.execute("SELECT MIN(id) FROM sos_cases").fetchone()[0]
+    match_sql = ("INSERT INTO matches (sos_case_id, donor_id, compatibility_score, distance_km, match_probability, "
+                 "urgency_weight, final_score, blood_compatible, organ_match, age_compatible, status, created_at) "
+                 "VALUES (?, ?, 0.8, 100, 0.5, 0.6, 0.7, 1, 1, 1, 'pending', ?)")
+    before = conn.execute(match_sql, (case_id, donor_a, _ts(now - timedelta(days=10)))).lastrowid
+    conn.execute(match_sql, (case_id, donor_a, _ts(now - timedelta(days=2))))
+    conn.execute(match_sql, (case_id, donor_b, _ts(now - timedelta(days=2))))
+    donation_sql = ("INSERT INTO donations (donor_id, recipient_name, organ_type, donation_date, success, created_at) "
+                    "VALUES (?, 'Test Recipient', 'KIDNEY', ?, 1, ?)")
+    for donor_id in (donor_a, donor_b):
+        conn.execute(donation_sql, (donor_id, _ts(now - timedelta(days=5)), _ts(now - timedelta(days=5))))
+    conn.commit()
+    conn.close()
+    return before
+
+def _expected_pairs(path):
+    """Donation id -> latest match at or before its date, computed from the raw rows"""
+    conn = sqlite3.connect(path)
+    matches = conn.execute("SELECT id, donor_id, created_at FROM matches").fetchall()
+    donations = conn.execute("SELECT id, donor_id, donation_date FROM donations").fetchall()
+    conn.close()
+    pairs = {}
+    for donation_id, donor_id, donated in donations:
+        earlier = [(created, match_id) for match_id, m_donor, created in matches
+                   if m_donor == donor_id and created <= donated]
+        if earlier:
+            pairs[donation_id] = max(earlier)[1]
+    return pairs
+
+def test_conversion_counts_match_raw_pairing(registry_path):
+    _add_outcomes(registry_path)
+    pairs = _expected_pairs(registry_path)
+
+    conn = sqlite3.connect(registry_path)
+    expected = Counter()
+    for match_id in pairs.values():
+        month, organ, state = conn.execute(
+            "SELECT strftime('%Y-%m', m.created_at), dn.organ_type, COALESCE(NULLIF(trim(dn.state), ''), 'Unknown') "
+            "FROM matches m JOIN donors dn ON dn.id = m.donor_id WHERE m.id = ?", (match_id,)
+        ).fetchone()
+        expected[(month, organ, state)] += 1
+    conn.close()
+
+    db = DatabaseManager(registry_path)
+    report = rollups.rebuild(db, lag_s=0)
+    assert report['donations'] > 0
+
+    conn = sqlite3.connect(registry_path)
+    rows = conn.execute("SELECT month, organ_type, state, conversions FROM rollup_conversions WHERE conversions > 0").fetchall()
+    conn.close()
+    assert {(month, organ, state): n for month, organ, state, n in rows} == dict(expected)
+    assert sum(expected.values()) == len(pairs)
+
+def test_outcome_dataset_uses_matches_scored_before_the_donation(registry_path):
+    before = _add_outcomes(registry_path)
+    pairs = _expected_pairs(registry_path)
+    assert before in pairs.values()
+
+    db = DatabaseManager(registry_path)
+    X, y, _ = MLMatchingModel(model_path=None).build_outcome_dataset(db)
+    assert len(X) == len(pairs)
+
+    conn = sqlite3.connect(registry_path)
+    expected_scores = sorted(conn.execute(
+        "SELECT compatibility_score FROM matches WHERE id = ?", (match_id,)
+    ).fetchone()[0] for match_id in pairs.values())
+    conn.close()
+    assert sorted(X[:, -1].tolist()) == expected_scores
@@ -0,0 +1,23 @@
+"""Streamlit cold-start/rerun budget (benchmarks/startup_budget.py) as a test"""
+import pytest
+
+pytest.importorskip("streamlit")
+
+from benchmarks.startup_budget import run_probe, check, DEFAULT_MAX_COLD_MS, DEFAULT_MAX_RERUN_MS
+
+def test_check_reports_each_violation():
+    result = {
+        'cold_ms': 1500.0,
+        'home_rerun_p95_ms': 20.0,
+        'register_rerun_p95_ms': 250.0,
+        'home_loaded_modules': ['pandas'],
+    }
+    violations = check(result, max_cold_ms=1000, max_rerun_ms=100)
+    assert len(violations) == 3
+    assert violations[0].startswith("cold run")
+    assert violations[1].startswith("register_rerun_p95_ms")
+    assert "pandas" in violations[2]
+
+def test_app_meets_startup_budget():
+    result = run_probe(reruns=20)
+    assert check(result, DEFAULT_MAX_COLD_MS, DEFAULT_MAX_RERUN_MS) == [], result
@@ -0,0 +1,34 @@
+"""Ischemia-time feasibility (travel_time.py) keyed by the gazetteer's resolved place"""
+from types import SimpleNamespace
+
+import pytest
+
+from database import DatabaseManager, OrganType
+from gazetteer import get_gazetteer
+from matching_engine import MatchingEngine
+from travel_time import build_matrix, gazetteer_points, hospital_key
+
+DELHI = (28.6139, 77.2090)
+BANGALORE = (12.9716, 77.5946)
+
+@pytest.fixture
+def engine(registry_path, tmp_path):
+    path = str(tmp_path / "travel_time.npy")
+    # No named cities: only gazetteer places can answer for the patient
+    build_matrix({hospital_key(1): DELHI, hospital_key(2): BANGALORE}, cities={}, path=path,
+                 places=gazetteer_points(get_gazetteer()))
+    return MatchingEngine(DatabaseManager(registry_path), model_path=str(tmp_path / "model.pkl"),
+                          travel_matrix_path=path, donor_store=False)
+
+@pytest.mark.parametrize("city", ["Bangalore", "Bengaluru", "Banglore", "bengaluru city"])
+def test_alias_city_drops_unreachable_hospital(engine, city):
+    donors = [SimpleNamespace(hospital_id=1), SimpleNamespace(hospital_id=2)]
+    patient = {'city': city, 'state': 'Karnataka', 'organ_type': OrganType.HEART}
+    # Delhi -> Bangalore by air is about 4.4 hours, past the heart's 4 hour window
+    assert [d.hospital_id for d in engine.filter_feasible(donors, patient)] == [2]
+
+def test_place_outside_named_cities_is_filtered(engine):
+    donors = [SimpleNamespace(hospital_id=1), SimpleNamespace(hospital_id=2)]
+    patient = {'city': 'Baroda', 'organ_type': OrganType.HEART, 'ischemia_elapsed_hours': 1.0}
+    # Vadodara is in the gazetteer only: about 2.9 hours by air from Delhi, 3.4 from Bangalore
+    assert [d.hospital_id for d in engine.filter_feasible(donors, patient)] == [1]
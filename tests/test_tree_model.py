@@ -0,0 +1,63 @@
+"""Compiled NumPy trees (tree_model.py) against LightGBM's own predictions"""
+import numpy as np
+import pytest
+
+lgb = pytest.importorskip("lightgbm")
+
+from tree_model import compile_booster, CompiledTreeModel, verification_matrix
+
+TOLERANCE = 1e-9
+N_FEATURES = 8
+
+def _training_data(seed=0, n_rows=2000):
+    rng = np.random.default_rng(seed)
+    X = rng.random((n_rows, N_FEATURES))
+    X[:, :3] = np.round(X[:, :3])  # binary features, like blood/organ/age compatibility
+    y = ((X[:, 0] + X[:, 1] + X[:, 6] + rng.normal(0, 0.3, n_rows)) > 1.5).astype(int)
+    # Missing values in training give splits NaN routing (missing_type "NaN")
+    X[rng.random(n_rows) < 0.1, 3] = np.nan
+    X[rng.random(n_rows) < 0.1, 6] = np.nan
+    return X, y
+
+def _scoring_matrix(compiled):
+    X = verification_matrix(N_FEATURES, n_rows=5000, seed=1)
+    # Rows landing exactly on split points, and NaN in every feature
+    for f in np.unique(compiled.feature):
+        points = compiled.threshold[compiled.feature == f][:1000]
+        X[:len(points), f] = points
+    X[-N_FEATURES:] = 0.5
+    X[np.arange(len(X) - N_FEATURES, len(X)), np.arange(N_FEATURES)] = np.nan
+    X[-N_FEATURES - 1] = np.nan
+    return X
+
+def _train(**params):
+    X, y = _training_data()
+    params = dict({'objective': 'binary', 'num_leaves': 15, 'min_data_in_leaf': 5, 'verbose': -1, 'seed': 0}, **params)
+    return lgb.train(params, lgb.Dataset(X, label=y), num_boost_round=30)
+
+@pytest.mark.parametrize("params", [{}, {'zero_as_missing': True}, {'use_missing': False}])
+def test_compiled_matches_booster_predict(params):
+    booster = _train(**params)
+    compiled = compile_booster(booster)
+    X = _scoring_matrix(compiled)
+    assert np.isnan(X).any()
+    np.testing.assert_allclose(compiled.predict(X), booster.predict(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(compiled.predict(X, raw_score=True), booster.predict(X, raw_score=True), rtol=0, atol=TOLERANCE)
+
+def test_compiled_matches_classifier_predict_proba():
+    X, y = _training_data(seed=2)
+    model = lgb.LGBMClassifier(n_estimators=25, num_leaves=15, min_child_samples=5, verbose=-1, random_state=0)
+    model.fit(X, y)
+    compiled = compile_booster(model)
+    X_score = _scoring_matrix(compiled)
+    np.testing.assert_allclose(compiled.predict(X_score), model.predict_proba(X_score)[:, 1], rtol=0, atol=TOLERANCE)
+
+def test_saved_model_round_trips(tmp_path):
+    booster = _train()
+    compiled = compile_booster(booster)
+    path = tmp_path / "model.npz"
+    compiled.save(str(path))
+    loaded = CompiledTreeModel.load(str(path))
+    X = _scoring_matrix(compiled)
+    assert loaded.num_trees == compiled.num_trees
+    np.testing.assert_allclose(loaded.predict(X), booster.predict(X), rtol=0, atol=TOLERANCE)
@@ -0,0 +1,256 @@
+"""Precomputed travel-time matrix for ischemia-time feasibility checks
+
+Travel minutes from every hospital to every hospital, city and gazetteer
+place (gazetteer.py, so aliases and misspellings resolve to a column) are
+computed once (road and air modes), stored as a compact uint16 array and loaded
+memory-mapped, so checking whether an organ can reach the patient inside its
+viability window is an O(1) lookup per donor/patient pair.
+
+    python travel_time.py --db data/organ_donation.db --out data/travel_time.npy
+"""
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+from database import DatabaseManager, Hospital, OrganType
+from services import CITIES, ORGAN_LIMITS
+
+DEFAULT_MATRIX_PATH = "data/travel_time.npy"
+MODES = ("road", "air")
+UNREACHABLE = np.iinfo(np.uint16).max
+
+# Road: great-circle distance inflated for the road network at ambulance speed
+ROAD_DETOUR_FACTOR = 1.3
+ROAD_SPEED_KMH = 60.0
+# Air: charter/commercial leg plus fixed ground handling at both ends
+AIR_SPEED_KMH = 600.0
+AIR_HANDLING_HOURS = 1.5
+AIR_MIN_DISTANCE_KM = 150.0
+
+# Viability windows (hours) keyed by registry organ type; organs without a
+# configured limit are never dropped by the feasibility filter
+ORGAN_TYPE_LIMITS = {
+    OrganType.HEART: ORGAN_LIMITS["Heart"],
+    OrganType.LUNG: ORGAN_LIMITS["Lungs"],
+    OrganType.LIVER: ORGAN_LIMITS["Liver"],
+    OrganType.KIDNEY: ORGAN_LIMITS["Kidney"],
+    OrganType.PANCREAS: ORGAN_LIMITS["Pancreas"],
+}
+
+def hospital_key(hospital_id):
+    """Matrix key for a registry hospital (database.py) or an app hospital name"""
+    return f"hospital:{str(hospital_id).strip().lower()}"
+
+def city_key(city):
+    return f"city:{city.strip().lower()}"
+
+def place_key(name, state):
+    """Matrix key for a gazetteer place; names repeat across states"""
+    return f"place:{name.strip().lower()}|{state.strip().lower()}"
+
+def organ_limit_hours(organ):
+    """Viability window for an OrganType or an app organ name ("Heart", "Lungs")"""
+    if isinstance(organ, OrganType):
+        return ORGAN_TYPE_LIMITS.get(organ)
+    return ORGAN_LIMITS.get(organ)
+
+def _haversine_matrix(origins, destinations):
+    """Pairwise great-circle distance (km) between two (n, 2) lat/lon arrays"""
+    lat1 = np.radians(origins[:, 0])[:, None]
+    lon1 = np.radians(origins[:, 1])[:, None]
+    lat2 = np.radians(destinations[:, 0])[None, :]
+    lon2 = np.radians(destinations[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _to_minutes(hours):
+    minutes = np.ceil(hours * 60.0)
+    return np.clip(minutes, 0, UNREACHABLE - 1).astype(np.uint16)
+
+def compute_travel_minutes(origins, destinations):
+    """
+    Travel minutes per mode
+
+    Returns:
+        uint16 array of shape (len(MODES), n_origins, n_destinations)
+    """
+    distance = _haversine_matrix(origins, destinations)
+    road = _to_minutes(distance * ROAD_DETOUR_FACTOR / ROAD_SPEED_KMH)
+    air = _to_minutes(AIR_HANDLING_HOURS + distance / AIR_SPEED_KMH)
+    air[distance < AIR_MIN_DISTANCE_KM] = UNREACHABLE
+    return np.stack([road, air])
+
+class TravelTimeMatrix:
+    """Memory-mapped origin x destination travel times"""
+    def __init__(self, minutes, origins, destinations, meta=None):
+        self.minutes = minutes
+        self.origin_index = {key: i for i, key in enumerate(origins)}
+        self.destination_index = {key: i for i, key in enumerate(destinations)}
+        self.meta = meta or {}
+
+    @staticmethod
+    def index_path(path):
+        return os.path.splitext(path)[0] + ".index.json"
+
+    @classmethod
+    def load(cls, path=DEFAULT_MATRIX_PATH):
+        with open(cls.index_path(path)) as f:
+            index = json.load(f)
+        minutes = np.load(path, mmap_mode='r')
+        return cls(minutes, index['origins'], index['destinations'], index.get('meta'))
+
+    @classmethod
+    def load_if_exists(cls, path=DEFAULT_MATRIX_PATH):
+        """Load the matrix, or return None when it has not been built"""
+        if not (os.path.exists(path) and os.path.exists(cls.index_path(path))):
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            print(f"⚠️ Could not load travel-time matrix: {str(e)}")
+            return None
+
+    def travel_minutes(self, origin_key, destination_key, mode=None):
+        """Fastest travel time in minutes, or None if either point is unknown"""
+        o = self.origin_index.get(origin_key)
+        d = self.destination_index.get(destination_key)
+        if o is None or d is None:
+            return None
+        if mode is None:
+            value = int(min(self.minutes[0, o, d], self.minutes[1, o, d]))
+        else:
+            value = int(self.minutes[MODES.index(mode), o, d])
+        return None if value == UNREACHABLE else value
+
+    def is_feasible(self, origin_key, destination_key, organ, elapsed_hours=0.0):
+        """
+        Whether the organ can arrive inside its remaining viability window
+
+        Unknown points and organs without a configured window are treated as
+        feasible so missing data never silently hides a donor.
+        """
+        limit = organ_limit_hours(organ)
+        if limit is None:
+            return True
+        minutes = self.travel_minutes(origin_key, destination_key)
+        if minutes is None:
+            return True
+        return minutes <= (limit - elapsed_hours) * 60.0
+
+def save_matrix(path, minutes, origins, destinations):
+    """Write the matrix and its key index next to each other"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, minutes)
+    os.replace(tmp_path, path)
+    index = {
+        'origins': list(origins),
+        'destinations': list(destinations),
+        'meta': {
+            'modes': list(MODES),
+            'built_at': datetime.now(timezone.utc).isoformat(),
+            'road_speed_kmh': ROAD_SPEED_KMH,
+            'road_detour_factor': ROAD_DETOUR_FACTOR,
+            'air_speed_kmh': AIR_SPEED_KMH,
+            'air_handling_hours': AIR_HANDLING_HOURS,
+        }
+    }
+    with open(TravelTimeMatrix.index_path(path), 'w') as f:
+        json.dump(index, f)
+
+def registry_hospital_points(db_manager):
+    """Coordinates of registry hospitals keyed by hospital id"""
+    session = db_manager.get_session()
+    try:
+        rows = session.query(Hospital.id, Hospital.latitude, Hospital.longitude).filter(
+            Hospital.latitude.isnot(None), Hospital.longitude.isnot(None)
+        ).all()
+        return {hospital_key(hid): (lat, lon) for hid, lat, lon in rows}
+    finally:
+        session.close()
+
+def registry_city_points(db_manager):
+    """Approximate city centres from the hospitals located in each city"""
+    session = db_manager.get_session()
+    try:
+        rows = session.query(Hospital.city, Hospital.latitude, Hospital.longitude).filter(
+            Hospital.city.isnot(None), Hospital.latitude.isnot(None), Hospital.longitude.isnot(None)
+        ).all()
+    finally:
+        session.close()
+    sums = {}
+    for city, lat, lon in rows:
+        name = city.strip()
+        total = sums.setdefault(name.lower(), [name, 0.0, 0.0, 0])
+        total[1] += lat
+        total[2] += lon
+        total[3] += 1
+    return {name: (lat / n, lon / n) for name, lat, lon, n in sums.values()}
+
+def app_hospital_points(app_db_path):
+    """Coordinates of the Streamlit app's donor hospitals keyed by name"""
+    if not app_db_path or not os.path.exists(app_db_path):
+        return {}
+    conn = sqlite3.connect(app_db_path)
+    try:
+        rows = conn.execute(
+            "SELECT hospital, AVG(lat), AVG(lon) FROM donors WHERE lat IS NOT NULL GROUP BY hospital"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {hospital_key(name): (lat, lon) for name, lat, lon in rows if name}
+
+def gazetteer_points(gazetteer):
+    """Coordinates of every gazetteer place keyed by place_key"""
+    return {
+        place_key(name, state): (float(lat), float(lon))
+        for name, state, lat, lon in zip(gazetteer.names, gazetteer.states, gazetteer.latitude, gazetteer.longitude)
+    }
+
+def build_matrix(hospitals, cities=None, path=DEFAULT_MATRIX_PATH, places=None):
+    """
+    Build and save the hospital -> (hospital | city | place) travel-time matrix
+
+    Args:
+        hospitals: Dict of hospital key -> (lat, lon)
+        cities: Dict of city name -> (lat, lon); defaults to services.CITIES
+        places: Dict of place key -> (lat, lon), e.g. gazetteer_points()
+    """
+    cities = CITIES if cities is None else cities
+    origins = list(hospitals)
+    city_points = {}
+    for name, coords in cities.items():
+        city_points.setdefault(city_key(name), coords)
+    city_points.update(places or {})
+    destinations = origins + list(city_points)
+    origin_coords = np.array([hospitals[k] for k in origins], dtype=np.float64).reshape(-1, 2)
+    destination_coords = np.array(
+        [hospitals[k] for k in origins] + list(city_points.values()), dtype=np.float64
+    ).reshape(-1, 2)
+    minutes = compute_travel_minutes(origin_coords, destination_coords)
+    save_matrix(path, minutes, origins, destinations)
+    return TravelTimeMatrix.load(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the travel-time matrix")
+    parser.add_argument("--db", default="data/organ_donation.db", help="Registry database (database.py schema)")
+    parser.add_argument("--app-db", default="jeevsetu_v9_ui.db", help="Streamlit app database")
+    parser.add_argument("--out", default=DEFAULT_MATRIX_PATH)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    points = registry_hospital_points(db_manager)
+    points.update(app_hospital_points(args.app_db))
+    cities = dict(CITIES)
+    cities.update(registry_city_points(db_manager))
+    try:
+        from gazetteer import get_gazetteer
+        places = gazetteer_points(get_gazetteer())
+    except Exception as e:
+        print(f"⚠️ Gazetteer unavailable, matrix covers named cities only: {str(e)}")
+        places = {}
+    matrix = build_matrix(points, cities=cities, path=args.out, places=places)
+    size_mb = matrix.minutes.nbytes / (1024 * 1024)
+    print(f"✅ Travel-time matrix: {len(matrix.origin_index)} origins x {len(matrix.destination_index)} destinations ({size_mb:.1f} MB) -> {args.out}")
@@ -0,0 +1,314 @@
+"""Compiled tree ensemble for Organ Donation Platform
+
+Serving only needs to evaluate the trained gradient-boosted trees over the 8
+match features, so the LightGBM Booster is exported once into flat NumPy
+arrays - split feature, threshold, missing-value routing, children and leaf
+values for every node of every tree - and saved as an .npz next to the model
+pickle. CompiledTreeModel.predict walks all trees for a whole candidate
+matrix one level at a time with array gathers: no lightgbm import, no native
+library, a few hundred KB of memory.
+
+Exports are checked against Booster.predict before they are written.
+
+    python tree_model.py export --model data/match_model.pkl
+    python tree_model.py verify --model data/match_model.pkl
+"""
+import os
+import time
+import pickle
+import argparse
+import numpy as np
+
+FORMAT_VERSION = 1
+ZERO_THRESHOLD = 1e-35  # LightGBM's kZeroThreshold
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+ROW_CHUNK = 512
+
+def compiled_path(model_path):
+    """Where the compiled model for a pickle lives (data/match_model.pkl -> data/match_model.npz)"""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+def _booster_of(model):
+    booster = getattr(model, 'booster_', model)
+    if not hasattr(booster, 'dump_model'):
+        raise TypeError(f"{type(model).__name__} is not a LightGBM model")
+    return booster
+
+def compile_booster(model):
+    """
+    Flatten a LightGBM Booster (or LGBMClassifier) into node arrays
+
+    Children are node indices when >= 0 and ~leaf index when negative; a tree
+    that is a single leaf has ~leaf as its root.
+
+    Returns:
+        CompiledTreeModel
+    """
+    dump = _booster_of(model).dump_model()
+    if dump.get('num_class', 1) != 1:
+        raise NotImplementedError("multiclass models are not supported")
+
+    feature, threshold, missing, default_left, left, right = [], [], [], [], [], []
+    leaf_values, roots = [], []
+
+    def visit(node):
+        if 'leaf_value' in node:
+            leaf_values.append(node['leaf_value'])
+            return ~(len(leaf_values) - 1)
+        if node.get('decision_type', '<=') != '<=':
+            raise NotImplementedError("categorical splits are not supported")
+        index = len(feature)
+        feature.append(node['split_feature'])
+        threshold.append(node['threshold'])
+        missing.append(MISSING_TYPES[node.get('missing_type', 'None')])
+        default_left.append(bool(node.get('default_left', True)))
+        left.append(0)
+        right.append(0)
+        left[index] = visit(node['left_child'])
+        right[index] = visit(node['right_child'])
+        return index
+
+    depth = 0
+    for tree in dump['tree_info']:
+        if tree.get('is_linear'):
+            raise NotImplementedError("linear trees are not supported")
+        roots.append(visit(tree['tree_structure']))
+        depth = max(depth, _depth(tree['tree_structure']))
+
+    return CompiledTreeModel(
+        feature=np.array(feature, dtype=np.int32),
+        threshold=np.array(threshold, dtype=np.float64),
+        missing=np.array(missing, dtype=np.int8),
+        default_left=np.array(default_left, dtype=bool),
+        left=np.array(left, dtype=np.int32),
+        right=np.array(right, dtype=np.int32),
+        leaf_value=np.array(leaf_values, dtype=np.float64),
+        roots=np.array(roots, dtype=np.int32),
+        max_depth=depth,
+        objective=dump.get('objective', 'regression'),
+        feature_names=list(dump.get('feature_names', [])),
+    )
+
+def _depth(node):
+    if 'leaf_value' in node:
+        return 0
+    return 1 + max(_depth(node['left_child']), _depth(node['right_child']))
+
+class CompiledTreeModel:
+    """Vectorized evaluator for an exported tree ensemble (predict() matches Booster.predict)"""
+    def __init__(self, feature, threshold, missing, default_left, left, right, leaf_value, roots,
+                 max_depth, objective, feature_names, source_path=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.missing = missing
+        self.default_left = default_left
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.objective = objective
+        self.feature_names = feature_names
+        self.source_path = source_path
+        self._source = None
+        self._table = None
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in
+                   ('feature', 'threshold', 'missing', 'default_left', 'left', 'right', 'leaf_value', 'roots'))
+
+    def _transform(self, raw):
+        name, *options = self.objective.split()
+        if name in ('binary', 'cross_entropy', 'xentropy'):
+            sigmoid = 1.0
+            for option in options:
+                if option.startswith('sigmoid:'):
+                    sigmoid = float(option.split(':', 1)[1])
+            return 1.0 / (1.0 + np.exp(-sigmoid * raw))
+        if name in ('regression', 'regression_l2', 'l2', 'huber', 'fair', 'quantile', 'regression_l1', 'l1'):
+            return raw
+        raise NotImplementedError(f"objective {self.objective!r} is not supported")
+
+    def _node_table(self):
+        """
+        Evaluation layout: leaves become self-looping nodes (threshold +inf),
+        so every row takes exactly max_depth steps without masking
+        """
+        if getattr(self, '_table', None) is None:
+            n_nodes, n_leaves = len(self.feature), len(self.leaf_value)
+            leaf_nodes = n_nodes + np.arange(n_leaves, dtype=np.int32)
+            def resolve(child):
+                return np.where(child >= 0, child, n_nodes + ~child).astype(np.int32)
+            children = np.empty((n_nodes + n_leaves, 2), dtype=np.int32)
+            children[:n_nodes, 0] = resolve(self.left)
+            children[:n_nodes, 1] = resolve(self.right)
+            children[n_nodes:, 0] = children[n_nodes:, 1] = leaf_nodes
+            self._table = {
+                'feature': np.concatenate([self.feature, np.zeros(n_leaves, dtype=np.int32)]),
+                'threshold': np.concatenate([self.threshold, np.full(n_leaves, np.inf)]),
+                'missing': np.concatenate([self.missing, np.zeros(n_leaves, dtype=np.int8)]),
+                'default_left': np.concatenate([self.default_left, np.ones(n_leaves, dtype=bool)]),
+                'children': children.ravel(),
+                'value': np.concatenate([np.zeros(n_nodes), self.leaf_value]),
+                'roots': resolve(self.roots),
+                'plain': not self.missing.any(),
+            }
+        return self._table
+
+    def _raw(self, X):
+        table = self._node_table()
+        n_features = X.shape[1]
+        plain = table['plain']
+        if plain:
+            # No split has missing-value routing: NaN behaves like 0.0 (LightGBM)
+            X = np.where(np.isnan(X), 0.0, X)
+        flat = X.ravel()
+        offsets = (np.arange(len(X), dtype=np.int32) * np.int32(n_features))[:, None]
+        nodes = np.broadcast_to(table['roots'], (len(X), self.num_trees)).copy()
+        for _ in range(self.max_depth):
+            value = flat[offsets + table['feature'][nodes]]
+            if plain:
+                go_right = value > table['threshold'][nodes]
+            else:
+                # Same routing as LightGBM's NumericalDecision
+                missing = table['missing'][nodes]
+                is_nan = np.isnan(value)
+                value = np.where(is_nan & (missing != MISSING_NAN), 0.0, value)
+                to_default = ((missing == MISSING_ZERO) & (np.abs(value) <= ZERO_THRESHOLD)) | ((missing == MISSING_NAN) & is_nan)
+                go_right = np.where(to_default, ~table['default_left'][nodes], value > table['threshold'][nodes])
+            nodes = table['children'][2 * nodes + go_right]
+        return table['value'][nodes].sum(axis=1)
+
+    def predict(self, X, raw_score=False):
+        """
+        Score a feature matrix
+
+        Returns:
+            Probabilities (binary objective), like Booster.predict, or raw
+            margins with raw_score=True
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if not len(X):
+            return np.empty(0)
+        raw = np.concatenate([self._raw(X[start:start + ROW_CHUNK]) for start in range(0, len(X), ROW_CHUNK)])
+        return raw if raw_score else self._transform(raw)
+
+    def load_source(self):
+        """The original Booster (imports lightgbm), e.g. for SHAP contributions"""
+        if self._source is None:
+            if not self.source_path or not os.path.exists(self.source_path):
+                return None
+            with open(self.source_path, 'rb') as f:
+                self._source = pickle.load(f)
+        return self._source
+
+    def save(self, path):
+        np.savez(
+            path, format_version=FORMAT_VERSION,
+            feature=self.feature, threshold=self.threshold, missing=self.missing,
+            default_left=self.default_left, left=self.left, right=self.right,
+            leaf_value=self.leaf_value, roots=self.roots, max_depth=self.max_depth,
+            objective=self.objective, feature_names=np.array(self.feature_names, dtype=str)
+        )
+
+    @classmethod
+    def load(cls, path, source_path=None):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"unsupported compiled model format {int(data['format_version'])}")
+            return cls(
+                feature=data['feature'], threshold=data['threshold'], missing=data['missing'],
+                default_left=data['default_left'], left=data['left'], right=data['right'],
+                leaf_value=data['leaf_value'], roots=data['roots'], max_depth=int(data['max_depth']),
+                objective=str(data['objective']), feature_names=[str(n) for n in data['feature_names']],
+                source_path=source_path
+            )
+
+def verification_matrix(n_features, n_rows=20000, seed=0):
+    """Random rows plus edge values (0, 1, NaN, exact thresholds are covered by the grid)"""
+    rng = np.random.default_rng(seed)
+    X = rng.random((n_rows, n_features))
+    X[: n_rows // 4] = np.round(X[: n_rows // 4])  # binary features as trained
+    X[n_rows // 4: n_rows // 4 + 100, :] = 0.0
+    X[n_rows // 4 + 100: n_rows // 4 + 200, rng.integers(0, n_features)] = np.nan
+    return X
+
+def max_deviation(compiled, model, X):
+    """Largest absolute difference from Booster.predict over X"""
+    expected = np.asarray(_booster_of(model).predict(X))
+    return float(np.max(np.abs(compiled.predict(X) - expected))) if len(X) else 0.0
+
+def export(model_path="data/match_model.pkl", out_path=None, tolerance=1e-9, X=None):
+    """
+    Compile a pickled Booster, verify it and write the .npz
+
+    Raises:
+        ValueError: when compiled predictions differ from Booster.predict
+
+    Returns:
+        (out_path, max absolute deviation)
+    """
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    compiled = compile_booster(model)
+    # Thresholds of every split, so rows land exactly on split points too
+    if X is None:
+        X = verification_matrix(len(compiled.feature_names) or int(compiled.feature.max()) + 1)
+        for f in np.unique(compiled.feature):
+            points = compiled.threshold[compiled.feature == f][: len(X)]
+            X[: len(points), f] = points
+    deviation = max_deviation(compiled, model, X)
+    if deviation > tolerance:
+        raise ValueError(f"compiled model deviates from Booster.predict by {deviation:.3g}")
+    out_path = out_path or compiled_path(model_path)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.npz"
+    compiled.save(tmp_path)
+    os.replace(tmp_path, out_path)
+    return out_path, deviation
+
+def load_compiled(model_path):
+    """CompiledTreeModel for a model pickle if an up-to-date export exists, else None"""
+    path = compiled_path(model_path)
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(model_path) and os.path.getmtime(path) < os.path.getmtime(model_path):
+        print("⚠️ Compiled model is older than the model pickle; ignoring it")
+        return None
+    return CompiledTreeModel.load(path, source_path=model_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the matching model to a NumPy tree evaluator")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--model", default="data/match_model.pkl")
+    parser.add_argument("--out", help="Output .npz (default: next to the model)")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows to compare for verify")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        out_path, deviation = export(args.model, args.out)
+        compiled = CompiledTreeModel.load(out_path)
+        print(f"✅ Compiled {compiled.num_trees} trees (depth {compiled.max_depth}, {compiled.nbytes / 1024:.0f} KB) "
+              f"-> {out_path}, max deviation {deviation:.2g}")
+    else:
+        compiled = CompiledTreeModel.load(args.out or compiled_path(args.model))
+        with open(args.model, 'rb') as f:
+            model = pickle.load(f)
+        X = verification_matrix(len(compiled.feature_names), n_rows=args.rows, seed=1)
+        started = time.perf_counter()
+        compiled.predict(X)
+        numpy_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        _booster_of(model).predict(X)
+        lightgbm_ms = (time.perf_counter() - started) * 1000
+        deviation = max_deviation(compiled, model, X)
+        status = "✅" if deviation <= 1e-9 else "❌"
+        print(f"{status} max deviation {deviation:.2g} over {len(X)} rows; "
+              f"NumPy {numpy_ms:.1f} ms vs LightGBM {lightgbm_ms:.1f} ms")
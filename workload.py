@@ -0,0 +1,365 @@
+"""Workload capture and replay for Organ Donation Platform
+
+Recording is opt-in: with JEEVSETU_RECORD_PATH set (or a WorkloadRecorder
+passed to MatchingEngine), every find_matches call appends one JSON line with
+its matching parameters, stage timings and ranked donor ids. The search only
+builds a small dict and puts it on a bounded queue; a background thread
+serializes and appends batches, and a full queue drops records instead of
+blocking. Records carry no identifiers - no SOS case id, names or accounts -
+and quasi-identifiers are coarsened: age is kept as a 5-year band, PIN code
+and coordinates are dropped (replay re-resolves the city through the
+gazetteer) and HLA typing is replaced by a flag. Replayed HLA-restricted
+searches therefore run unrestricted and are left out of the result diff.
+
+The replayer re-issues a recorded stream against a snapshot of the registry
+(as fast as possible, or at the original pace scaled by --speed) and diffs
+latency percentiles and ranked results against the recording.
+
+    JEEVSETU_RECORD_PATH=data/workload.jsonl python matching_engine.py serve
+    python workload.py snapshot --db data/organ_donation.db --out data/snapshot.db
+    python workload.py replay --log data/workload.jsonl --db data/snapshot.db --speed 10 --concurrency 4
+"""
+import os
+import sys
+import enum
+import json
+import time
+import queue
+import atexit
+import random
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from metrics import REGISTRY
+
+WORKLOAD_RECORDS = REGISTRY.counter(
+    'jeevsetu_workload_records_total', 'Recorded find_matches calls by outcome', ['outcome']
+)
+
+RECORD_FORMAT_VERSION = 2
+READABLE_FORMAT_VERSIONS = (1, 2)
+PATIENT_FIELDS = ['blood_group', 'organ_type', 'urgency_level', 'city', 'state', 'ischemia_elapsed_hours']
+AGE_BAND_YEARS = 5
+
+def _plain(value):
+    return value.name if isinstance(value, enum.Enum) else value
+
+def age_band(age):
+    """Midpoint of the AGE_BAND_YEARS band containing age"""
+    if age is None:
+        return None
+    return int(age) // AGE_BAND_YEARS * AGE_BAND_YEARS + AGE_BAND_YEARS // 2
+
+def search_params(patient, max_results, search_radius_km):
+    """Replayable, identifier-free parameters of one search"""
+    params = {field: _plain(patient.get(field)) for field in PATIENT_FIELDS}
+    params['age'] = age_band(patient.get('age'))
+    if patient.get('hla_type') and patient.get('min_shared_antigens'):
+        params['hla_restricted'] = True
+    params['max_results'] = max_results
+    params['search_radius_km'] = search_radius_km
+    return params
+
+class WorkloadRecorder:
+    def __init__(self, path, max_buffer=10000, flush_interval_s=1.0, sample_rate=1.0):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.sample_rate = sample_rate
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="workload-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record_search(self, patient, max_results, search_radius_km, durations, outcome, matches):
+        """Queue one find_matches call (never blocks, never touches the file)"""
+        if patient is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+        entry = {
+            'ts': time.time(),
+            'params': patient,
+            'max_results': max_results,
+            'search_radius_km': search_radius_km,
+            'durations': dict(durations),
+            'outcome': outcome,
+            'results': [(m['donor_id'], m['final_score']) for m in matches],
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            WORKLOAD_RECORDS.labels(outcome="dropped").inc()
+            return False
+        WORKLOAD_RECORDS.labels(outcome="queued").inc()
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    @staticmethod
+    def _encode(entry):
+        """Build the JSON line (in the writer thread, off the search path)"""
+        return json.dumps({
+            'v': RECORD_FORMAT_VERSION,
+            'ts': round(entry['ts'], 4),
+            'params': search_params(entry['params'], entry['max_results'], entry['search_radius_km']),
+            'timings_ms': {name: round(seconds * 1000.0, 3) for name, seconds in entry['durations'].items()},
+            'outcome': entry['outcome'],
+            'results': [[int(donor_id), score] for donor_id, score in entry['results']],
+        }, separators=(',', ':')) + "\n"
+
+    def flush(self):
+        """Append everything queued so far; returns the number of records written"""
+        with self._flush_lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self._encode(self._queue.get_nowait()))
+                except queue.Empty:
+                    break
+            if not lines:
+                return 0
+            try:
+                # One O_APPEND write per batch keeps lines whole when several processes share a log
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, "".join(lines).encode('utf-8'))
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                WORKLOAD_RECORDS.labels(outcome="failed").inc(len(lines))
+                print(f"❌ Error writing workload log: {str(e)}")
+                return 0
+            WORKLOAD_RECORDS.labels(outcome="written").inc(len(lines))
+            return len(lines)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the writer and flush what is left"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+_default_recorder = None
+_default_lock = threading.Lock()
+
+def get_recorder():
+    """Process-wide recorder when JEEVSETU_RECORD_PATH is set, else None"""
+    global _default_recorder
+    path = os.environ.get('JEEVSETU_RECORD_PATH')
+    if not path:
+        return None
+    with _default_lock:
+        if _default_recorder is None:
+            _default_recorder = WorkloadRecorder(path, sample_rate=float(os.environ.get('JEEVSETU_RECORD_SAMPLE', 1.0)))
+        return _default_recorder
+
+# ---- replay ----
+
+def snapshot(db_path, out_path):
+    """Consistent copy of a registry database to replay against"""
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("VACUUM INTO ?", (out_path,))
+    finally:
+        conn.close()
+
+def load_log(path, limit=None):
+    """Recorded searches in timestamp order (malformed lines are skipped)"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('v') in READABLE_FORMAT_VERSIONS:
+                entries.append(entry)
+    entries.sort(key=lambda e: e['ts'])
+    return entries[:limit] if limit else entries
+
+def patient_data(params):
+    """Recorded params -> find_matches patient_data (enums restored)"""
+    from database import BloodGroup, OrganType
+    data = {key: value for key, value in params.items() if key not in ('max_results', 'search_radius_km', 'hla_restricted')}
+    data['blood_group'] = BloodGroup[params['blood_group']] if params.get('blood_group') else None
+    data['organ_type'] = OrganType[params['organ_type']] if params.get('organ_type') else None
+    return data
+
+def _replay_one(engine, entry):
+    params = entry['params']
+    started = time.perf_counter()
+    matches = engine.find_matches(
+        patient_data=patient_data(params),
+        max_results=params['max_results'],
+        search_radius_km=params['search_radius_km']
+    )
+    latency_ms = (time.perf_counter() - started) * 1000.0
+    return latency_ms, [[m['donor_id'], m['final_score']] for m in matches]
+
+def replay(engine, entries, speed=None, concurrency=1):
+    """
+    Re-issue recorded searches
+
+    Args:
+        speed: None to run back to back; otherwise the recorded inter-arrival
+            gaps are divided by speed (1.0 = original pace)
+        concurrency: Worker threads issuing searches
+
+    Returns:
+        List of (latency_ms, lag_ms, results) in log order; lag is how late a
+        paced request started against its schedule
+    """
+    outcomes = [None] * len(entries)
+    if not entries:
+        return outcomes
+
+    def run(i, scheduled):
+        lag_ms = max(0.0, (time.perf_counter() - scheduled) * 1000.0) if scheduled is not None else 0.0
+        latency_ms, results = _replay_one(engine, entries[i])
+        outcomes[i] = (latency_ms, lag_ms, results)
+
+    first_ts = entries[0]['ts']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for i, entry in enumerate(entries):
+            scheduled = None
+            if speed:
+                scheduled = started + (entry['ts'] - first_ts) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(run, i, scheduled))
+        for future in futures:
+            future.result()
+    return outcomes
+
+def latency_stats(samples):
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+    }
+
+def diff_results(recorded, replayed):
+    """Agreement between two ranked [donor_id, final_score] lists"""
+    recorded_ids = [donor_id for donor_id, _ in recorded]
+    replayed_ids = [donor_id for donor_id, _ in replayed]
+    size = max(len(recorded_ids), len(replayed_ids))
+    recorded_scores = dict(recorded)
+    deltas = [abs(score - recorded_scores[donor_id]) for donor_id, score in replayed if donor_id in recorded_scores]
+    return {
+        'exact': recorded_ids == replayed_ids,
+        'top1': recorded_ids[:1] == replayed_ids[:1],
+        'overlap': len(set(recorded_ids) & set(replayed_ids)) / size if size else 1.0,
+        'max_score_delta': max(deltas) if deltas else 0.0,
+    }
+
+def compare(entries, outcomes, tolerance=0.2, max_mismatches=20):
+    """
+    Latency and result diff of a replay against its recording
+
+    Returns:
+        Report dict; 'regressions' lists percentiles slower than the
+        recording by more than `tolerance` (fraction)
+    """
+    recorded = latency_stats([e['timings_ms'].get('total', 0.0) for e in entries])
+    replayed = latency_stats([o[0] for o in outcomes])
+    # HLA typing is not recorded, so those searches cannot reproduce their results
+    compared = [(i, e, o) for i, (e, o) in enumerate(zip(entries, outcomes)) if not e['params'].get('hla_restricted')]
+    diffs = [diff_results(e['results'], o[2]) for _, e, o in compared]
+    mismatches = [
+        {'index': i, 'params': e['params'], 'recorded': e['results'][:5], 'replayed': o[2][:5]}
+        for (i, e, o), d in zip(compared, diffs) if not d['exact']
+    ]
+    regressions = []
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        if recorded.get(key) and replayed[key] > recorded[key] * (1 + tolerance):
+            regressions.append({'percentile': key, 'recorded': recorded[key], 'replayed': replayed[key]})
+    count = len(diffs) or 1
+    return {
+        'requests': len(entries),
+        'latency': {'recorded': recorded, 'replayed': replayed, 'lag': latency_stats([o[1] for o in outcomes])},
+        'results': {
+            'compared': len(diffs),
+            'exact_match_rate': round(sum(d['exact'] for d in diffs) / count, 4),
+            'top1_agreement': round(sum(d['top1'] for d in diffs) / count, 4),
+            'mean_overlap': round(sum(d['overlap'] for d in diffs) / count, 4),
+            'max_score_delta': round(max((d['max_score_delta'] for d in diffs), default=0.0), 4),
+            'mismatches': len(mismatches),
+            'examples': mismatches[:max_mismatches],
+        },
+        'regressions': regressions,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay find_matches workloads")
+    parser.add_argument("command", choices=["snapshot", "replay"])
+    parser.add_argument("--db", default="data/organ_donation.db", help="Registry to snapshot, or snapshot to replay against")
+    parser.add_argument("--out", default="data/snapshot.db", help="Snapshot path")
+    parser.add_argument("--log", default="data/workload.jsonl")
+    parser.add_argument("--model", default="data/match_model.pkl")
+    parser.add_argument("--speed", type=float, help="Pace multiplier (1 = original pace; omit to replay back to back)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--limit", type=int, help="Replay only the first N records")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50/p95/p99 slowdown before flagging a regression")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        started = time.perf_counter()
+        snapshot(args.db, args.out)
+        print(f"✅ Snapshot of {args.db} written to {args.out} in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    from database import DatabaseManager
+    from matching_engine import MatchingEngine
+    entries = load_log(args.log, args.limit)
+    if not entries:
+        print(f"⚠️ No records in {args.log}")
+        return 1
+    engine = MatchingEngine(DatabaseManager(args.db), model_path=args.model, recorder=False)
+    pace = f"{args.speed:g}x pace" if args.speed else "back to back"
+    print(f"🔁 Replaying {len(entries)} searches ({pace}, concurrency {args.concurrency})")
+    outcomes = replay(engine, entries, args.speed, args.concurrency)
+    report = compare(entries, outcomes, args.tolerance)
+
+    recorded, replayed = report['latency']['recorded'], report['latency']['replayed']
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        print(f"  {key[:-3]:<4} recorded {recorded[key]:>9.2f} ms   replayed {replayed[key]:>9.2f} ms")
+    results = report['results']
+    print(f"  results ({results['compared']} compared): {results['exact_match_rate']:.1%} identical, top-1 {results['top1_agreement']:.1%}, "
+          f"overlap {results['mean_overlap']:.1%}, max score delta {results['max_score_delta']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['regressions']:
+        for regression in report['regressions']:
+            print(f"❌ {regression['percentile']} regressed: {regression['recorded']} -> {regression['replayed']} ms")
+        return 1
+    print("✅ No latency regression")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())